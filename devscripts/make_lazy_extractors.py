@@ -16,6 +16,7 @@ if os.path.exists(lazy_extractors_filename):
 
 from youtube_dl.extractor import _ALL_CLASSES
 from youtube_dl.extractor.common import InfoExtractor, SearchInfoExtractor
+from youtube_dl.extractor.dispatcher import url_tokens
 
 with open('devscripts/lazy_load_template.py', 'rt') as f:
     module_template = f.read()
@@ -55,6 +56,9 @@ def build_lazy_ie(ie, name):
         module=ie.__module__)
     if ie.suitable.__func__ is not InfoExtractor.suitable.__func__:
         s += '\n' + getsource(ie.suitable)
+    else:
+        # spare the URL dispatcher the analysis of _VALID_URL
+        s += '    _URL_TOKENS = {0!r}\n'.format(url_tokens(valid_url))
     if hasattr(ie, '_make_valid_url'):
         # search extractors
         s += make_valid_template.format(valid_url=ie._make_valid_url())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# AES-128 CBC decryption throughput, as used by the native HLS downloader
+# Usage: python test/benchmark_aes.py [SIZE_IN_KIB]
+
+from __future__ import print_function, unicode_literals
+
+# Allow direct execution
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+from youtube_dl import aes
+from youtube_dl.aes import AESCipher, aes_decrypt, key_expansion, xor
+from youtube_dl.utils import bytes_to_intlist
+
+
+def reference_cbc_decrypt(data, key, iv):
+    # Block by block implementation on lists of ints
+    expanded_key = key_expansion(bytes_to_intlist(key))
+    data = bytes_to_intlist(data)
+    previous_cipher_block = bytes_to_intlist(iv)
+    decrypted_data = []
+    for i in range(0, len(data), aes.BLOCK_SIZE_BYTES):
+        block = data[i:i + aes.BLOCK_SIZE_BYTES]
+        decrypted_data += xor(aes_decrypt(block, expanded_key), previous_cipher_block)
+        previous_cipher_block = block
+    return decrypted_data
+
+
+def measure(name, func, data, key, iv):
+    start = time.time()
+    func(data, key, iv)
+    elapsed = time.time() - start
+    print('%-12s %8.3f MiB/s' % (name, len(data) / elapsed / 1024 / 1024))
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    key = os.urandom(16)
+    iv = os.urandom(16)
+    data = os.urandom(size * 1024)
+
+    # The reference implementation is too slow for the whole data
+    measure('reference', reference_cbc_decrypt, data[:64 * 1024], key, iv)
+    native_aes = aes._NativeAES
+    aes._NativeAES = None
+    try:
+        measure('t-tables', lambda d, k, i: AESCipher(k).cbc_decrypt(d, i), data, key, iv)
+    finally:
+        aes._NativeAES = native_aes
+    if native_aes is not None:
+        measure('native', lambda d, k, i: AESCipher(k).cbc_decrypt(d, i), data, key, iv)
+    else:
+        print('native       not available (install pycryptodome)')
+
+
+if __name__ == '__main__':
+    main()
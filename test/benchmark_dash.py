@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Time spent parsing the DASH manifest of a long stream and size of its JSON
+# information, with the fragments made from templates kept compact and
+# expanded into a dict for every fragment
+# Usage: python test/benchmark_dash.py [HOURS] [REPRESENTATIONS]
+
+from __future__ import print_function, unicode_literals
+
+# Allow direct execution
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+
+from test.helper import FakeYDL
+from youtube_dl.compat import compat_etree_fromstring
+from youtube_dl.extractor.common import InfoExtractor
+
+REPRESENTATION = '<Representation id="v%d" codecs="avc1.64001f" width="1280" height="720" bandwidth="%d"/>'
+
+
+def make_manifest(hours, representations):
+    # Segments of 2 s with a shorter one every minute, as with ad breaks
+    timeline = ''.join(
+        '<S d="180000" r="28"/><S d="90000"/>' if i else '<S t="0" d="180000" r="28"/><S d="90000"/>'
+        for i in range(hours * 60))
+    return '''<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT%dH">
+  <Period id="0" start="PT0S">
+    <AdaptationSet mimeType="video/mp4">
+      <SegmentTemplate timescale="90000" initialization="$RepresentationID$/init.mp4" media="$RepresentationID$/$Time$.m4s">
+        <SegmentTimeline>%s</SegmentTimeline>
+      </SegmentTemplate>
+      %s
+    </AdaptationSet>
+  </Period>
+</MPD>''' % (hours, timeline, '\n'.join(
+        REPRESENTATION % (i, 1000000 * (i + 1)) for i in range(representations)))
+
+
+def measure(name, manifest, expand):
+    ie = InfoExtractor(FakeYDL())
+    start = time.time()
+    formats = ie._parse_mpd_formats(
+        compat_etree_fromstring(manifest.encode('utf-8')), mpd_url='http://localhost/manifest.mpd')
+    if expand:
+        for f in formats:
+            f['fragments'] = list(f['fragments'])
+    parsed = time.time() - start
+    dump = json.dumps(formats, default=lambda obj: obj.to_json())
+    dumped = time.time() - start - parsed
+    print('%-10s %8.3f s parse %8.3f s dump %12d bytes %8d fragments' % (
+        name, parsed, dumped, len(dump), sum(len(f['fragments']) for f in formats)))
+
+
+def main():
+    hours = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    representations = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    manifest = make_manifest(hours, representations)
+    measure('expanded', manifest, True)
+    measure('compact', manifest, False)
+
+
+if __name__ == '__main__':
+    main()
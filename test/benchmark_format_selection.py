@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Time spent processing the formats of the videos of a large playlist, with
+# the format selector built once and built again for every video
+# Usage: python test/benchmark_format_selection.py [VIDEOS] [FORMATS]
+
+from __future__ import print_function, unicode_literals
+
+# Allow direct execution
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+from youtube_dl import YoutubeDL
+
+FORMAT_SPEC = 'bestvideo[height<=?1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=?1080]/best'
+
+
+class FakeLogger(object):
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+def make_info_dict(num, format_count):
+    formats = []
+    for i in range(format_count):
+        kind = i % 3
+        formats.append({
+            'format_id': '%d' % i,
+            'url': 'https://cdn.example.com/videos/%d/%d.mp4?token=abcdef' % (num, i),
+            'ext': 'm4a' if kind == 1 else 'mp4',
+            'height': None if kind == 1 else 144 * (1 + i % 8),
+            'tbr': 100 + i * 10,
+            'vcodec': 'none' if kind == 1 else 'avc1.4d401f',
+            'acodec': 'none' if kind == 0 else 'mp4a.40.2',
+            'http_headers': {'Referer': 'https://example.com/'},
+        })
+    return {
+        'id': 'video%d' % num,
+        'title': 'Video %d' % num,
+        'description': 'Description of the video %d ' % num * 50,
+        'webpage_url': 'https://example.com/watch/%d' % num,
+        'extractor': 'Benchmark',
+        'extractor_key': 'Benchmark',
+        'formats': formats,
+        'subtitles': {},
+        'tags': ['tag%d' % i for i in range(30)],
+    }
+
+
+def measure(name, info_dicts, memoize):
+    ydl = YoutubeDL({'logger': FakeLogger(), 'format': FORMAT_SPEC})
+    start = time.time()
+    for info_dict in info_dicts:
+        if not memoize:
+            ydl._format_selectors.clear()
+        ydl.process_video_result(dict(info_dict, formats=[dict(f) for f in info_dict['formats']]), download=False)
+    elapsed = time.time() - start
+    print('%-12s %8.3f s %10.3f ms/video' % (name, elapsed, elapsed * 1000 / len(info_dicts)))
+
+
+def main():
+    video_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    format_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    info_dicts = [make_info_dict(num, format_count) for num in range(video_count)]
+    measure('rebuilt', info_dicts, False)
+    measure('memoized', info_dicts, True)
+
+
+if __name__ == '__main__':
+    main()
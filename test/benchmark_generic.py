@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Time spent by the generic extractor on large webpages served from a local
+# server, looking for the embeds of the other extractors with and without the
+# single pass search of their anchors
+# Usage: python test/benchmark_generic.py [SIZE_IN_KIB]
+
+from __future__ import print_function, unicode_literals
+
+# Allow direct execution
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import threading
+import time
+
+from test.helper import http_server_port
+from youtube_dl import YoutubeDL
+from youtube_dl.compat import compat_http_server
+from youtube_dl.extractor.generic import GenericIE
+from youtube_dl.utils import ExtractorError
+
+EMBEDS = {
+    'none': '',
+    'youtube': '<iframe src="https://www.youtube.com/embed/BaW_jenozKc"></iframe>',
+    'zype': '<script src="https://player.zype.com/embed/5b400b834b32992a310622b9.js?api_key=jZ9GUhRmxcPvX7M3SlfejB6Hle9jyHTdk2jVxG7wOHPLODgncEKVdPYBhuz9iWXQ"></script>',
+}
+
+
+class BenchmarkRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_headers(self, page):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._send_headers(self.server.pages[self.path[1:]])
+
+    def do_GET(self):
+        page = self.server.pages[self.path[1:]]
+        self._send_headers(page)
+        self.wfile.write(page)
+
+
+class FakeLogger(object):
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+def make_page(size, embed):
+    random.seed(0)
+    elements = []
+    length = 0
+    while length < size:
+        num = len(elements)
+        words = ' '.join(
+            ''.join(random.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(random.randint(2, 10)))
+            for _ in range(30))
+        kind = random.randint(0, 5)
+        if kind == 0:
+            element = '<iframe src="https://ads.example.com/frame/%d?format=300x250" width="300" height="250"></iframe>' % num
+        elif kind == 1:
+            element = '<script type="text/javascript" src="https://cdn.example.com/js/%d.js" async></script>' % num
+        elif kind == 2:
+            element = '<meta property="article:tag" content="%s">' % words[:40]
+        else:
+            element = '<div class="article" data-id="%d"><p>%s <a href="https://example.com/%d">link</a></p></div>' % (
+                num, words, num)
+        elements.append(element + '\n')
+        length += len(element) + 1
+    return (
+        '<html><head><title>Benchmark</title></head><body>\n%s%s\n</body></html>'
+        % (''.join(elements), embed)).encode('utf-8')
+
+
+def measure(name, url, prefilter, repeat=3):
+    ydl = YoutubeDL({'logger': FakeLogger(), 'test': True})
+    ie = GenericIE(ydl)
+    detect_embeds = GenericIE._detect_embeds
+    if not prefilter:
+        GenericIE._detect_embeds = classmethod(lambda cls, webpage: frozenset(cls._EMBED_ANCHORS))
+    try:
+        best = None
+        for _ in range(repeat):
+            start = time.time()
+            try:
+                ie.extract(url)
+            except ExtractorError:
+                # Unsupported URL, there is no embed in the page
+                pass
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        GenericIE._detect_embeds = detect_embeds
+    print('%-10s %-12s %8.3f s' % (name, 'prefilter' if prefilter else 'all checks', best))
+
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 1024) * 1024
+    httpd = compat_http_server.HTTPServer(('127.0.0.1', 0), BenchmarkRequestHandler)
+    httpd.pages = dict((name, make_page(size, embed)) for name, embed in EMBEDS.items())
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    port = http_server_port(httpd)
+    for name in sorted(EMBEDS):
+        url = 'http://127.0.0.1:%d/%s' % (port, name)
+        measure(name, url, False)
+        measure(name, url, True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Throughput of the HTTP downloader from a local server, reading blocks into
+# a reused buffer and reading a new bytes object for every block
+# Usage: python test/benchmark_http.py [SIZE_IN_MIB]
+
+from __future__ import print_function, unicode_literals
+
+# Allow direct execution
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shutil
+import tempfile
+import threading
+import time
+
+from test.helper import http_server_port
+from youtube_dl import YoutubeDL
+from youtube_dl.compat import compat_http_server
+from youtube_dl.downloader.http import HttpFD
+
+CHUNK = os.urandom(1024 * 1024)
+
+
+class BenchmarkRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        size = self.server.size
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        for _ in range(size // len(CHUNK)):
+            self.wfile.write(CHUNK)
+
+
+class NoReadinto(object):
+    # Hides readinto, so that every block is read into a new bytes object
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, name):
+        if name == 'readinto':
+            raise AttributeError(name)
+        return getattr(self._response, name)
+
+
+class FakeLogger(object):
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+def measure(name, url, size, tmpdir, hide_readinto):
+    params = {'logger': FakeLogger(), 'noprogress': True, 'buffersize': 1024}
+    ydl = YoutubeDL(params)
+    if hide_readinto:
+        urlopen = ydl.urlopen
+        ydl.urlopen = lambda req: NoReadinto(urlopen(req))
+    filename = os.path.join(tmpdir, 'video.mp4')
+    start = time.time()
+    assert HttpFD(ydl, params).real_download(filename, {'url': url})
+    elapsed = time.time() - start
+    assert os.path.getsize(filename) == size
+    os.remove(filename)
+    print('%-10s %8.1f MiB/s' % (name, size / elapsed / 1024 / 1024))
+
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 1024) * len(CHUNK)
+    httpd = compat_http_server.HTTPServer(('127.0.0.1', 0), BenchmarkRequestHandler)
+    httpd.size = size
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:%d/video.mp4' % http_server_port(httpd)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        measure('read', url, size, tmpdir, True)
+        measure('readinto', url, size, tmpdir, False)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Time taken by the JS interpreter to extract and to run the signature
+# functions of the players used by test_youtube_signature.py
+# Usage: python test/benchmark_jsinterp.py [CALLS]
+
+from __future__ import print_function, unicode_literals
+
+# Allow direct execution
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import re
+import string
+import time
+
+from test.helper import FakeYDL
+from test.test_youtube_signature import _TESTS
+from youtube_dl.compat import compat_str, compat_urlretrieve
+from youtube_dl.extractor import YoutubeIE
+
+TESTDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    if not os.path.exists(TESTDATA_DIR):
+        os.mkdir(TESTDATA_DIR)
+    ie = YoutubeIE(FakeYDL())
+    total = 0
+    for url, stype, sig_input, _ in _TESTS:
+        if stype != 'js':
+            continue
+        test_id = re.match(r'.*-([a-zA-Z0-9_-]+)(?:/watch_as3|/html5player)?\.[a-z]+$', url).group(1)
+        fn = os.path.join(TESTDATA_DIR, 'player-%s.js' % test_id)
+        if not os.path.exists(fn):
+            try:
+                compat_urlretrieve(url, fn)
+            except IOError as e:
+                print('%-20s not available: %s' % (test_id, e))
+                continue
+        with io.open(fn, encoding='utf-8') as f:
+            jscode = f.read()
+        src_sig = (
+            compat_str(string.printable[:sig_input])
+            if isinstance(sig_input, int) else sig_input)
+
+        start = time.time()
+        func = ie._parse_sig_js(jscode)
+        func(src_sig)
+        extract_time = time.time() - start
+        start = time.time()
+        for _ in range(calls):
+            func(src_sig)
+        call_time = (time.time() - start) / calls
+        total += extract_time + call_time * calls
+        print('%-20s extraction %8.2f ms, call %8.1f us' % (
+            test_id, extract_time * 1000, call_time * 1000000))
+    print('total %.2f s' % total)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import re
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inspect
+import threading
+
+from test.helper import FakeYDL, http_server_port
+from youtube_dl.compat import compat_http_server
+from youtube_dl.extractor.generic import GenericIE
+
+
+PAGES = {
+    '/zype': '''<html><head><title>Zype</title></head><body>
+        <script src="https://player.zype.com/embed/5b400b834b32992a310622b9.js?api_key=jZ9GUhRmxcPvX7M3SlfejB6Hle9jyHTdk2jVxG7wOHPLODgncEKVdPYBhuz9iWXQ"></script>
+        </body></html>''',
+    '/youtube': '''<html><head><title>YouTube</title></head><body>
+        <div class="lazyYT" data-youtube-id="BaW_jenozKc"></div>
+        <iframe src="https://player.zype.com/embed/5b400b834b32992a310622b9.html?api_key=jZ9GUhRmxcPvX7M3SlfejB6Hle9jyHTdk2jVxG7wOHPLODgncEKVdPYBhuz9iWXQ"></iframe>
+        </body></html>''',
+    '/sbn-broken': '''<html><head><title>SBN</title></head><body>
+        <script>SBN.VideoLinkset.entryGroup([{"provider_video_id": ]);</script>
+        <script src="https://player.zype.com/embed/5b400b834b32992a310622b9.js?api_key=jZ9GUhRmxcPvX7M3SlfejB6Hle9jyHTdk2jVxG7wOHPLODgncEKVdPYBhuz9iWXQ"></script>
+        </body></html>''',
+    '/sbn-empty': '''<html><head><title>SBN</title></head><body>
+        <script>SBN.VideoLinkset.entryGroup([]);</script>
+        <script src="https://player.zype.com/embed/5b400b834b32992a310622b9.js?api_key=jZ9GUhRmxcPvX7M3SlfejB6Hle9jyHTdk2jVxG7wOHPLODgncEKVdPYBhuz9iWXQ"></script>
+        </body></html>''',
+}
+
+
+class GenericTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_headers(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._send_headers()
+
+    def do_GET(self):
+        self._send_headers()
+        self.wfile.write(PAGES[self.path].encode('utf-8'))
+
+
+class TestGenericEmbeds(unittest.TestCase):
+    def test_trie_regex(self):
+        regex = GenericIE._trie_regex(['ab', 'abcd', 'b.c'])
+        self.assertEqual(re.findall(regex, 'abc abcd b.c bxc'), ['ab', 'abcd', 'b.c'])
+
+    def test_detect_embeds(self):
+        self.assertEqual(GenericIE._detect_embeds('<p>Nothing to see here</p>'), set())
+        # The anchors are searched for regardless of case
+        self.assertEqual(
+            GenericIE._detect_embeds('<iframe src="https://www.YouTube.com/embed/BaW_jenozKc">'),
+            set(['Youtube']))
+        # Anchors overlapping or starting at the same position
+        self.assertEqual(
+            GenericIE._detect_embeds('<iframe src="//embed.nexx.cloud/748/video/12345">'),
+            set(['Nexx', 'NexxEmbed']))
+        self.assertEqual(
+            GenericIE._detect_embeds('<script src="//player.zype.com/embed/x.js">'),
+            set(['CondeNast', 'Zype']))
+        self.assertEqual(
+            GenericIE._detect_embeds('DM.player(document.getElementById("player"), {video: "x7tgad0"});'),
+            set(['Dailymotion']))
+        self.assertEqual(
+            GenericIE._detect_embeds('kWidget.embed({"wid": "_1645161", "entry_id": "1_0wn1bcin"})'),
+            set(['Kaltura']))
+
+    def test_embed_checks(self):
+        # Every check of _real_extract skipped by the prefilter has its
+        # anchors and the other way round
+        checks = set(re.findall(
+            r"if '(\w+)' in embeds:", inspect.getsource(GenericIE._real_extract)))
+        self.assertEqual(checks, set(GenericIE._EMBED_ANCHORS))
+        for name, anchors in GenericIE._EMBED_ANCHORS.items():
+            self.assertTrue(anchors, name)
+            for anchor in anchors:
+                self.assertEqual(anchor, anchor.lower())
+
+    def test_extract_embeds(self):
+        httpd = compat_http_server.HTTPServer(('127.0.0.1', 0), GenericTestRequestHandler)
+        port = http_server_port(httpd)
+        server_thread = threading.Thread(target=httpd.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        try:
+            ie = GenericIE(FakeYDL({'test': True}))
+
+            info = ie.extract('http://127.0.0.1:%d/zype' % port)
+            self.assertEqual(info['_type'], 'playlist')
+            self.assertEqual([e['ie_key'] for e in info['entries']], ['Zype'])
+
+            # The checks still run in order
+            info = ie.extract('http://127.0.0.1:%d/youtube' % port)
+            self.assertEqual(info['_type'], 'playlist')
+            self.assertEqual(
+                [(e['ie_key'], e['url']) for e in info['entries']],
+                [('Youtube', 'BaW_jenozKc')])
+
+            # The embeds after an SBN video linkset without videos are
+            # still looked for
+            for path in ('/sbn-broken', '/sbn-empty'):
+                info = ie.extract('http://127.0.0.1:%d%s' % (port, path))
+                self.assertEqual(info['_type'], 'playlist')
+                self.assertEqual([e['ie_key'] for e in info['entries']], ['Zype'])
+        finally:
+            httpd.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -971,6 +971,43 @@ jwplayer("mediaplayer").setup({"abouttext":"Visit Indie DB","aboutlink":"http:\/
                 self.ie._sort_formats(formats)
                 expect_value(self, formats, expected_formats, None)
 
+    def test_parse_mpd_fragments(self):
+        with io.open('./test/testdata/mpd/segment_timeline.mpd', mode='r', encoding='utf-8') as f:
+            formats = self.ie._parse_mpd_formats(
+                compat_etree_fromstring(f.read().encode('utf-8')),
+                mpd_base_url='http://unknown/', mpd_url='http://unknown/manifest.mpd')
+        self.assertEqual([f['format_id'] for f in formats], ['v1', 'v2', 'a1'])
+
+        # $Time$ template
+        fragments = formats[0]['fragments']
+        self.assertEqual(len(fragments), 13)
+        self.assertEqual(
+            [(f['url'], f.get('duration')) for f in fragments],
+            [('http://cdn.example.com/video/v1/init.mp4', None)]
+            + [('http://cdn.example.com/video/v1/%d.m4s' % (i * 360000), 4.0) for i in range(6)]
+            + [('http://cdn.example.com/video/v1/%d.m4s' % t, 2.0) for t in (2160000, 2340000)]
+            + [('http://cdn.example.com/video/v1/%d.m4s' % t, 4.0) for t in (2880000, 3240000, 3600000)]
+            + [('http://cdn.example.com/video/v1/3960000.m4s', 3.0)])
+        self.assertEqual(fragments[9], {'url': 'http://cdn.example.com/video/v1/2880000.m4s', 'duration': 4.0})
+
+        # $Number%05d$ template with a SegmentTimeline and relative paths
+        fragments = formats[2]['fragments']
+        self.assertEqual(formats[2]['fragment_base_url'], 'http://unknown/')
+        self.assertEqual(len(fragments), 15)
+        self.assertEqual(fragments[0], {'path': 'audio/a1/init-128000.m4a'})
+        self.assertEqual(fragments[1], {'path': 'audio/a1/seg-00010.m4a', 'duration': 4.0})
+        self.assertEqual(fragments[-1], {'path': 'audio/a1/seg-00023.m4a', 'duration': 2.0})
+
+        # $Number$ template with a segment duration
+        with io.open('./test/testdata/mpd/float_duration.mpd', mode='r', encoding='utf-8') as f:
+            formats = self.ie._parse_mpd_formats(
+                compat_etree_fromstring(f.read().encode('utf-8')),
+                mpd_url='http://unknown/manifest.mpd')
+        fragments = formats[0]['fragments']
+        self.assertEqual(len(fragments), 3008)
+        self.assertEqual(list(fragments), [{'path': 'ai_318597.mp4d'}] + [
+            {'path': 'a_318597_%d.mp4d' % i, 'duration': 2.0} for i in range(3007)])
+
     def test_parse_f4m_formats(self):
         _TEST_CASES = [
             (
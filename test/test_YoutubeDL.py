@@ -10,14 +10,29 @@ import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import copy
-
-from test.helper import FakeYDL, assertRegexpMatches
+import io
+import json
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+
+from test.helper import FakeYDL, assertRegexpMatches, try_rm
 from youtube_dl import YoutubeDL
 from youtube_dl.compat import compat_str, compat_urllib_error
 from youtube_dl.extractor import YoutubeIE
 from youtube_dl.extractor.common import InfoExtractor
 from youtube_dl.postprocessor.common import PostProcessor
-from youtube_dl.utils import ExtractorError, match_filter_func
+from youtube_dl.profiler import DeterministicProfiler
+from youtube_dl.utils import (
+    concurrent_imap,
+    DownloadError,
+    ExtractorError,
+    match_filter_func,
+    MaxDownloadsReached,
+    TemplatedFragments,
+)
 
 TEST_URL = 'http://localhost/sample.mp4'
 
@@ -454,6 +469,36 @@ class TestFormatSelection(unittest.TestCase):
         ydl.process_ie_result(info_dict.copy())
         self.assertEqual(ydl.downloaded_info_dicts[0]['format_id'], 'video+audio')
 
+    def test_format_selector_reuse(self):
+        formats = [
+            {'format_id': 'video', 'height': 720, 'acodec': 'none', 'url': TEST_URL,
+             'http_headers': {'Referer': 'http://example.com/video'}},
+            {'format_id': 'audio', 'vcodec': 'none', 'url': TEST_URL},
+        ]
+        ydl = YDL({'format': 'bestvideo+bestaudio'})
+        built = []
+        build_format_selector = ydl.build_format_selector
+
+        def count_build(format_spec):
+            built.append(format_spec)
+            return build_format_selector(format_spec)
+        ydl.build_format_selector = count_build
+
+        for _ in range(3):
+            info_dict = _make_result(
+                [dict(f) for f in formats], http_headers={'Referer': 'http://example.com/'})
+            ydl.process_ie_result(info_dict)
+            downloaded = ydl.downloaded_info_dicts[-1]
+            self.assertEqual(downloaded['format_id'], 'video+audio')
+            # The selected formats are not the ones listed in formats
+            for requested, listed in zip(downloaded['requested_formats'], info_dict['formats']):
+                self.assertEqual(requested, listed)
+                self.assertFalse(requested is listed)
+            self.assertEqual(
+                [f['http_headers']['Referer'] for f in info_dict['formats']],
+                ['http://example.com/video', 'http://example.com/'])
+        self.assertEqual(built, ['bestvideo+bestaudio'])
+
     def test_invalid_format_specs(self):
         def assert_syntax_error(format_spec):
             ydl = YDL({'format': format_spec})
@@ -872,11 +917,397 @@ class TestYoutubeDL(unittest.TestCase):
         self.assertEqual(result[1]['playlist_index'], 2)
         # @}
 
+    def test_concurrent_downloads(self):
+        playlist = {
+            '_type': 'playlist',
+            'id': 'test',
+            'entries': [{
+                'id': compat_str(i),
+                'title': compat_str(i),
+                'url': TEST_URL,
+            } for i in range(1, 9)],
+            'extractor': 'test:playlist',
+            'extractor_key': 'test:playlist',
+            'webpage_url': 'http://example.com',
+        }
+
+        class ConcurrentYDL(FakeYDL):
+            def __init__(self, *args, **kwargs):
+                super(ConcurrentYDL, self).__init__(*args, **kwargs)
+                self.threads = set()
+                self.filenames = []
+
+            def process_info(self, info_dict):
+                self.threads.add(threading.current_thread())
+                time.sleep(0.05)
+                super(ConcurrentYDL, self).process_info(info_dict)
+                self.filenames.append(info_dict['_filename'])
+
+        params = {
+            'concurrent_downloads': 4,
+            'simulate': True,
+            'outtmpl': '%(autonumber)s-%(id)s.%(ext)s',
+        }
+        ydl = ConcurrentYDL(params)
+        res = ydl.process_ie_result(copy.deepcopy(playlist))
+        self.assertEqual(
+            [e['id'] for e in res['entries']], [compat_str(i) for i in range(1, 9)])
+        self.assertEqual(len(ydl.threads), 4)
+        self.assertFalse(threading.current_thread() in ydl.threads)
+        # Every download gets its own number
+        self.assertEqual(
+            sorted(fn.split('-')[0] for fn in ydl.filenames),
+            ['%05d' % i for i in range(1, 9)])
+
+        ydl = ConcurrentYDL(dict(params, max_downloads=3))
+        self.assertRaises(
+            MaxDownloadsReached, ydl.process_ie_result, copy.deepcopy(playlist))
+        self.assertEqual(len(ydl.filenames), 3)
+
+    def test_download_together(self):
+        ydl = YDL({'noprogress': True})
+        statuses = []
+        ydl.add_progress_hook(statuses.append)
+        # Both downloads must be running at the same time to complete
+        barrier = threading.Event()
+        threads = set()
+
+        def dl(name, info, progress_hooks):
+            threads.add(threading.current_thread())
+            ph, = progress_hooks
+            ph({'status': 'downloading', 'downloaded_bytes': 0, 'total_bytes': info['size']})
+            if name == 'video':
+                self.assertTrue(barrier.wait(5))
+            else:
+                barrier.set()
+            ph({'status': 'downloading', 'downloaded_bytes': info['size'] // 2, 'total_bytes': info['size']})
+            ph({'status': 'finished', 'total_bytes': info['size']})
+            return True
+
+        self.assertTrue(ydl._download_together(
+            dl, [('video', {'size': 1000}), ('audio', {'size': 100})], 'merged', ydl.params))
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(s['filename'] == 'merged' for s in statuses))
+        self.assertEqual(statuses[-1]['status'], 'finished')
+        self.assertEqual(statuses[-1]['downloaded_bytes'], 1100)
+        self.assertEqual(statuses[-1]['total_bytes'], 1100)
+        self.assertEqual(len([s for s in statuses if s['status'] == 'finished']), 1)
+        # The total size is only known once both downloads report it
+        self.assertEqual(statuses[0].get('total_bytes'), None)
+        self.assertEqual(statuses[1]['total_bytes'], 1100)
+
+        self.assertFalse(ydl._download_together(
+            lambda name, info, progress_hooks: name == 'video',
+            [('video', {}), ('audio', {})], 'merged', ydl.params))
+
+    def test_side_fetches(self):
+        tmpdir = tempfile.mkdtemp()
+        cond = threading.Condition()
+        requested = []
+
+        class SideYDL(FakeYDL):
+            def urlopen(self, req):
+                url = req if isinstance(req, compat_str) else req.get_full_url()
+                # All the side files are requested at the same time
+                with cond:
+                    requested.append(url)
+                    cond.notify_all()
+                    end = time.time() + 5
+                    while len(requested) < 4 and time.time() < end:
+                        cond.wait(end - time.time())
+                if url.endswith('fail.vtt'):
+                    raise compat_urllib_error.URLError('fail')
+                return io.BytesIO(url.encode('utf-8'))
+
+        try:
+            ydl = SideYDL({
+                'outtmpl': os.path.join(tmpdir, '%(id)s.%(ext)s'),
+                'skip_download': True,
+                'writesubtitles': True,
+                'write_all_thumbnails': True,
+                'nooverwrites': True,
+            })
+            warnings = []
+            ydl.report_warning = warnings.append
+            with open(os.path.join(tmpdir, 'test.es.vtt'), 'wb') as f:
+                f.write(b'present')
+            start = time.time()
+            ydl.process_info({
+                'id': 'test',
+                'title': 'Test',
+                'ext': 'mp4',
+                'url': 'http://localhost/video.mp4',
+                'extractor': 'generic',
+                'extractor_key': 'Generic',
+                'requested_subtitles': {
+                    'en': {'ext': 'vtt', 'url': 'http://localhost/en.vtt'},
+                    'fr': {'ext': 'vtt', 'url': 'http://localhost/fail.vtt'},
+                    'es': {'ext': 'vtt', 'url': 'http://localhost/es.vtt'},
+                    'de': {'ext': 'vtt', 'data': 'de'},
+                },
+                'thumbnails': [
+                    {'id': '0', 'url': 'http://localhost/0.jpg'},
+                    {'id': '1', 'url': 'http://localhost/1.jpg'},
+                ],
+            })
+            self.assertEqual(len(requested), 4)
+            self.assertTrue(time.time() - start < 4)
+            self.assertEqual(len(warnings), 1)
+            self.assertTrue('subtitle for "fr"' in warnings[0])
+            for name, content in (
+                    ('test.en.vtt', b'http://localhost/en.vtt'),
+                    ('test.es.vtt', b'present'),
+                    ('test.de.vtt', b'de'),
+                    ('test_0.jpg', b'http://localhost/0.jpg'),
+                    ('test_1.jpg', b'http://localhost/1.jpg')):
+                with open(os.path.join(tmpdir, name), 'rb') as f:
+                    self.assertEqual(f.read(), content)
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, 'test.fr.vtt')))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_side_fetches_error(self):
+        tmpdir = tempfile.mkdtemp()
+
+        class SideYDL(FakeYDL):
+            def urlopen(self, req):
+                return io.BytesIO(b'subtitles')
+
+        try:
+            ydl = SideYDL({
+                'outtmpl': os.path.join(tmpdir, '%(id)s.%(ext)s'),
+                'writesubtitles': True,
+                'writeinfojson': True,
+                'ignoreerrors': True,
+            })
+            errors = []
+            ydl.report_error = errors.append
+            # The JSON metadata can't be written over a directory
+            os.mkdir(os.path.join(tmpdir, 'test.info.json'))
+            ydl.process_info({
+                'id': 'test',
+                'title': 'Test',
+                'ext': 'mp4',
+                'url': 'http://localhost/video.mp4',
+                'extractor': 'generic',
+                'extractor_key': 'Generic',
+                'requested_subtitles': {
+                    'en': {'ext': 'vtt', 'url': 'http://localhost/en.vtt'},
+                },
+            })
+            self.assertEqual(len(errors), 1)
+            # The subtitles are still written
+            with open(os.path.join(tmpdir, 'test.en.vtt'), 'rb') as f:
+                self.assertEqual(f.read(), b'subtitles')
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_throttle(self):
+        ydl = YDL({'ratelimit': 1000, 'host_ratelimits': {'example.com': 500}})
+        buckets = ydl._rate_limiters_for('http://cdn.example.com/video.mp4')
+        self.assertEqual([b.rate for b in buckets], [1000, 500])
+        self.assertEqual(ydl._rate_limiters_for('http://example.com/thumb.jpg'), buckets)
+        self.assertEqual(ydl._rate_limiters_for('http://notexample.com/video.mp4'), buckets[:1])
+        self.assertEqual(
+            [b.rate for b in ydl._rate_limiters_for('http://notexample.com/video.mp4', 2000)],
+            [2000])
+        self.assertEqual(YDL()._rate_limiters_for('http://example.com/video.mp4'), [])
+
+    def test_metrics(self):
+        class MetricsYDL(YDL):
+            def process_info(self, info_dict):
+                super(MetricsYDL, self).process_info(info_dict)
+                self.metrics.count('videos')
+                # Threads working on the video share its metrics
+                download = self.share_metrics(
+                    lambda i: self.throttle('http://cdn.example.com/%d' % i, 1000))
+                list(concurrent_imap(download, range(2), 2))
+
+        metrics_file = 'test_metrics.jsonl'
+        try_rm(metrics_file)
+        ydl = MetricsYDL({'print_metrics': True, 'metrics_file': metrics_file})
+        printed = []
+        ydl.to_stdout = printed.append
+        for video_id in ('a', 'b'):
+            ydl.process_ie_result(_make_result(
+                [{'url': TEST_URL}], id=video_id, webpage_url='http://example.com/' + video_id))
+        try:
+            with open(metrics_file) as f:
+                self.assertEqual([json.loads(line) for line in f], [json.loads(line) for line in printed])
+        finally:
+            try_rm(metrics_file)
+
+        self.assertEqual(len(printed), 2)
+        for video_id, line in zip(('a', 'b'), printed):
+            metrics = json.loads(line)
+            self.assertEqual(metrics['id'], video_id)
+            self.assertEqual(metrics['extractor'], 'testex')
+            self.assertEqual(metrics['webpage_url'], 'http://example.com/' + video_id)
+            self.assertEqual(metrics['counters'], {'videos': 1})
+            self.assertEqual(metrics['hosts'], {'cdn.example.com': {'requests': 0, 'bytes': 2000}})
+            self.assertEqual(metrics['timers']['format_selection']['count'], 1)
+
+    def test_profile(self):
+        def busy_worker(_):
+            end = time.time() + 0.2
+            while time.time() < end:
+                pass
+
+        class ProfiledYDL(YDL):
+            def extract_info(self, url, *args, **kwargs):
+                # Threads working on the URL are profiled with it
+                list(concurrent_imap(self.share_metrics(busy_worker), range(2), 2))
+
+        profile_dir = tempfile.mkdtemp()
+        try:
+            ydl = ProfiledYDL({'profile': profile_dir})
+            YoutubeDL.download(ydl, ['http://example.com/video'])
+            fn = os.path.join(profile_dir, 'example.com_video.collapsed')
+            with io.open(fn, encoding='utf-8') as f:
+                stacks = [line.rsplit(' ', 1)[0] for line in f]
+            self.assertTrue(any(s.split(';')[-1].startswith('busy_worker ') for s in stacks))
+
+            ydl = ProfiledYDL({'profile': profile_dir, 'profile_mode': 'deterministic'})
+            YoutubeDL.download(ydl, ['http://example.com/video'])
+            stats = pstats.Stats(os.path.join(profile_dir, 'example.com_video.pstats'))
+            self.assertTrue(any(func[2] == 'extract_info' for func in stats.stats))
+
+            # Python 3.12+ can't profile concurrent downloads separately
+            ydl = ProfiledYDL({'profile': profile_dir, 'profile_mode': 'deterministic', 'concurrent_downloads': 2})
+            self.assertEqual(
+                ydl.params['profile_mode'], 'sampling' if sys.version_info >= (3, 12) else 'deterministic')
+
+            # Nothing is written without any recorded call
+            fn = os.path.join(profile_dir, 'empty.pstats')
+            self.assertFalse(DeterministicProfiler().dump(fn))
+            self.assertFalse(os.path.exists(fn))
+        finally:
+            shutil.rmtree(profile_dir)
+
     def test_urlopen_no_file_protocol(self):
         # see https://github.com/ytdl-org/youtube-dl/issues/8227
         ydl = YDL()
         self.assertRaises(compat_urllib_error.URLError, ydl.urlopen, 'file:///etc/passwd')
 
+    def test_info_cache(self):
+        extracted = []
+        expire = [None]
+
+        class CachedIE(InfoExtractor):
+            _VALID_URL = r'https?://cached\.example\.com/(?P<id>\w+)'
+
+            def _real_extract(self, url):
+                video_id = self._match_id(url)
+                extracted.append(video_id)
+                video_url = TEST_URL
+                if expire[0] is not None:
+                    video_url += '?expire=%d' % expire[0]
+                return _make_result([{'url': video_url}], id=video_id)
+
+        class CachedYDL(YDL):
+            failures = 0
+            error = None
+
+            def process_info(self, info_dict):
+                if self.failures:
+                    self.failures -= 1
+                    # As when the downloader fails
+                    self._local.download_failed = True
+                    raise DownloadError('HTTP Error 403: Forbidden')
+                if self.error:
+                    raise DownloadError(self.error)
+                super(CachedYDL, self).process_info(info_dict)
+
+        cache_dir = tempfile.mkdtemp()
+
+        def make_ydl():
+            ydl = CachedYDL({'cachedir': cache_dir, 'info_cache_ttl': 3600})
+            ydl.add_info_extractor(CachedIE(ydl))
+            return ydl
+
+        try:
+            ydl = make_ydl()
+            ydl.extract_info('http://cached.example.com/a')
+            ydl.extract_info('http://cached.example.com/a')
+            make_ydl().extract_info('https://cached.example.com/a')
+            self.assertEqual(extracted, ['a'])
+            self.assertEqual(ydl.downloaded_info_dicts[1]['webpage_url'], 'http://cached.example.com/a')
+
+            # Not cached when the URLs expire too soon
+            expire[0] = int(time.time()) + 60
+            ydl.extract_info('http://cached.example.com/b')
+            ydl.extract_info('http://cached.example.com/b')
+            self.assertEqual(extracted, ['a', 'b', 'b'])
+            expire[0] = int(time.time()) + 7200
+            ydl.extract_info('http://cached.example.com/c')
+            ydl.extract_info('http://cached.example.com/c')
+            self.assertEqual(extracted, ['a', 'b', 'b', 'c'])
+
+            # Extracted again when the download of the cached information fails
+            ydl.failures = 1
+            ydl.extract_info('http://cached.example.com/a')
+            self.assertEqual(extracted, ['a', 'b', 'b', 'c', 'a'])
+            self.assertEqual(ydl.downloaded_info_dicts[-1]['id'], 'a')
+            ydl.extract_info('http://cached.example.com/a')
+            self.assertEqual(extracted, ['a', 'b', 'b', 'c', 'a'])
+
+            # But not when something else fails or another download failed
+            ydl.error = 'postprocessing: Conversion failed!'
+            self.assertRaises(DownloadError, ydl.extract_info, 'http://cached.example.com/a')
+            ydl.error = None
+            ydl._download_retcode = 1
+            ydl.extract_info('http://cached.example.com/a')
+            self.assertEqual(extracted, ['a', 'b', 'b', 'c', 'a'])
+            self.assertEqual(ydl._download_retcode, 1)
+
+            # Expired information is deleted
+            key = ydl._info_cache_key(ydl.get_info_extractor('Cached'), 'http://cached.example.com/a')
+            entry = ydl.cache.load('info', key)
+            entry['expires'] = time.time() - 1
+            ydl.cache.store('info', key, entry)
+            self.assertEqual(ydl._load_cached_info(key), None)
+            self.assertEqual(ydl.cache.load('info', key), None)
+
+            # Disabled by default
+            ydl = CachedYDL({'cachedir': cache_dir})
+            ydl.add_info_extractor(CachedIE(ydl))
+            ydl.extract_info('http://cached.example.com/a')
+            self.assertEqual(len(extracted), 6)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_templated_fragments_json(self):
+        def make_info_dict():
+            fragments = TemplatedFragments(
+                'seg-%(Number)d.m4s', [(0, 2, 3, 1)], timescale=1, location_key='path',
+                initialization={'path': 'init.mp4'})
+            return _make_result([{
+                'format_id': 'dash', 'url': TEST_URL, 'ext': 'mp4',
+                'protocol': 'http_dash_segments', 'fragment_base_url': 'http://localhost/',
+                'fragments': fragments,
+            }])
+        expanded = [
+            {'path': 'init.mp4'},
+            {'path': 'seg-1.m4s', 'duration': 2.0},
+            {'path': 'seg-2.m4s', 'duration': 2.0},
+            {'path': 'seg-3.m4s', 'duration': 2.0},
+        ]
+
+        ydl = YDL()
+        info = json.loads(json.dumps(make_info_dict(), default=ydl._json_default))
+        self.assertEqual(info['formats'][0]['fragments']['segments'], [[0, 2, 3, 1]])
+        self.assertRaises(TypeError, json.dumps, {'x': object()}, default=ydl._json_default)
+
+        # Compact fragments written as JSON are read back
+        ydl.process_ie_result(info)
+        fragments = ydl.downloaded_info_dicts[0]['fragments']
+        self.assertTrue(isinstance(fragments, TemplatedFragments))
+        self.assertEqual(list(fragments), expanded)
+
+        ydl = YDL({'expand_fragments': True})
+        info = json.loads(json.dumps(make_info_dict(), default=ydl._json_default))
+        self.assertEqual(info['formats'][0]['fragments'], expanded)
+
     def test_do_not_override_ie_key_in_url_transparent(self):
         ydl = YDL()
 
@@ -8,9 +8,20 @@ import sys
 import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from youtube_dl.aes import aes_decrypt, aes_encrypt, aes_cbc_decrypt, aes_cbc_encrypt, aes_decrypt_text
+from youtube_dl import aes
+from youtube_dl.aes import (
+    AESCipher,
+    aes_decrypt,
+    aes_encrypt,
+    aes_cbc_decrypt,
+    aes_cbc_decrypt_bytes,
+    aes_cbc_encrypt,
+    aes_decrypt_text,
+    key_expansion,
+)
 from youtube_dl.utils import bytes_to_intlist, intlist_to_bytes
 import base64
+import binascii
 
 # the encrypted data can be generate with 'devscripts/generate_aes_testdata.py'
 
@@ -58,6 +69,53 @@ class TestAES(unittest.TestCase):
         decrypted = (aes_decrypt_text(encrypted, password, 32))
         self.assertEqual(decrypted, self.secret_msg)
 
+    def test_cbc_decrypt_bytes(self):
+        data = b"\x97\x92+\xe5\x0b\xc3\x18\x91ky9m&\xb3\xb5@\xe6'\xc2\x96.\xc8u\x88\xab9-[\x9e|\xf1\xcd"
+        key = iv = intlist_to_bytes(self.key)
+        self.assertEqual(
+            aes_cbc_decrypt_bytes(data, key, iv).rstrip(b'\x08'), self.secret_msg)
+        # Incomplete last blocks are decrypted as if padded with zeros
+        self.assertEqual(
+            aes_cbc_decrypt_bytes(data[:20], key, iv),
+            intlist_to_bytes(aes_cbc_decrypt(bytes_to_intlist(data[:20]), self.key, self.iv)))
+
+    def _test_cipher(self):
+        # FIPS-197, appendix C
+        plaintext = binascii.unhexlify(b'00112233445566778899aabbccddeeff')
+        for key_size, expected in (
+                (16, b'69c4e0d86a7b0430d8cdb78070b4c55a'),
+                (24, b'dda97ca4864cdfe06eaf70a0ec0d7191'),
+                (32, b'8ea2b7ca516745bfeafc49904b496089')):
+            key = intlist_to_bytes(list(range(key_size)))
+            cipher = AESCipher(key)
+            expected = binascii.unhexlify(expected)
+            self.assertEqual(cipher.ecb_encrypt(plaintext * 3), expected * 3)
+            self.assertEqual(
+                intlist_to_bytes(aes_encrypt(bytes_to_intlist(plaintext), key_expansion(bytes_to_intlist(key)))),
+                expected)
+
+            iv = intlist_to_bytes(self.iv)
+            data = bytes(bytearray(range(256))) * 300
+            encrypted = cipher.cbc_encrypt(data, iv)
+            self.assertEqual(encrypted[:16], cipher.ecb_encrypt(aes.xor_bytes(data[:16], iv)))
+            self.assertEqual(
+                encrypted[16:32], cipher.ecb_encrypt(aes.xor_bytes(data[16:32], encrypted[:16])))
+            self.assertEqual(cipher.cbc_decrypt(encrypted, iv), data)
+            self.assertEqual(
+                intlist_to_bytes(aes_decrypt(bytes_to_intlist(encrypted[-16:]), key_expansion(bytes_to_intlist(key)))),
+                aes.xor_bytes(data[-16:], encrypted[-32:-16]))
+
+    def test_cipher(self):
+        self._test_cipher()
+
+    def test_cipher_pure_python(self):
+        native_aes = aes._NativeAES
+        aes._NativeAES = None
+        try:
+            self._test_cipher()
+        finally:
+            aes._NativeAES = native_aes
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -17,6 +17,10 @@ from youtube_dl.extractor import (
     gen_extractors,
     YoutubeIE,
 )
+from youtube_dl.extractor.dispatcher import (
+    URLDispatcher,
+    url_tokens,
+)
 
 
 class TestAllURLsMatching(unittest.TestCase):
@@ -93,6 +97,33 @@ class TestAllURLsMatching(unittest.TestCase):
                         ie.suitable(url),
                         '%s should not match URL %r . That URL belongs to %s.' % (type(ie).__name__, url, tc['name']))
 
+    def test_url_dispatcher(self):
+        ies = gen_extractors()
+        dispatcher = URLDispatcher(ies)
+        urls = [tc['url'] for tc in gettestcases(include_onlymatching=True)]
+        urls.extend([
+            'HTTPS://WWW.YOUTUBE.COM/watch?v=BaW_jenozKc',
+            'BaW_jenozKc',
+            ':ytsubs',
+            'ytsearch5:youtube-dl test video',
+            'http://example.com/video.mp4',
+        ])
+        for url in urls:
+            self.assertEqual(
+                [ie for ie in dispatcher.candidates(url) if ie.suitable(url)],
+                [ie for ie in ies if ie.suitable(url)],
+                'URL dispatcher mismatch for %r' % url)
+
+    def test_url_tokens(self):
+        self.assertEqual(
+            url_tokens(r'https?://(?:www\.)?foo\.com/v/(?P<id>\d+)'),
+            [[['http', 'www', 'foo', 'com', 'v'], ['http', 'foo', 'com', 'v'],
+              ['https', 'www', 'foo', 'com', 'v'], ['https', 'foo', 'com', 'v']]])
+        self.assertEqual(url_tokens(r'(?:bar:|https?://bar\.tv/)(?P<id>\d+)'), [
+            [['bar'], ['http', 'bar', 'tv'], ['https', 'bar', 'tv']]])
+        self.assertEqual(url_tokens(r'https?://[^/]+\.foo'), [[['http'], ['https']]])
+        self.assertEqual(url_tokens(r'.*'), [])
+
     def test_keywords(self):
         self.assertMatch(':ytsubs', ['youtube:subscriptions'])
         self.assertMatch(':ytsubscriptions', ['youtube:subscriptions'])
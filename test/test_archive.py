@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+import io
+import shutil
+import threading
+
+# Allow direct execution
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+from test.helper import FakeYDL
+from youtube_dl.archive import (
+    DownloadArchive,
+    get_download_archive,
+    SQLiteDownloadArchive,
+)
+
+
+def _mkdir(d):
+    if not os.path.exists(d):
+        os.mkdir(d)
+
+
+class TestDownloadArchive(unittest.TestCase):
+    def setUp(self):
+        TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+        TESTDATA_DIR = os.path.join(TEST_DIR, 'testdata')
+        _mkdir(TESTDATA_DIR)
+        self.test_dir = os.path.join(TESTDATA_DIR, 'archive_test')
+        self.tearDown()
+        _mkdir(self.test_dir)
+
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def _check_archive(self, archive):
+        self.assertFalse('youtube abc' in archive)
+        archive.add('youtube abc')
+        self.assertTrue('youtube abc' in archive)
+        self.assertFalse('youtube abd' in archive)
+        archive.update(['youtube abd', 'vimeo 123', 'youtube abc'])
+        self.assertTrue('youtube abd' in archive)
+        self.assertEqual(
+            sorted(archive), ['vimeo 123', 'youtube abc', 'youtube abd'])
+
+    def test_text_archive(self):
+        fn = os.path.join(self.test_dir, 'archive.txt')
+        archive = get_download_archive(fn)
+        self.assertTrue(isinstance(archive, DownloadArchive))
+        self._check_archive(archive)
+        with io.open(fn, 'r', encoding='utf-8') as f:
+            self.assertEqual(
+                f.read(), 'youtube abc\nyoutube abd\nvimeo 123\n')
+
+        # Entries appended by other processes are picked up
+        with io.open(fn, 'a', encoding='utf-8') as f:
+            f.write('dailymotion x5\n')
+        self.assertTrue('dailymotion x5' in archive)
+
+        # Entries of existing files are loaded
+        archive = get_download_archive(fn)
+        self.assertTrue('vimeo 123' in archive)
+        self.assertFalse('vimeo 124' in archive)
+
+    def test_text_archive_threads(self):
+        fn = os.path.join(self.test_dir, 'archive.txt')
+        archive = get_download_archive(fn)
+        added = []
+        missed = []
+
+        def check(n):
+            for i in range(200):
+                vid_id = 'test %d_%d' % (n, i)
+                archive.add(vid_id)
+                added.append(vid_id)
+                # Also loads the entries added by the other threads
+                for known_id in (vid_id, added[i * n // 4]):
+                    if known_id not in archive:
+                        missed.append(known_id)
+
+        threads = [threading.Thread(target=check, args=(n, )) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(missed, [])
+        self.assertEqual(sorted(archive), sorted(added))
+
+        # Entries of a rewritten file replace the known ones
+        with io.open(fn, 'w', encoding='utf-8') as f:
+            f.write('vimeo 1\n')
+        self.assertTrue('vimeo 1' in archive)
+        self.assertEqual(list(archive), ['vimeo 1'])
+
+    def test_sqlite_archive(self):
+        if not SQLiteDownloadArchive.suitable('archive.sqlite'):
+            return  # No sqlite3 module
+        fn = os.path.join(self.test_dir, 'archive.sqlite')
+        archive = get_download_archive(fn)
+        self.assertTrue(isinstance(archive, SQLiteDownloadArchive))
+        self._check_archive(archive)
+        archive.close()
+
+        # Existing SQLite archives are detected regardless of the extension
+        shutil.move(fn, os.path.join(self.test_dir, 'archive'))
+        archive = get_download_archive(os.path.join(self.test_dir, 'archive'))
+        self.assertTrue(isinstance(archive, SQLiteDownloadArchive))
+        self.assertTrue('vimeo 123' in archive)
+        archive.close()
+
+    def test_import_download_archive(self):
+        if not SQLiteDownloadArchive.suitable('archive.sqlite'):
+            return  # No sqlite3 module
+        text_fn = os.path.join(self.test_dir, 'archive.txt')
+        with io.open(text_fn, 'w', encoding='utf-8') as f:
+            f.write('youtube abc\nvimeo 123\n\n')
+        ydl = FakeYDL({
+            'download_archive': os.path.join(self.test_dir, 'archive.db'),
+        })
+        ydl.import_download_archive(text_fn)
+        self.assertTrue(ydl.in_download_archive({'id': 'abc', 'extractor_key': 'Youtube'}))
+        self.assertTrue(ydl.in_download_archive({'id': '123', 'extractor_key': 'Vimeo'}))
+        self.assertFalse(ydl.in_download_archive({'id': '124', 'extractor_key': 'Vimeo'}))
+        ydl.record_download_archive({'id': '124', 'extractor_key': 'Vimeo'})
+        self.assertTrue(ydl.in_download_archive({'id': '124', 'extractor_key': 'Vimeo'}))
+        ydl.__exit__(None, None, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
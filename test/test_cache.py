@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 
 import shutil
+import time
 
 # Allow direct execution
 import os
@@ -50,10 +51,71 @@ class TestCache(unittest.TestCase):
         self.assertEqual(c.load('test_cache', 'k.'), obj)
         self.assertEqual(c.load('test_cache', 'y'), None)
         self.assertEqual(c.load('test_cache2', 'k.'), None)
+        c.store('test_cache', 'y', obj)
+        c.delete('test_cache', 'y')
+        self.assertEqual(c.load('test_cache', 'y'), None)
+        self.assertEqual(c.load('test_cache', 'k.'), obj)
         c.remove()
         self.assertFalse(os.path.exists(self.test_dir))
         self.assertEqual(c.load('test_cache', 'k.'), None)
 
+    def test_cache_ttl(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+            'cache_ttls': {'test_ttl': 60},
+        })
+        c = Cache(ydl)
+        c.store('test_ttl', 'k', [1])
+        c.store('test_cache', 'k', [2])
+        self.assertEqual(c.load('test_ttl', 'k'), [1])
+        # Make the entries look 2 minutes old
+        for section in ('test_ttl', 'test_cache'):
+            fn = os.path.join(self.test_dir, section, 'k.json')
+            t = time.time() - 120
+            os.utime(fn, (t, t))
+        self.assertEqual(c.load('test_ttl', 'k'), None)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'test_ttl', 'k.json')))
+        self.assertEqual(c.load('test_cache', 'k'), [2])
+
+    def test_cache_max_size(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+            'cache_max_size': 30,
+        })
+        c = Cache(ydl)
+        t = time.time() - 100
+        for i, key in enumerate(('a', 'b', 'c')):
+            c.store('test_cache', key, '1234567')
+            os.utime(os.path.join(self.test_dir, 'test_cache', '%s.json' % key), (t + i, t + i))
+        # The least recently used entry is evicted
+        self.assertEqual(c.load('test_cache', 'a'), '1234567')
+        c.store('test_cache', 'd', '1234567')
+        self.assertEqual(c.load('test_cache', 'b'), None)
+        for key in ('a', 'c', 'd'):
+            self.assertEqual(c.load('test_cache', key), '1234567')
+        # The size is kept up to date without measuring it again
+        scanned = c._size_scanned
+        c.store('test_cache', 'a', '1234')
+        self.assertEqual(c._size, 24)
+        self.assertEqual(c._size_scanned, scanned)
+        os.utime(os.path.join(self.test_dir, 'test_cache', 'c.json'), (t, t))
+        c.store('test_cache', 'e', '1234567')
+        self.assertEqual(c._size, 24)
+        self.assertEqual(c.load('test_cache', 'c'), None)
+
+    def test_cache_memoization(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+        })
+        c = Cache(ydl)
+        c.store('test_cache', 'k', {'x': [1]})
+        obj = c.load('test_cache', 'k')
+        obj['x'].append(2)
+        self.assertEqual(c.load('test_cache', 'k'), {'x': [1]})
+        # Changes made by other processes are picked up
+        Cache(ydl).store('test_cache', 'k', {'x': [1, 2, 3]})
+        self.assertEqual(c.load('test_cache', 'k'), {'x': [1, 2, 3]})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# coding: utf-8
+from __future__ import unicode_literals
+
+# Allow direct execution
+import io
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.helper import http_server_port, try_rm
+from youtube_dl import YoutubeDL
+from youtube_dl.aes import AESCipher
+from youtube_dl.compat import compat_http_server, compat_struct_pack
+from youtube_dl.downloader.hls import HlsFD, _AES128Decrypter
+from youtube_dl.utils import encodeFilename
+import threading
+
+
+KEY = b'0123456789abcdef'
+IV = b'\x00' * 15 + b'\x01'
+
+
+def pad(data):
+    padding = 16 - len(data) % 16
+    return data + bytes(bytearray([padding] * padding))
+
+
+# Fragment contents, in clear
+FRAGMENTS = [
+    b'a' * 70000,
+    b'b' * 32,
+    b'c' * 1000,
+    b'd' * 5,
+]
+
+PLAYLIST = '''#EXTM3U
+#EXT-X-TARGETDURATION:10
+#EXT-X-MEDIA-SEQUENCE:0
+#EXT-X-KEY:METHOD=AES-128,URI="key",IV=0x00000000000000000000000000000001
+#EXTINF:10,
+frag0
+#EXTINF:10,
+frag1
+#EXT-X-KEY:METHOD=NONE
+#EXTINF:10,
+frag2
+#EXTINF:10,
+missing
+#EXT-X-KEY:METHOD=AES-128,URI="key",IV=0x00000000000000000000000000000001
+#EXTINF:10,
+frag3
+#EXT-X-ENDLIST
+'''
+
+
+class HLSTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_data(self, data):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/playlist.m3u8':
+            self.send_data(PLAYLIST.encode('utf-8'))
+        elif self.path == '/key':
+            self.server.key_requests += 1
+            self.send_data(KEY)
+        elif self.path in ('/frag0', '/frag1', '/frag3'):
+            frag = FRAGMENTS[int(self.path[-1])]
+            self.send_data(AESCipher(KEY).cbc_encrypt(pad(frag), IV))
+        elif self.path == '/frag2':
+            self.send_data(FRAGMENTS[2])
+        elif self.path in ('/live.m3u8', '/flaky.m3u8'):
+            playlist = LIVE_PLAYLISTS[min(self.server.live_requests, len(LIVE_PLAYLISTS) - 1)]
+            self.server.live_requests += 1
+            if self.path == '/flaky.m3u8' and self.server.live_requests == 2:
+                # Connection closed without any response
+                self.close_connection = True
+                return
+            self.send_data(live_playlist(*playlist).encode('utf-8'))
+        elif self.path == '/stalled.m3u8':
+            self.send_data(live_playlist(*LIVE_PLAYLISTS[0]).encode('utf-8'))
+        elif self.path.startswith('/live'):
+            segment = int(self.path[5:])
+            data = LIVE_FRAGMENT % segment
+            if segment % 2:
+                iv = b'\x00' * 12 + compat_struct_pack('>I', segment)
+                data = AESCipher(KEY).cbc_encrypt(pad(data), iv)
+            self.send_data(data)
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+
+# Live playlist as reloaded over time, segment n is LIVE_FRAGMENT % n, the
+# odd ones encrypted with the IV made from their media sequence number
+LIVE_PLAYLISTS = [
+    (0, [0, 1, 2]),
+    (1, [1, 2, 3]),
+    # Unchanged
+    (1, [1, 2, 3]),
+    (3, [3, 'ad', 5]),
+    # Segments 6 and 7 left the playlist before it was reloaded
+    (8, [8, 9], True),
+]
+LIVE_FRAGMENT = b'live segment %d'
+
+
+def live_playlist(media_sequence, segments, ended=False):
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-TARGETDURATION:0.1',
+        '#EXT-X-MEDIA-SEQUENCE:%d' % media_sequence,
+    ]
+    for segment in segments:
+        if segment == 'ad':
+            lines.extend(['#UPLYNK-SEGMENT:ad0,0,ad', '#EXTINF:0.1,', 'ad', '#UPLYNK-SEGMENT:seg0,0,segment'])
+            continue
+        lines.append(
+            '#EXT-X-KEY:METHOD=AES-128,URI="key"' if segment % 2 else '#EXT-X-KEY:METHOD=NONE')
+        lines.extend(['#EXTINF:0.1,', 'live%d' % segment])
+    if ended:
+        lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+class FakeLogger(object):
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+class TestHlsFD(unittest.TestCase):
+    def setUp(self):
+        self.httpd = compat_http_server.HTTPServer(
+            ('127.0.0.1', 0), HLSTestRequestHandler)
+        self.httpd.key_requests = 0
+        self.httpd.live_requests = 0
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def download(self, params):
+        params['logger'] = FakeLogger()
+        ydl = YoutubeDL(params)
+        downloader = HlsFD(ydl, params)
+        filename = 'testfile.mp4'
+        try_rm(encodeFilename(filename))
+        self.httpd.key_requests = 0
+        self.assertTrue(downloader.real_download(filename, {
+            'url': 'http://127.0.0.1:%d/playlist.m3u8' % self.port,
+        }))
+        with io.open(encodeFilename(filename), 'rb') as f:
+            self.assertEqual(f.read(), b''.join(FRAGMENTS))
+        # The key is only fetched once
+        self.assertEqual(self.httpd.key_requests, 1)
+        try_rm(encodeFilename(filename))
+
+    def test_decryption(self):
+        self.download({})
+
+    def test_decryption_concurrent(self):
+        self.download({'concurrent_fragment_downloads': 3})
+
+    def test_decryption_keep_fragments(self):
+        self.download({'keep_fragments': True})
+        for i in range(1, 6):
+            try_rm(encodeFilename('testfile.mp4.part-Frag%d' % i))
+
+    def download_live(self, path, params):
+        warnings = []
+
+        class WarningLogger(FakeLogger):
+            def warning(self, msg):
+                warnings.append(msg)
+
+        params['logger'] = WarningLogger()
+        ydl = YoutubeDL(params)
+        downloader = HlsFD(ydl, params)
+        filename = 'testfile.mp4'
+        try_rm(encodeFilename(filename))
+        try:
+            self.assertTrue(downloader.real_download(filename, {
+                'url': 'http://127.0.0.1:%d/%s' % (self.port, path),
+                'is_live': True,
+            }))
+            with io.open(encodeFilename(filename), 'rb') as f:
+                return f.read(), warnings
+        finally:
+            try_rm(encodeFilename(filename))
+
+    def test_live(self):
+        for params in ({}, {'concurrent_fragment_downloads': 3}):
+            self.httpd.live_requests = 0
+            data, warnings = self.download_live('live.m3u8', params)
+            self.assertEqual(data, b''.join(LIVE_FRAGMENT % i for i in (0, 1, 2, 3, 5, 8, 9)))
+            self.assertEqual(self.httpd.live_requests, len(LIVE_PLAYLISTS))
+            self.assertEqual([w for w in warnings if w.startswith('Missed')], ['Missed 2 fragments'])
+
+    def test_live_reload_error(self):
+        data, warnings = self.download_live('flaky.m3u8', {})
+        self.assertEqual(data, b''.join(LIVE_FRAGMENT % i for i in (0, 1, 2, 3, 5, 8, 9)))
+        self.assertEqual(len([w for w in warnings if w.startswith('Unable to reload')]), 1)
+
+    def test_live_stalled(self):
+        data, warnings = self.download_live('stalled.m3u8', {})
+        self.assertEqual(data, b''.join(LIVE_FRAGMENT % i for i in (0, 1, 2)))
+        self.assertTrue(any(w.startswith('The playlist was not updated') for w in warnings))
+
+    def test_decrypter(self):
+        data = b'x' * 100
+        encrypted = AESCipher(KEY).cbc_encrypt(pad(data), IV)
+        out = io.BytesIO()
+        decrypter = _AES128Decrypter(out, AESCipher(KEY), IV)
+        decrypter.write(encrypted[:7])
+        decrypter.write(encrypted[7:40])
+        # Restarting drops the data written so far
+        decrypter.seek(0)
+        decrypter.truncate()
+        self.assertEqual(out.getvalue(), b'')
+        for i in range(len(encrypted)):
+            decrypter.write(encrypted[i:i + 1])
+            self.assertEqual(decrypter.tell(), i + 1)
+            # The last block is held back until closed
+            self.assertTrue(len(out.getvalue()) <= len(data) - 4)
+        decrypter.close()
+        self.assertEqual(out.getvalue(), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
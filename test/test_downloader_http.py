@@ -3,9 +3,13 @@
 from __future__ import unicode_literals
 
 # Allow direct execution
+import io
+import json
 import os
 import re
+import shutil
 import sys
+import tempfile
 import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -15,11 +19,13 @@ from youtube_dl.compat import compat_http_server
 from youtube_dl.downloader.http import HttpFD
 from youtube_dl.utils import encodeFilename
 import threading
+import time
 
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 TEST_SIZE = 10 * 1024
+TEST_DATA = bytes(bytearray(i % 251 for i in range(TEST_SIZE)))
 
 
 class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
@@ -53,9 +59,29 @@ class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(b'#' * size)
 
+    def serve_data(self, failing_range=None):
+        self.server.ranges.append(self.headers.get('Range'))
+        mobj = re.search(r'^bytes=(\d+)-(\d+)?', self.headers['Range'])
+        start = int(mobj.group(1))
+        if self.headers['Range'] == failing_range:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        end = int(mobj.group(2) or TEST_SIZE - 1)
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, TEST_SIZE))
+        self.send_header('Content-Length', end - start + 1)
+        self.end_headers()
+        self.wfile.write(TEST_DATA[start:end + 1])
+
     def do_GET(self):
         if self.path == '/regular':
             self.serve()
+        elif self.path == '/data':
+            self.serve_data()
+        elif self.path == '/data-failing-range':
+            self.serve_data(failing_range='bytes=3413-6825')
         elif self.path == '/no-content-length':
             self.serve(content_length=False)
         elif self.path == '/no-range':
@@ -82,6 +108,7 @@ class TestHttpFD(unittest.TestCase):
         self.httpd = compat_http_server.HTTPServer(
             ('127.0.0.1', 0), HTTPTestRequestHandler)
         self.port = http_server_port(self.httpd)
+        self.httpd.ranges = []
         self.server_thread = threading.Thread(target=self.httpd.serve_forever)
         self.server_thread.daemon = True
         self.server_thread.start()
@@ -102,6 +129,17 @@ class TestHttpFD(unittest.TestCase):
         for ep in ('regular', 'no-content-length', 'no-range', 'no-range-no-content-length'):
             self.download(params, ep)
 
+    def download_to_buffer(self, params, ep):
+        params['logger'] = FakeLogger()
+        ydl = YoutubeDL(params)
+        downloader = HttpFD(ydl, params)
+        buf = io.BytesIO()
+        self.assertTrue(downloader.real_download(buf, {
+            'url': 'http://127.0.0.1:%d/%s' % (self.port, ep),
+        }))
+        self.assertEqual(buf.getvalue(), b'#' * TEST_SIZE)
+        self.assertFalse(os.path.exists('-'))
+
     def test_regular(self):
         self.download_all({})
 
@@ -110,6 +148,136 @@ class TestHttpFD(unittest.TestCase):
             'http_chunk_size': 1000,
         })
 
+    def test_buffer(self):
+        for ep in ('regular', 'no-content-length', 'no-range', 'no-range-no-content-length'):
+            self.download_to_buffer({}, ep)
+            self.download_to_buffer({'http_chunk_size': 1000}, ep)
+
+    def test_connections(self):
+        self.download_all({'http_connections': 3})
+        self.download_to_buffer({'http_connections': 3}, 'regular')
+
+        params = {'http_connections': 3, 'logger': FakeLogger()}
+        downloader = HttpFD(YoutubeDL(params), params)
+        filename = 'testfile.mp4'
+        try_rm(encodeFilename(filename))
+        self.assertTrue(downloader.real_download(filename, {
+            'url': 'http://127.0.0.1:%d/data' % self.port,
+        }))
+        with open(encodeFilename(filename), 'rb') as f:
+            self.assertEqual(f.read(), TEST_DATA)
+        self.assertEqual(sorted(self.httpd.ranges), [
+            'bytes=0-0', 'bytes=0-3412', 'bytes=3413-6825', 'bytes=6826-10239'])
+        self.assertFalse(os.path.exists(encodeFilename(filename + '.ytdl')))
+        try_rm(encodeFilename(filename))
+
+    def test_connections_failing_range(self):
+        params = {'http_connections': 3, 'retries': 2, 'ignoreerrors': True, 'logger': FakeLogger()}
+        downloader = HttpFD(YoutubeDL(params), params)
+        filename = 'testfile.mp4'
+        try_rm(encodeFilename(filename))
+        self.assertFalse(downloader.real_download(filename, {
+            'url': 'http://127.0.0.1:%d/data-failing-range' % self.port,
+        }))
+        self.assertEqual(self.httpd.ranges.count('bytes=3413-6825'), 3)
+        # The download can be resumed
+        self.assertTrue(os.path.exists(encodeFilename(filename + '.ytdl')))
+        try_rm(encodeFilename(filename + '.part'))
+        try_rm(encodeFilename(filename + '.ytdl'))
+
+    def test_formats_together(self):
+        messages = []
+
+        class ScreenLogger(FakeLogger):
+            def debug(self, msg):
+                messages.append(msg)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            ydl = YoutubeDL({
+                'outtmpl': os.path.join(tmpdir, '%(id)s.%(ext)s'),
+                'noprogress': True,
+                'ffmpeg_location': os.path.join(tmpdir, 'nonexistent'),
+                'logger': ScreenLogger(),
+            })
+            url = 'http://127.0.0.1:%d/regular' % self.port
+            ydl.process_info({
+                'id': 'together', 'title': 'together', 'ext': 'mp4', 'format_id': 'v+a',
+                'url': url, 'requested_formats': [
+                    {'format_id': 'v', 'url': url, 'ext': 'mp4', 'protocol': 'http'},
+                    {'format_id': 'a', 'url': url, 'ext': 'm4a', 'protocol': 'http'},
+                ],
+            })
+            for fn in ('together.fv.mp4', 'together.fa.m4a'):
+                self.assertEqual(os.path.getsize(os.path.join(tmpdir, fn)), TEST_SIZE)
+            # Reported once for both formats
+            self.assertEqual(messages.count('[download] Download completed'), 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_ratelimit(self):
+        params = {'http_connections': 2, 'ratelimit': 20000, 'logger': FakeLogger()}
+        downloader = HttpFD(YoutubeDL(params), params)
+        filename = 'testfile.mp4'
+        try_rm(encodeFilename(filename))
+        start = time.time()
+        self.assertTrue(downloader.real_download(filename, {
+            'url': 'http://127.0.0.1:%d/data' % self.port,
+        }))
+        # The rate limit applies to both connections together
+        self.assertTrue(time.time() - start >= 0.4)
+        try_rm(encodeFilename(filename))
+
+    def test_connections_resume(self):
+        params = {'http_connections': 2, 'logger': FakeLogger()}
+        downloader = HttpFD(YoutubeDL(params), params)
+        filename = 'testfile.mp4'
+        # Interrupted download with the first range complete and the
+        # second one started
+        with open(encodeFilename(filename + '.part'), 'wb') as f:
+            f.write(TEST_DATA[:6000] + b'\0' * (TEST_SIZE - 6000))
+        with open(encodeFilename(filename + '.ytdl'), 'w') as f:
+            f.write(json.dumps({'downloader': {
+                'total_bytes': TEST_SIZE,
+                'ranges': [
+                    {'start': 0, 'end': 5119, 'downloaded': 5120},
+                    {'start': 5120, 'end': 10239, 'downloaded': 880},
+                ],
+            }}))
+        self.assertTrue(downloader.real_download(filename, {
+            'url': 'http://127.0.0.1:%d/data' % self.port,
+        }))
+        with open(encodeFilename(filename), 'rb') as f:
+            self.assertEqual(f.read(), TEST_DATA)
+        self.assertEqual(self.httpd.ranges, ['bytes=0-0', 'bytes=6000-10239'])
+        self.assertFalse(os.path.exists(encodeFilename(filename + '.ytdl')))
+        try_rm(encodeFilename(filename))
+
+    def test_connections_state_dropped(self):
+        # A download over a single connection resumes from the first
+        # missing byte of an interrupted one over several connections
+        params = {'logger': FakeLogger()}
+        downloader = HttpFD(YoutubeDL(params), params)
+        filename = 'testfile.mp4'
+        with open(encodeFilename(filename + '.part'), 'wb') as f:
+            f.write(TEST_DATA[:2000] + b'\0' * 3120 + TEST_DATA[5120:6000] + b'\0' * (TEST_SIZE - 6000))
+        with open(encodeFilename(filename + '.ytdl'), 'w') as f:
+            f.write(json.dumps({'downloader': {
+                'total_bytes': TEST_SIZE,
+                'ranges': [
+                    {'start': 0, 'end': 5119, 'downloaded': 2000},
+                    {'start': 5120, 'end': 10239, 'downloaded': 880},
+                ],
+            }}))
+        self.assertTrue(downloader.real_download(filename, {
+            'url': 'http://127.0.0.1:%d/data' % self.port,
+        }))
+        with open(encodeFilename(filename), 'rb') as f:
+            self.assertEqual(f.read(), TEST_DATA)
+        self.assertEqual(self.httpd.ranges, ['bytes=2000-'])
+        self.assertFalse(os.path.exists(encodeFilename(filename + '.ytdl')))
+        try_rm(encodeFilename(filename))
+
 
 if __name__ == '__main__':
     unittest.main()
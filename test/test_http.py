@@ -10,8 +10,16 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from test.helper import http_server_port
 from youtube_dl import YoutubeDL
-from youtube_dl.compat import compat_http_server, compat_urllib_request
+from youtube_dl.compat import (
+    compat_http_client,
+    compat_http_server,
+    compat_urllib_error,
+    compat_urllib_request,
+)
+import shutil
+import socket
 import ssl
+import tempfile
 import threading
 
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -65,6 +73,8 @@ class FakeLogger(object):
 
 class TestHTTP(unittest.TestCase):
     def setUp(self):
+        # The videos are downloaded there
+        self.tmpdir = tempfile.mkdtemp()
         self.httpd = compat_http_server.HTTPServer(
             ('127.0.0.1', 0), HTTPTestRequestHandler)
         self.port = http_server_port(self.httpd)
@@ -72,18 +82,23 @@ class TestHTTP(unittest.TestCase):
         self.server_thread.daemon = True
         self.server_thread.start()
 
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
     def test_unicode_path_redirection(self):
         # XXX: Python 3 http server does not allow non-ASCII header values
         if sys.version_info[0] == 3:
             return
 
-        ydl = YoutubeDL({'logger': FakeLogger()})
+        ydl = YoutubeDL({'logger': FakeLogger(), 'outtmpl': os.path.join(self.tmpdir, '%(id)s.%(ext)s')})
         r = ydl.extract_info('http://127.0.0.1:%d/302' % self.port)
         self.assertEqual(r['entries'][0]['url'], 'http://127.0.0.1:%d/vid.mp4' % self.port)
 
 
 class TestHTTPS(unittest.TestCase):
     def setUp(self):
+        # The videos are downloaded there
+        self.tmpdir = tempfile.mkdtemp()
         certfn = os.path.join(TEST_DIR, 'testcert.pem')
         self.httpd = compat_http_server.HTTPServer(
             ('127.0.0.1', 0), HTTPTestRequestHandler)
@@ -94,14 +109,18 @@ class TestHTTPS(unittest.TestCase):
         self.server_thread.daemon = True
         self.server_thread.start()
 
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
     def test_nocheckcertificate(self):
+        outtmpl = os.path.join(self.tmpdir, '%(id)s.%(ext)s')
         if sys.version_info >= (2, 7, 9):  # No certificate checking anyways
-            ydl = YoutubeDL({'logger': FakeLogger()})
+            ydl = YoutubeDL({'logger': FakeLogger(), 'outtmpl': outtmpl})
             self.assertRaises(
                 Exception,
                 ydl.extract_info, 'https://127.0.0.1:%d/video.html' % self.port)
 
-        ydl = YoutubeDL({'logger': FakeLogger(), 'nocheckcertificate': True})
+        ydl = YoutubeDL({'logger': FakeLogger(), 'nocheckcertificate': True, 'outtmpl': outtmpl})
         r = ydl.extract_info('https://127.0.0.1:%d/video.html' % self.port)
         self.assertEqual(r['entries'][0]['url'], 'https://127.0.0.1:%d/vid.mp4' % self.port)
 
@@ -162,5 +181,77 @@ class TestProxy(unittest.TestCase):
         self.assertEqual(response, 'normal: http://xn--fiq228c.tw/')
 
 
+class KeepAliveRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.clients.append(self.client_address)
+        if self.path == '/chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for chunk in (b'ab', b'cd', b''):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            return
+        data = self.path.encode('utf-8') * 1000
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        if self.path == '/drop':
+            # Close the connection without telling the client
+            self.close_connection = True
+
+    def do_POST(self):
+        self.server.clients.append(self.client_address)
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class TestKeepAlive(unittest.TestCase):
+    def setUp(self):
+        self.httpd = compat_http_server.HTTPServer(
+            ('127.0.0.1', 0), KeepAliveRequestHandler)
+        self.httpd.clients = []
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def _urlopen(self, ydl, path):
+        return ydl.urlopen('http://127.0.0.1:%d%s' % (self.port, path))
+
+    def test_keep_alive(self):
+        ydl = YoutubeDL({'logger': FakeLogger()})
+        for path in ('/a', '/b', '/chunked', '/c'):
+            data = self._urlopen(ydl, path).read()
+            self.assertEqual(data, b'abcd' if path == '/chunked' else path.encode('utf-8') * 1000)
+        self.assertEqual(len(set(self.httpd.clients)), 1)
+
+        # The connection of a response closed before its end is not reused
+        self._urlopen(ydl, '/d').close()
+        self.assertEqual(self._urlopen(ydl, '/e').read(), b'/e' * 1000)
+        self.assertEqual(len(set(self.httpd.clients)), 2)
+
+        # Connections closed by the server are replaced
+        self.assertEqual(self._urlopen(ydl, '/drop').read(), b'/drop' * 1000)
+        self.assertEqual(self._urlopen(ydl, '/f').read(), b'/f' * 1000)
+        self.assertEqual(len(set(self.httpd.clients)), 3)
+
+        # But requests with a body are not sent again
+        self.assertEqual(self._urlopen(ydl, '/drop').read(), b'/drop' * 1000)
+        url = 'http://127.0.0.1:%d/post' % self.port
+        self.assertRaises(
+            (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error),
+            ydl.urlopen, compat_urllib_request.Request(url, b'data'))
+        self.assertEqual(ydl.urlopen(compat_urllib_request.Request(url, b'data')).read(), b'data')
+
+
 if __name__ == '__main__':
     unittest.main()
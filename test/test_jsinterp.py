@@ -73,8 +73,6 @@ class TestJSInterpreter(unittest.TestCase):
         self.assertEqual(jsi.call_function('f'), -11)
 
     def test_comments(self):
-        'Skipping: Not yet fully implemented'
-        return
         jsi = JSInterpreter('''
         function x() {
             var x = /* 1 + */ 2;
@@ -112,6 +110,38 @@ class TestJSInterpreter(unittest.TestCase):
         ''')
         self.assertEqual(jsi.call_function('z'), 5)
 
+    def test_associativity(self):
+        jsi = JSInterpreter('function f(){return 10 - 5 - 2;}')
+        self.assertEqual(jsi.call_function('f'), 3)
+
+        jsi = JSInterpreter('function f(){return 1 + 2 * 3 % 4 << 1 | 1;}')
+        self.assertEqual(jsi.call_function('f'), 7)
+
+    def test_object(self):
+        jsi = JSInterpreter('''
+        var x = 3, y = /not an object/;
+        var $o = {
+            "sw": function(a, b) {var c = a[0]; a[0] = a[b % a.length]; a[b % a.length] = c},
+            rv: function(a) {a.reverse()},
+            sp: function(a, b) {a.splice(0, b)}
+        };
+        function f(a) {
+            a = a.split("");
+            $o.sw(a, 9); $o["rv"](a); $o.sp(a, 2);
+            return a.join('')
+        }
+        ''')
+        self.assertEqual(jsi.call_function('f', 'abcdefgh'), 'fedcab')
+        self.assertEqual(jsi.call_function('f', '0123456789'), '76543219')
+
+    def test_compiled_reuse(self):
+        jsi = JSInterpreter('function f(a){var b = [a, a * 2]; b[0] += 1; return b}')
+        f = jsi.extract_function('f')
+        self.assertEqual(f([1]), [2, 2])
+        # Each call gets its own local variables and arrays
+        self.assertEqual(f([2]), [3, 4])
+        self.assertEqual(jsi.call_function('f', 5), [6, 10])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding: utf-8
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+
+from youtube_dl.m3u8 import (
+    M3U8MasterPlaylist,
+    M3U8MediaPlaylist,
+    M3U8Segment,
+)
+
+MEDIA_PLAYLIST = '''#EXTM3U
+#EXT-X-TARGETDURATION:6
+#EXT-X-MEDIA-SEQUENCE:100
+#EXT-X-PLAYLIST-TYPE:EVENT
+#EXTINF:6,
+seg100.ts
+#EXT-X-KEY:METHOD=AES-128,URI="/keys/1",IV=0x000102030405060708090a0b0c0d0e0f
+#EXT-X-BYTERANGE:1000@0
+#EXTINF:6,
+seg101.ts
+#EXT-X-BYTERANGE:500
+#EXTINF:6,
+seg101.ts
+#UPLYNK-SEGMENT:fadd0d418aea4c5da8b87feec9b0acbc,00000000,ad
+#EXTINF:6,
+https://ads.example.com/ad.ts
+#UPLYNK-SEGMENT:fadd0d418aea4c5da8b87feec9b0acbc,00000000,segment
+#EXT-X-KEY:METHOD=NONE
+#EXTINF:6,
+seg104.ts
+#EXT-X-ENDLIST
+'''
+
+
+class TestM3U8(unittest.TestCase):
+    def test_media_playlist(self):
+        playlist = M3U8MediaPlaylist(MEDIA_PLAYLIST, 'http://example.com/hls/index.m3u8')
+        self.assertEqual(playlist.target_duration, 6)
+        self.assertEqual(playlist.media_sequence, 100)
+        self.assertEqual(playlist.playlist_type, 'EVENT')
+        self.assertTrue(playlist.ended)
+        self.assertEqual(playlist.keys, [
+            {'METHOD': 'NONE'},
+            {'METHOD': 'AES-128', 'URI': 'http://example.com/keys/1',
+             'IV': b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b\x0c\x0d\x0e\x0f'},
+            {'METHOD': 'NONE'},
+        ])
+        self.assertEqual(playlist.segments, [
+            M3U8Segment('http://example.com/hls/seg100.ts', None, 0, 100, False),
+            M3U8Segment('http://example.com/hls/seg101.ts', (0, 1000), 1, 101, False),
+            M3U8Segment('http://example.com/hls/seg101.ts', (1000, 1500), 1, 102, False),
+            M3U8Segment('https://ads.example.com/ad.ts', None, 1, 103, True),
+            M3U8Segment('http://example.com/hls/seg104.ts', None, 2, 104, False),
+        ])
+        self.assertEqual(playlist.media_segments, [
+            s for s in playlist.segments if not s.ad])
+        self.assertEqual(playlist.ad_count, 1)
+
+        playlist = M3U8MediaPlaylist('#EXTM3U\n#EXTINF:4,\r\na.ts\r\n', 'http://example.com/')
+        self.assertEqual(playlist.target_duration, None)
+        self.assertFalse(playlist.ended)
+        self.assertEqual(playlist.segments, [M3U8Segment('http://example.com/a.ts', None, 0, 0, False)])
+
+    def test_master_playlist(self):
+        with io.open('./test/testdata/m3u8/ted_18923.m3u8', encoding='utf-8') as f:
+            playlist = M3U8MasterPlaylist(f.read(), 'http://hls.ted.com/talks/1.m3u8')
+        self.assertEqual(len(playlist.media), 1)
+        self.assertEqual(playlist.media[0]['GROUP-ID'], '600k')
+        self.assertEqual(playlist.media[0]['URI'], '/videos/BorisHesser_2018S/audio/600k.m3u8?nobumpers=true&uniqueId=76011e2b')
+        self.assertEqual(len(playlist.variants), 8)
+        stream_inf, url = playlist.variants[0]
+        self.assertEqual(stream_inf['BANDWIDTH'], '1255659')
+        self.assertEqual(stream_inf['RESOLUTION'], '640x360')
+        self.assertEqual(url, 'http://hls.ted.com/videos/BorisHesser_2018S/video/600k.m3u8?nobumpers=true&uniqueId=76011e2b')
+
+
+if __name__ == '__main__':
+    unittest.main()
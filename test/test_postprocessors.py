@@ -8,10 +8,264 @@ import sys
 import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from youtube_dl.postprocessor import MetadataFromTitlePP
+import io
+import json
+import shutil
+import stat
+import tempfile
+
+from test.helper import FakeYDL
+from youtube_dl.downloader.http import HttpFD
+from youtube_dl.postprocessor import (
+    FFmpegEmbedSubtitlePP,
+    FFmpegFixupM4aPP,
+    FFmpegFixupStretchedPP,
+    FFmpegMergerPP,
+    FFmpegMetadataPP,
+    MetadataFromTitlePP,
+)
+from youtube_dl.postprocessor.common import PostProcessor
+from youtube_dl.postprocessor.ffmpeg import FFmpegPostProcessorError
+from youtube_dl.utils import DownloadError
+
+
+# Stands in for ffmpeg, writes its inputs one after the other and logs its
+# arguments to the calls file next to it
+FAKE_FFMPEG = '''#!%s
+import json
+import os
+import sys
+
+args = sys.argv[1:]
+if '-version' in args:
+    print('ffmpeg version 4.0')
+    sys.exit()
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calls'), 'a') as log:
+    log.write(json.dumps(args) + '\\n')
+inputs = [args[i + 1] for i, a in enumerate(args) if a == '-i']
+out_path = args[-1][len('file:'):]
+if 'fail' in out_path:
+    sys.stderr.write('Invalid data found when processing input\\n')
+    sys.exit(1)
+with open(out_path, 'wb') as out:
+    for url in inputs:
+        if url.startswith('pipe:'):
+            f = os.fdopen(int(url[len('pipe:'):]), 'rb')
+        else:
+            f = open(url[len('file:'):], 'rb')
+        with f:
+            out.write(f.read())
+''' % sys.executable
+
+
+class FakeFFmpegTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.bindir = os.path.join(self.tmpdir, 'bin')
+        os.mkdir(self.bindir)
+        ffmpeg = os.path.join(self.bindir, 'ffmpeg')
+        with io.open(ffmpeg, 'w', encoding='utf-8') as f:
+            f.write(FAKE_FFMPEG)
+        os.chmod(ffmpeg, os.stat(ffmpeg).st_mode | stat.S_IEXEC)
+        self.ydl = FakeYDL({'ffmpeg_location': ffmpeg})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def ffmpeg_calls(self):
+        """Return the arguments of the ffmpeg runs so far"""
+        calls_file = os.path.join(self.bindir, 'calls')
+        if not os.path.exists(calls_file):
+            return []
+        with io.open(calls_file, encoding='utf-8') as f:
+            calls = [json.loads(line) for line in f]
+        os.remove(calls_file)
+        return calls
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
 
 
 class TestMetadataFromTitle(unittest.TestCase):
     def test_format_to_regex(self):
         pp = MetadataFromTitlePP(None, '%(title)s - %(artist)s')
         self.assertEqual(pp._titleregex, r'(?P<title>.+)\ \-\ (?P<artist>.+)')
+
+
+@unittest.skipIf(os.name == 'nt', 'the fake ffmpeg is a script')
+class TestFFmpegPlan(FakeFFmpegTestCase):
+    def test_single_pass(self):
+        filename = self.write_file('video.mp4', b'video')
+        sub_filename = self.write_file('video.en.vtt', b'subs')
+        self.ydl.add_post_processor(FFmpegMetadataPP(self.ydl))
+        self.ydl.add_post_processor(FFmpegEmbedSubtitlePP(self.ydl))
+        self.ydl.post_process(filename, {
+            'id': 'video',
+            'title': 'Video',
+            'ext': 'mp4',
+            'container': 'm4a_dash',
+            'stretched_ratio': 2,
+            'requested_subtitles': {'en': {'ext': 'vtt'}},
+            '__postprocessors': [FFmpegFixupStretchedPP(self.ydl), FFmpegFixupM4aPP(self.ydl)],
+        })
+        self.assertEqual(self.ffmpeg_calls(), [[
+            '-y', '-loglevel', 'repeat+info',
+            '-i', 'file:' + filename, '-i', 'file:' + sub_filename,
+            '-c', 'copy', '-map', '0', '-map', '-0:s', '-map', '-0:d',
+            '-aspect', '2.000000', '-f', 'mp4', '-metadata', 'title=Video',
+            '-c:s', 'mov_text', '-map', '1:0', '-metadata:s:s:0', 'language=eng',
+            'file:' + os.path.join(self.tmpdir, 'video.temp.mp4')]])
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'videosubs')
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['bin', 'video.mp4'])
+
+    def test_merge(self):
+        filename = os.path.join(self.tmpdir, 'video.mp4')
+        files_to_merge = [
+            self.write_file('video.f1.mp4', b'video'),
+            self.write_file('video.f2.m4a', b'audio'),
+        ]
+        self.ydl.add_post_processor(FFmpegMetadataPP(self.ydl))
+        self.ydl.post_process(filename, {
+            'id': 'video',
+            'title': 'Video',
+            'ext': 'mp4',
+            'chapters': [{'start_time': 0, 'end_time': 1, 'title': 'Intro'}],
+            '__files_to_merge': files_to_merge,
+            '__postprocessors': [FFmpegMergerPP(self.ydl)],
+        })
+        self.assertEqual(self.ffmpeg_calls(), [[
+            '-y', '-loglevel', 'repeat+info',
+            '-i', 'file:' + files_to_merge[0], '-i', 'file:' + files_to_merge[1],
+            '-i', 'file:' + os.path.join(self.tmpdir, 'video.meta'),
+            '-c', 'copy', '-map', '0:v:0', '-map', '1:a:0',
+            '-metadata', 'title=Video', '-map_metadata', '2',
+            'file:' + os.path.join(self.tmpdir, 'video.temp.mp4')]])
+        with open(filename, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'videoaudio;FFMETADATA1'))
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['bin', 'video.mp4'])
+
+    def test_interrupted_plan(self):
+        filename = self.write_file('video.mp4', b'video')
+        contents = []
+
+        class ReadPP(PostProcessor):
+            def run(self, info):
+                with open(info['filepath'], 'rb') as f:
+                    contents.append(f.read())
+                return [], info
+
+        self.ydl.add_post_processor(FFmpegFixupStretchedPP(self.ydl))
+        self.ydl.add_post_processor(ReadPP(self.ydl))
+        self.ydl.add_post_processor(FFmpegFixupM4aPP(self.ydl))
+        self.ydl.post_process(filename, {
+            'id': 'video',
+            'ext': 'mp4',
+            'container': 'm4a_dash',
+            'stretched_ratio': 2,
+        })
+        calls = self.ffmpeg_calls()
+        self.assertEqual(len(calls), 2)
+        self.assertTrue('-aspect' in calls[0] and '-f' not in calls[0])
+        self.assertTrue('-f' in calls[1] and '-aspect' not in calls[1])
+        # The first run is complete before the next postprocessor
+        self.assertEqual(contents, [b'video'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'video.temp.mp4')))
+
+
+@unittest.skipIf(os.name == 'nt', 'no pipes for ffmpeg on Windows')
+class TestStreamMerge(FakeFFmpegTestCase):
+    def setUp(self):
+        super(TestStreamMerge, self).setUp()
+        self.merger = FFmpegMergerPP(self.ydl)
+
+    def test_run_streaming(self):
+        self.assertTrue(self.merger.can_stream())
+        filename = os.path.join(self.tmpdir, 'out.mp4')
+
+        def write(streams):
+            video, audio = streams
+            audio.write(b'audio')
+            audio.close()
+            for _ in range(100):
+                video.write(b'video' * 1000)
+            video.close()
+            return True
+
+        self.assertTrue(self.merger.run_streaming(filename, write))
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'video' * 100000 + b'audio')
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['bin', 'out.mp4'])
+
+        os.remove(filename)
+        self.assertFalse(self.merger.run_streaming(filename, lambda streams: False))
+        self.assertEqual(os.listdir(self.tmpdir), ['bin'])
+
+    def test_run_streaming_error(self):
+        def write(streams):
+            for stream in streams:
+                for _ in range(100):
+                    stream.write(b'video' * 1000)
+            return True
+
+        filename = os.path.join(self.tmpdir, 'fail.mp4')
+        self.assertRaises(
+            FFmpegPostProcessorError, self.merger.run_streaming, filename, write)
+        self.assertEqual(os.listdir(self.tmpdir), ['bin'])
+
+        # Errors of the downloads are not replaced by the ones of ffmpeg
+        def interrupted_write(streams):
+            streams[0].write(b'video')
+            raise DownloadError('interrupted')
+
+        self.assertRaises(
+            DownloadError, self.merger.run_streaming, filename, interrupted_write)
+
+    def test_stream_merge(self):
+        filename = os.path.join(self.tmpdir, 'out.mp4')
+        downloads = [
+            (os.path.join(self.tmpdir, 'out.f1.mp4'), {'url': 'http://localhost/v', 'data': b'video'}),
+            (os.path.join(self.tmpdir, 'out.f2.m4a'), {'url': 'http://localhost/a', 'data': b'audio'}),
+        ]
+
+        def dl(stream, info, progress_hooks):
+            stream.write(info['data'])
+            return True
+
+        self.assertTrue(self.ydl._stream_merge(self.merger, dl, downloads, filename, {}))
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'videoaudio')
+
+        # Fall back to files on ffmpeg errors
+        warnings = []
+        self.ydl.report_warning = warnings.append
+        filename = os.path.join(self.tmpdir, 'fail.mp4')
+        self.assertEqual(self.ydl._stream_merge(self.merger, dl, downloads, filename, {}), None)
+        self.assertTrue('Invalid data found' in warnings[0])
+
+        # Streams are written to despite --no-overwrites
+        class DataFD(HttpFD):
+            def real_download(self, filename, info_dict):
+                filename.write(info_dict['data'])
+                return True
+
+        def fd_dl(stream, info, progress_hooks):
+            return DataFD(self.ydl, {'nooverwrites': True}).download(stream, info)
+
+        filename = os.path.join(self.tmpdir, 'nooverwrites.mp4')
+        self.assertTrue(self.ydl._stream_merge(
+            self.merger, fd_dl, downloads, filename, {'nooverwrites': True}))
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'videoaudio')
+
+        # Only HTTP formats can be streamed
+        downloads[1][1]['url'] = 'rtmp://localhost/a'
+        del downloads[1][1]['protocol']
+        self.assertEqual(self.ydl._stream_merge(self.merger, dl, downloads, filename, {}), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
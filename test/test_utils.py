@@ -11,8 +11,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 # Various small unit tests
+import copy
 import io
 import json
+import time
 import xml.etree.ElementTree
 
 from youtube_dl.utils import (
@@ -21,6 +23,7 @@ from youtube_dl.utils import (
     encode_base_n,
     caesar,
     clean_html,
+    concurrent_imap,
     date_from_str,
     DateRange,
     detect_exe_version,
@@ -104,6 +107,9 @@ from youtube_dl.utils import (
     cli_valueless_option,
     cli_bool_option,
     parse_codecs,
+    TemplatedFragments,
+    TokenBucket,
+    url_expiration_time,
 )
 from youtube_dl.compat import (
     compat_chr,
@@ -642,6 +648,92 @@ class TestUtil(unittest.TestCase):
         testPL(5, 2, (2, 99), [2, 3, 4])
         testPL(5, 2, (20, 99), [])
 
+    def test_concurrent_imap(self):
+        def delayed_square(x):
+            # Finish later items first to check the order is preserved
+            time.sleep((10 - x) * 0.005)
+            return x * x
+
+        for workers in (1, 3):
+            self.assertEqual(
+                list(concurrent_imap(delayed_square, range(10), workers)),
+                [x * x for x in range(10)])
+            self.assertEqual(list(concurrent_imap(delayed_square, [], workers)), [])
+
+        def fail_on_3(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+
+        res = concurrent_imap(fail_on_3, range(10), 4)
+        self.assertEqual([next(res) for _ in range(3)], [0, 1, 2])
+        self.assertRaises(ValueError, next, res)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(20000)
+        self.assertEqual(bucket.capacity, 2000)
+
+        def consume(_):
+            for _ in range(4):
+                bucket.consume(500)
+
+        start = time.time()
+        list(concurrent_imap(consume, range(4), 4))
+        # The first 2000 bytes are a burst, the rest comes at the rate
+        self.assertTrue(time.time() - start >= 0.29)
+
+    def test_templated_fragments(self):
+        fragments = TemplatedFragments(
+            'seg-%(Number)05d-%(Time)d-%(Bandwidth)d.m4s',
+            [(0, 10, 2, 1), (20, 10, 1, 3), (40, 5, 1, 4), (100, 10, 2, 5)],
+            bandwidth=1000, timescale=10, location_key='path',
+            initialization={'path': 'init.mp4'})
+        # Continuing runs with the same duration are merged
+        self.assertEqual(fragments.segments, [(0, 10, 3, 1), (40, 5, 1, 4), (100, 10, 2, 5)])
+        expected = [
+            {'path': 'init.mp4'},
+            {'path': 'seg-00001-0-1000.m4s', 'duration': 1.0},
+            {'path': 'seg-00002-10-1000.m4s', 'duration': 1.0},
+            {'path': 'seg-00003-20-1000.m4s', 'duration': 1.0},
+            {'path': 'seg-00004-40-1000.m4s', 'duration': 0.5},
+            {'path': 'seg-00005-100-1000.m4s', 'duration': 1.0},
+            {'path': 'seg-00006-110-1000.m4s', 'duration': 1.0},
+        ]
+        self.assertEqual(len(fragments), len(expected))
+        self.assertEqual(list(fragments), expected)
+        self.assertEqual([fragments[i] for i in range(len(expected))], expected)
+        self.assertEqual(fragments[-1], expected[-1])
+        self.assertEqual(fragments[:1], expected[:1])
+        self.assertEqual(fragments[3:5], expected[3:5])
+        self.assertRaises(IndexError, lambda: fragments[len(expected)])
+        self.assertIs(copy.deepcopy(fragments), fragments)
+
+        obj = json.loads(json.dumps(fragments.to_json()))
+        self.assertEqual(list(TemplatedFragments.from_json(obj)), expected)
+
+        fragments = TemplatedFragments('%(Number)d.ts', [(0, None, 3, 0)])
+        self.assertEqual(list(fragments), [
+            {'url': '0.ts', 'duration': None},
+            {'url': '1.ts', 'duration': None},
+            {'url': '2.ts', 'duration': None},
+        ])
+        self.assertEqual(len(TemplatedFragments('%(Number)d.ts', [])), 0)
+        # Invalid templates are reported right away
+        self.assertRaises(KeyError, TemplatedFragments, '%(Nmber)d.ts', [(0, None, 3, 0)])
+
+    def test_url_expiration_time(self):
+        self.assertEqual(url_expiration_time(
+            'https://r1.googlevideo.com/videoplayback?expire=1600000000&ei=x'), 1600000000)
+        self.assertEqual(url_expiration_time(
+            'https://manifest.googlevideo.com/api/manifest/dash/expire/1600000000/ei/x'), 1600000000)
+        self.assertEqual(url_expiration_time(
+            'https://example.akamaihd.net/i/v.m3u8?hdnts=st=1599990000~exp=1600000001~acl=/*~hmac=ab'), 1600000001)
+        self.assertEqual(url_expiration_time(
+            'https://example.s3.amazonaws.com/v.mp4?X-Amz-Date=20200913T120000Z&X-Amz-Expires=3600'), 1600002000)
+        self.assertEqual(url_expiration_time(
+            'https://example.com/v.mp4?Expires=1600000002&expire=1600000003'), 1600000002)
+        self.assertEqual(url_expiration_time('https://example.com/v.mp4?e=5&expires=soon'), None)
+
     def test_read_batch_urls(self):
         f = io.StringIO('''\xef\xbb\xbf foo
             bar\r
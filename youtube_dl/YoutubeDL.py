@@ -9,6 +9,8 @@ import copy
 import datetime
 import errno
 import fileinput
+import functools
+import hashlib
 import io
 import itertools
 import json
@@ -17,10 +19,10 @@ import operator
 import os
 import platform
 import re
-import shutil
 import subprocess
 import socket
 import sys
+import threading
 import time
 import tokenize
 import traceback
@@ -39,12 +41,14 @@ from .compat import (
     compat_str,
     compat_tokenize_tokenize,
     compat_urllib_error,
+    compat_urllib_parse_urlparse,
     compat_urllib_request,
     compat_urllib_request_DataHandler,
 )
 from .utils import (
     age_restricted,
     args_to_str,
+    concurrent_imap,
     ContentTooShortError,
     date_from_str,
     DateRange,
@@ -62,7 +66,6 @@ from .utils import (
     GeoRestrictedError,
     int_or_none,
     ISO3166Utils,
-    locked_file,
     make_HTTPS_handler,
     MaxDownloadsReached,
     orderedSet,
@@ -84,8 +87,11 @@ from .utils import (
     std_headers,
     str_or_none,
     subtitles_filename,
+    TemplatedFragments,
+    TokenBucket,
     UnavailableVideoError,
     url_basename,
+    url_expiration_time,
     version_tuple,
     write_json_file,
     write_string,
@@ -94,16 +100,22 @@ from .utils import (
     YoutubeDLHandler,
     YoutubeDLRedirectHandler,
 )
+from .archive import get_download_archive
 from .cache import Cache
+from .metrics import Metrics
+from .profiler import DeterministicProfiler, SamplingProfiler
 from .extractor import get_info_extractor, gen_extractor_classes, _LAZY_LOADER
+from .extractor.dispatcher import URLDispatcher
 from .extractor.openload import PhantomJSwrapper
-from .downloader import get_suitable_downloader
+from .downloader import FileDownloader, get_suitable_downloader
+from .downloader.http import HttpFD
 from .downloader.rtmp import rtmpdump_version
 from .postprocessor import (
     FFmpegFixupM3u8PP,
     FFmpegFixupM4aPP,
     FFmpegFixupStretchedPP,
     FFmpegMergerPP,
+    FFmpegPlan,
     FFmpegPostProcessor,
     get_postprocessor,
 )
@@ -160,6 +172,20 @@ class YoutubeDL(object):
     forcejson:         Force printing info_dict as JSON.
     dump_single_json:  Force printing the info_dict of the whole playlist
                        (or video) as a single JSON line.
+    expand_fragments:  Write every fragment in the JSON information instead
+                       of the compact description of the fragments made
+                       from templates (see TemplatedFragments).
+    print_metrics:     Print the metrics of each video (see metrics) as JSON.
+    metrics_file:      File to append the metrics of each video to, as a
+                       JSON line.
+    profile:           Directory to write a profile of the processing of
+                       each URL to.
+    profile_mode:      "sampling" (the default) to sample the stacks at
+                       regular intervals, written in the collapsed stack
+                       format, or "deterministic" to record every call with
+                       cProfile, written as pstats. Concurrent downloads are
+                       sampled on Python 3.12+, where cProfile can't profile
+                       them separately.
     simulate:          Do not download the video files.
     format:            Video format code. See options.py for more information.
     outtmpl:           Template for output names.
@@ -172,6 +198,8 @@ class YoutubeDL(object):
     playlist_items:    Specific indices of playlist to download.
     playlistreverse:   Download playlist items in reverse order.
     playlistrandom:    Download playlist items in random order.
+    concurrent_downloads: Number of URLs or playlist items to extract and
+                       download concurrently (default is 1).
     matchtitle:        Download only matching titles.
     rejecttitle:       Reject downloads for matching titles.
     logger:            Log messages to a logging.Logger instance.
@@ -193,6 +221,15 @@ class YoutubeDL(object):
     skip_download:     Skip the actual download of the video file
     cachedir:          Location of the cache files in the filesystem.
                        False to disable filesystem cache.
+    cache_max_size:    Maximum size of the filesystem cache in bytes, the
+                       least recently used entries are removed beyond it.
+    cache_ttls:        Dictionary of the time to live in seconds of the
+                       entries of cache sections (None for no expiration),
+                       overriding the defaults.
+    info_cache_ttl:    Time in seconds the information extracted for a video
+                       is cached for and reused instead of extracting it
+                       again, shortened when the URLs of its formats expire
+                       earlier. None (the default) disables it.
     noplaylist:        Download single video instead of a playlist if in doubt.
     age_limit:         An integer representing the user's age in years.
                        Unsuitable videos for the given age are skipped.
@@ -207,7 +244,9 @@ class YoutubeDL(object):
                        downloaded. None for no limit.
     download_archive:  File name of a file where all downloads are recorded.
                        Videos already present in the file are not downloaded
-                       again.
+                       again. Files with .db, .sqlite or .sqlite3 extension
+                       (or existing SQLite databases) are handled as indexed
+                       SQLite archives.
     cookiefile:        File name where cookies should be read from and dumped to.
     nocheckcertificate:Do not verify SSL certificates
     prefer_insecure:   Use HTTP instead of HTTPS to retrieve information.
@@ -255,7 +294,12 @@ class YoutubeDL(object):
 
                        Progress hooks are guaranteed to be called at least once
                        (with status "finished") if the download is successful.
+                       The formats to merge are downloaded at the same time,
+                       their progress is reported together, filename being
+                       the one of the merged file.
     merge_output_format: Extension to use when merging formats.
+    stream_merge:      Merge the formats as they are downloaded, without
+                       writing them to files (HTTP formats with ffmpeg only).
     fixup:             Automatically correct known faults of the file.
                        One of:
                        - "never": do nothing
@@ -292,6 +336,12 @@ class YoutubeDL(object):
     geo_bypass_ip_block:
                        IP range in CIDR notation that will be used similarly to
                        geo_bypass_country
+    ratelimit:         Download speed limit, in bytes/sec, shared by all the
+                       downloads, their fragments and the subtitles and
+                       thumbnails.
+    host_ratelimits:   A dictionary of hostnames to download speed limits, in
+                       bytes/sec, for the host and its subdomains, on top of
+                       ratelimit.
 
     The following options determine which downloader is picked:
     external_downloader: Executable of the external downloader to call.
@@ -302,10 +352,10 @@ class YoutubeDL(object):
 
     The following parameters are not used by YoutubeDL itself, they are used by
     the downloader (see youtube_dl/downloader/common.py):
-    nopart, updatetime, buffersize, ratelimit, min_filesize, max_filesize, test,
+    nopart, updatetime, buffersize, min_filesize, max_filesize, test,
     noresizebuffer, retries, continuedl, noprogress, consoletitle,
     xattr_set_filesize, external_downloader_args, hls_use_mpegts,
-    http_chunk_size.
+    http_chunk_size, http_connections, concurrent_fragment_downloads.
 
     The following options are used by the post processors:
     prefer_ffmpeg:     If False, use avconv instead of ffmpeg if both are available,
@@ -339,6 +389,11 @@ class YoutubeDL(object):
     _download_retcode = None
     _num_downloads = None
     _screen_file = None
+    # Maximum number of subtitles and thumbnails of a video fetched at once
+    _SIDE_FETCH_WORKERS = 8
+    # Cached information is not used when the URLs of its formats expire
+    # sooner than this many seconds, so that they can be downloaded
+    _INFO_CACHE_EXPIRATION_MARGIN = 30 * 60
 
     def __init__(self, params=None, auto_init=True):
         """Create a FileDownloader object with the given options."""
@@ -346,10 +401,22 @@ class YoutubeDL(object):
             params = {}
         self._ies = []
         self._ies_instances = {}
+        self._url_dispatcher = None
+        self._ies_lock = threading.Lock()
         self._pps = []
         self._progress_hooks = []
         self._download_retcode = 0
         self._num_downloads = 0
+        self._num_downloads_lock = threading.Lock()
+        self._download_archive = None
+        self._download_archive_lock = threading.Lock()
+        self._rate_limiters = {}
+        self._rate_limiters_lock = threading.Lock()
+        self._metrics_file_lock = threading.Lock()
+        # Format selectors by format spec, see _format_selector
+        self._format_selectors = {}
+        # State of the current thread, see _map_concurrently
+        self._local = threading.local()
         self._screen_file = [sys.stdout, sys.stderr][params.get('logtostderr', False)]
         self._err_file = sys.stderr
         self.params = {
@@ -374,6 +441,14 @@ class YoutubeDL(object):
         check_deprecated('autonumber', '--auto-number', '-o "%(autonumber)s-%(title)s.%(ext)s"')
         check_deprecated('usetitle', '--title', '-o "%(title)s-%(id)s.%(ext)s"')
 
+        if (self.params.get('profile') and self.params.get('profile_mode') == 'deterministic'
+                and (self.params.get('concurrent_downloads') or 1) > 1
+                and not DeterministicProfiler.CONCURRENT):
+            self.report_warning(
+                'Concurrent downloads can\'t be profiled deterministically with this Python version, '
+                'sampling them instead')
+            self.params['profile_mode'] = 'sampling'
+
         if params.get('bidi_workaround', False):
             try:
                 import pty
@@ -453,6 +528,8 @@ class YoutubeDL(object):
     def add_info_extractor(self, ie):
         """Add an InfoExtractor object to the end of the list."""
         self._ies.append(ie)
+        if self._url_dispatcher is not None:
+            self._url_dispatcher.add(ie)
         if not isinstance(ie, type):
             self._ies_instances[ie.ie_key()] = ie
             ie.set_downloader(self)
@@ -462,13 +539,55 @@ class YoutubeDL(object):
         Get an instance of an IE with name ie_key, it will try to get one from
         the _ies list, if there's no instance it will create a new one and add
         it to the extractor list.
+        Worker threads of concurrent downloads get their own copy of it.
         """
         ie = self._ies_instances.get(ie_key)
         if ie is None:
-            ie = get_info_extractor(ie_key)()
-            self.add_info_extractor(ie)
+            with self._ies_lock:
+                ie = self._ies_instances.get(ie_key)
+                if ie is None:
+                    ie = get_info_extractor(ie_key)()
+                    self.add_info_extractor(ie)
+        worker_ies = getattr(self._local, 'ies_instances', None)
+        if worker_ies is not None:
+            # Extractors keep the state of the current extraction, caches
+            # remain shared
+            if ie_key not in worker_ies:
+                worker_ies[ie_key] = copy.copy(ie)
+            ie = worker_ies[ie_key]
         return ie
 
+    def _suitable_ies(self, url):
+        """
+        Return the info extractors that may be suitable for url, in the
+        order they were added.
+        """
+        with self._ies_lock:
+            if self._url_dispatcher is None:
+                self._url_dispatcher = URLDispatcher(self._ies)
+        return self._url_dispatcher.candidates(url)
+
+    def _map_concurrently(self, func, items):
+        """
+        Return an iterator over the results of func for each item of the
+        items list, computed by concurrent_downloads worker threads unless
+        called from one of them.
+        """
+        workers = self.params.get('concurrent_downloads') or 1
+        if workers <= 1 or len(items) <= 1 or getattr(self._local, 'worker', False):
+            return (func(item) for item in items)
+
+        # The items of a URL are profiled with it
+        profiled_func = self._profiled(func)
+
+        def run_worker(item):
+            if not getattr(self._local, 'worker', False):
+                self._local.worker = True
+                self._local.ies_instances = {}
+            return profiled_func(item)
+
+        return concurrent_imap(run_worker, items, workers)
+
     def add_default_info_extractors(self):
         """
         Add the InfoExtractors returned by gen_extractors to the end of the list
@@ -565,6 +684,10 @@ class YoutubeDL(object):
         if self.params.get('cookiefile') is not None:
             self.cookiejar.save(ignore_discard=True, ignore_expires=True)
 
+        if self._download_archive is not None:
+            self._download_archive.close()
+            self._download_archive = None
+
     def trouble(self, message=None, tb=None):
         """Determine action to take when a download problem appears.
 
@@ -640,7 +763,8 @@ class YoutubeDL(object):
             autonumber_size = self.params.get('autonumber_size')
             if autonumber_size is None:
                 autonumber_size = 5
-            template_dict['autonumber'] = self.params.get('autonumber_start', 1) - 1 + self._num_downloads
+            template_dict['autonumber'] = self.params.get('autonumber_start', 1) - 1 + getattr(
+                self._local, 'num_downloads', self._num_downloads)
             if template_dict.get('resolution') is None:
                 if template_dict.get('width') and template_dict.get('height'):
                     template_dict['resolution'] = '%dx%d' % (template_dict['width'], template_dict['height'])
@@ -782,7 +906,7 @@ class YoutubeDL(object):
         if ie_key:
             ies = [self.get_info_extractor(ie_key)]
         else:
-            ies = self._ies
+            ies = self._suitable_ies(url)
 
         for ie in ies:
             if not ie.suitable(url):
@@ -794,7 +918,11 @@ class YoutubeDL(object):
                                     'and will probably not work.')
 
             try:
-                ie_result = ie.extract(url)
+                cache_key = self._info_cache_key(ie, url)
+                ie_result = self._load_cached_info(cache_key)
+                from_cache = ie_result is not None
+                if not from_cache:
+                    ie_result = self._extract_to_cache(ie, url, cache_key)
                 if ie_result is None:  # Finished already (backwards compatibility; listformats and friends should be moved here)
                     break
                 if isinstance(ie_result, list):
@@ -804,10 +932,25 @@ class YoutubeDL(object):
                         'entries': ie_result,
                     }
                 self.add_default_extra_info(ie_result, ie, url)
-                if process:
+                if not process:
+                    return ie_result
+                if not from_cache:
                     return self.process_ie_result(ie_result, download, extra_info)
+                # Only the failures of the downloads of this thread count,
+                # not the errors of the postprocessors or of other threads
+                self._local.download_failed = False
+                try:
+                    res = self.process_ie_result(ie_result, download, extra_info)
+                except DownloadError:
+                    if not self._local.download_failed:
+                        raise
                 else:
-                    return ie_result
+                    if not self._local.download_failed:
+                        return res
+                # The URLs of the cached information may not work anymore
+                self.cache.delete('info', cache_key)
+                self.to_screen('[info] Extracting %s again instead of using the cached information' % url)
+                return self.extract_info(url, download, ie.ie_key(), extra_info, process)
             except GeoRestrictedError as e:
                 msg = e.msg
                 if e.countries:
@@ -830,6 +973,57 @@ class YoutubeDL(object):
         else:
             self.report_error('no suitable InfoExtractor for URL %s' % url)
 
+    def _info_cache_key(self, ie, url):
+        """
+        Return the cache key of the information extracted from url by ie,
+        None if it's not to be cached.
+        """
+        if self.params.get('info_cache_ttl') is None:
+            return None
+        try:
+            video_id = ie._match_id(url)
+        except (AssertionError, IndexError):
+            return None  # No video ID in the URL
+        if video_id == 'None':
+            return None
+        if not re.match(r'^[a-zA-Z0-9_.-]+$', video_id):
+            video_id = hashlib.sha1(video_id.encode('utf-8')).hexdigest()
+        return '%s_%s' % (ie.ie_key(), video_id)
+
+    def _load_cached_info(self, cache_key):
+        if cache_key is None:
+            return None
+        entry = self.cache.load('info', cache_key)
+        if not entry:
+            return None
+        if entry.get('expires', 0) <= time.time():
+            self.cache.delete('info', cache_key)
+            return None
+        self.to_screen('[info] %s: Using cached information' % entry['info'].get('id'))
+        return entry['info']
+
+    def _extract_to_cache(self, ie, url, cache_key):
+        with self.metrics.timer('extract'):
+            ie_result = ie.extract(url)
+        if (cache_key is None or not isinstance(ie_result, dict)
+                or ie_result.get('_type', 'video') != 'video'):
+            return ie_result
+        expires = time.time() + self.params['info_cache_ttl']
+        for f in [ie_result] + (ie_result.get('formats') or []):
+            for key in ('url', 'manifest_url', 'fragment_base_url'):
+                url_expires = url_expiration_time(f[key]) if isinstance(f.get(key), compat_basestring) else None
+                if url_expires is not None:
+                    expires = min(expires, url_expires - self._INFO_CACHE_EXPIRATION_MARGIN)
+        if expires <= time.time():
+            return ie_result
+        try:
+            info = json.loads(json.dumps(
+                ie_result, default=functools.partial(self._json_default, expand_fragments=False)))
+        except (TypeError, ValueError):
+            return ie_result  # Not serializable
+        self.cache.store('info', cache_key, {'expires': expires, 'info': info})
+        return ie_result
+
     def add_default_extra_info(self, ie_result, ie, url):
         self.add_extra_info(ie_result, {
             'extractor': ie.IE_NAME,
@@ -860,7 +1054,10 @@ class YoutubeDL(object):
 
         if result_type == 'video':
             self.add_extra_info(ie_result, extra_info)
-            return self.process_video_result(ie_result, download=download)
+            try:
+                return self.process_video_result(ie_result, download=download)
+            finally:
+                self._report_metrics(ie_result)
         elif result_type == 'url':
             # We have to add extra_info to the results because it may be
             # contained in a playlist
@@ -978,7 +1175,8 @@ class YoutubeDL(object):
 
             x_forwarded_for = ie_result.get('__x_forwarded_for_ip')
 
-            for i, entry in enumerate(entries, 1):
+            def process_entry(i_entry):
+                i, entry = i_entry
                 self.to_screen('[download] Downloading video %s of %s' % (i, n_entries))
                 # This __x_forwarded_for_ip thing is a bit ugly but requires
                 # minimal changes
@@ -1001,12 +1199,16 @@ class YoutubeDL(object):
                 reason = self._match_entry(entry, incomplete=True)
                 if reason is not None:
                     self.to_screen('[download] ' + reason)
-                    continue
+                    return False, None
 
-                entry_result = self.process_ie_result(entry,
-                                                      download=download,
-                                                      extra_info=extra)
-                playlist_results.append(entry_result)
+                return True, self.process_ie_result(entry,
+                                                    download=download,
+                                                    extra_info=extra)
+
+            for processed, entry_result in self._map_concurrently(
+                    process_entry, list(enumerate(entries, 1))):
+                if processed:
+                    playlist_results.append(entry_result)
             ie_result['entries'] = playlist_results
             self.to_screen('[download] Finished downloading playlist: %s' % playlist)
             return ie_result
@@ -1344,14 +1546,15 @@ class YoutubeDL(object):
                 video_selector, audio_selector = map(_build_selector_function, selector.selector)
 
                 def selector_function(ctx):
-                    for pair in itertools.product(
-                            video_selector(copy.deepcopy(ctx)), audio_selector(copy.deepcopy(ctx))):
+                    for pair in itertools.product(video_selector(ctx), audio_selector(ctx)):
                         yield _merge(pair)
 
             filters = [self._build_format_filter(f) for f in selector.filters]
 
             def final_selector(ctx):
-                ctx_copy = copy.deepcopy(ctx)
+                # The formats are only copied once selected, see
+                # process_video_result
+                ctx_copy = dict(ctx)
                 for _filter in filters:
                     ctx_copy['formats'] = list(filter(_filter, ctx_copy['formats']))
                 return selector_function(ctx_copy)
@@ -1386,6 +1589,17 @@ class YoutubeDL(object):
         parsed_selector = _parse_format_selection(iter(TokenIterator(tokens)))
         return _build_selector_function(parsed_selector)
 
+    def _format_selector(self, format_spec):
+        # Selectors only depend on their spec, they are built once and reused
+        # for all the videos
+        selector = self._format_selectors.get(format_spec)
+        if selector is None:
+            selector = self._format_selectors[format_spec] = self.build_format_selector(format_spec)
+        return selector
+
+    # Fields of the info dict read by _calc_headers
+    _HEADERS_FIELDS = ('http_headers', 'url', '__x_forwarded_for_ip')
+
     def _calc_headers(self, info_dict):
         res = std_headers.copy()
 
@@ -1568,6 +1782,10 @@ class YoutubeDL(object):
                     res=self.format_resolution(format),
                     note=' ({0})'.format(format['format_note']) if format.get('format_note') is not None else '',
                 )
+            # Fragments made from templates as written in the JSON information
+            # (--load-info-json, cached information)
+            if isinstance(format.get('fragments'), dict):
+                format['fragments'] = TemplatedFragments.from_json(format['fragments'])
             # Automatically determine file extension if missing
             if format.get('ext') is None:
                 format['ext'] = determine_ext(format['url']).lower()
@@ -1576,10 +1794,11 @@ class YoutubeDL(object):
             if format.get('protocol') is None:
                 format['protocol'] = determine_protocol(format)
             # Add HTTP headers, so that external programs can use them from the
-            # json output
-            full_format_info = info_dict.copy()
-            full_format_info.update(format)
-            format['http_headers'] = self._calc_headers(full_format_info)
+            # json output. Only the fields used for them are merged, copying
+            # the whole info dict for every format is expensive
+            format['http_headers'] = self._calc_headers(dict(
+                (field, format.get(field, info_dict.get(field)))
+                for field in self._HEADERS_FIELDS))
         # Remove private housekeeping stuff
         if '__x_forwarded_for_ip' in info_dict:
             del info_dict['__x_forwarded_for_ip']
@@ -1602,7 +1821,7 @@ class YoutubeDL(object):
             if self.params.get('verbose'):
                 self.to_stdout('[debug] Default format spec: %s' % req_format)
 
-        format_selector = self.build_format_selector(req_format)
+        format_selector = self._format_selector(req_format)
 
         # While in format selection we may need to have an access to the original
         # format set in order to calculate some metrics or do some processing.
@@ -1630,7 +1849,10 @@ class YoutubeDL(object):
             'incomplete_formats': incomplete_formats,
         }
 
-        formats_to_download = list(format_selector(ctx))
+        with self.metrics.timer('format_selection'):
+            # The selected formats are copies, they are not shared with the
+            # formats field
+            formats_to_download = copy.deepcopy(list(format_selector(ctx)))
         if not formats_to_download:
             raise ExtractorError('requested format not available',
                                  expected=True)
@@ -1723,7 +1945,102 @@ class YoutubeDL(object):
             self.to_stdout(formatSeconds(info_dict['duration']))
         print_mandatory('format')
         if self.params.get('forcejson', False):
-            self.to_stdout(json.dumps(info_dict))
+            self.to_stdout(json.dumps(info_dict, default=self._json_default))
+
+    def _download_together(self, dl, downloads, filename, params):
+        """
+        Download the (filename, info dict) pairs of downloads at the same
+        time with dl, their progress is reported as the one of a single
+        download to filename.
+
+        Return True if all of them are successful.
+        """
+        display = FileDownloader(self, params)
+        lock = threading.Lock()
+        start = time.time()
+        statuses = [{} for _ in downloads]
+
+        def report_progress(idx, s):
+            if s['status'] not in ('downloading', 'finished'):
+                return
+            with lock:
+                statuses[idx] = s
+                finished = all(st.get('status') == 'finished' for st in statuses)
+                total_bytes = [
+                    st.get('total_bytes') if st.get('status') != 'finished'
+                    else st.get('total_bytes') or st.get('downloaded_bytes')
+                    for st in statuses]
+                total_bytes_estimate = [
+                    tb or st.get('total_bytes_estimate')
+                    for tb, st in zip(total_bytes, statuses)]
+                status = {
+                    'status': 'finished' if finished else 'downloading',
+                    'filename': filename,
+                    'downloaded_bytes': sum(
+                        (tb if st.get('status') == 'finished' else st.get('downloaded_bytes')) or 0
+                        for tb, st in zip(total_bytes, statuses)),
+                    'elapsed': time.time() - start,
+                }
+                if None not in total_bytes:
+                    status['total_bytes'] = sum(total_bytes)
+                elif None not in total_bytes_estimate:
+                    status['total_bytes_estimate'] = sum(total_bytes_estimate)
+                if not finished:
+                    speeds = [st.get('speed') for st in statuses if st.get('status') == 'downloading']
+                    if speeds and None not in speeds:
+                        status['speed'] = sum(speeds)
+                    etas = [st.get('eta') for st in statuses if st.get('status') != 'finished']
+                    if None not in etas:
+                        status['eta'] = max(etas)
+                display.report_progress(dict(status))
+                for ph in self._progress_hooks:
+                    ph(dict(status))
+
+        @self.share_metrics
+        def download(item):
+            idx, (name, info) = item
+            return dl(name, info, [functools.partial(report_progress, idx)])
+
+        results = list(concurrent_imap(download, list(enumerate(downloads)), len(downloads)))
+        return all(results)
+
+    def _stream_merge(self, merger, dl, downloads, filename, params):
+        """
+        Merge the formats of downloads into filename with merger as they
+        are downloaded, without writing them to files.
+
+        Return None if they can't be streamed, the success of the download
+        otherwise.
+        """
+        if not merger.can_stream() or len(downloads) != 2:
+            return None
+        for fname, info in downloads:
+            # Only the HTTP downloader can write to a stream, don't throw
+            # away the data of a previous download either
+            if (get_suitable_downloader(info, params) is not HttpFD
+                    or os.path.exists(encodeFilename(fname))
+                    or os.path.exists(encodeFilename(fname + '.part'))):
+                return None
+
+        def dl_stream(stream, info, progress_hooks):
+            try:
+                return dl(stream, info, progress_hooks)
+            finally:
+                # Let ffmpeg know the format is complete
+                stream.close()
+
+        def write_streams(streams):
+            return self._download_together(
+                dl_stream, [(stream, info) for stream, (_, info) in zip(streams, downloads)],
+                filename, params)
+
+        try:
+            return merger.run_streaming(filename, write_streams)
+        except PostProcessingError as err:
+            self.report_warning(
+                'Unable to merge the formats as they are downloaded (%s), '
+                'downloading them first' % error_to_compat_str(err))
+            return None
 
     def process_info(self, info_dict):
         """Process a single resolved IE result."""
@@ -1746,7 +2063,13 @@ class YoutubeDL(object):
             self.to_screen('[download] ' + reason)
             return
 
-        self._num_downloads += 1
+        with self._num_downloads_lock:
+            # Concurrent downloads may have reached the limit meanwhile
+            if max_downloads is not None and self._num_downloads >= int(max_downloads):
+                raise MaxDownloadsReached()
+            self._num_downloads += 1
+            # Number of the download of the current thread, for autonumber
+            self._local.num_downloads = self._num_downloads
 
         info_dict['_filename'] = filename = self.prepare_filename(info_dict)
 
@@ -1805,6 +2128,15 @@ class YoutubeDL(object):
                     self.report_error('Cannot write annotations file: ' + annofn)
                     return
 
+        # Functions fetching the side files, called concurrently with the
+        # download of the media
+        side_fetches = []
+
+        def fetch_queued():
+            # The side files queued so far are written before giving up,
+            # as they were when fetched one after the other
+            self._start_side_fetches(side_fetches)()
+
         subtitles_are_requested = any([self.params.get('writesubtitles', False),
                                        self.params.get('writeautomaticsub')])
 
@@ -1827,18 +2159,12 @@ class YoutubeDL(object):
                             with io.open(encodeFilename(sub_filename), 'w', encoding='utf-8', newline='') as subfile:
                                 subfile.write(sub_info['data'])
                         except (OSError, IOError):
+                            fetch_queued()
                             self.report_error('Cannot write subtitles file ' + sub_filename)
                             return
                     else:
-                        try:
-                            sub_data = ie._request_webpage(
-                                sub_info['url'], info_dict['id'], note=False).read()
-                            with io.open(encodeFilename(sub_filename), 'wb') as subfile:
-                                subfile.write(sub_data)
-                        except (ExtractorError, IOError, OSError, ValueError) as err:
-                            self.report_warning('Unable to download subtitle for "%s": %s' %
-                                                (sub_lang, error_to_compat_str(err)))
-                            continue
+                        side_fetches.append(functools.partial(
+                            self._fetch_subtitle, ie, info_dict, sub_lang, sub_info, sub_filename))
 
         if self.params.get('writeinfojson', False):
             infofn = replace_extension(filename, 'info.json', info_dict.get('ext'))
@@ -1847,18 +2173,39 @@ class YoutubeDL(object):
             else:
                 self.to_screen('[info] Writing video description metadata as JSON to: ' + infofn)
                 try:
-                    write_json_file(self.filter_requested_info(info_dict), infofn)
+                    write_json_file(self.filter_requested_info(info_dict), infofn, default=self._json_default)
                 except (OSError, IOError):
+                    fetch_queued()
                     self.report_error('Cannot write metadata to JSON file ' + infofn)
                     return
 
-        self._write_thumbnails(info_dict, filename)
+        self._write_thumbnails(info_dict, filename, side_fetches)
 
-        if not self.params.get('skip_download', False):
+        wait_side_fetches = self._start_side_fetches(side_fetches)
+        if self.params.get('skip_download', False):
+            wait_side_fetches()
+        else:
             try:
-                def dl(name, info):
-                    fd = get_suitable_downloader(info, self.params)(self, self.params)
-                    for ph in self._progress_hooks:
+                params = self.params
+                if getattr(self._local, 'worker', False):
+                    # Progress lines of concurrent downloads can't be
+                    # updated in place
+                    params = dict(
+                        params, progress_with_newline=True,
+                        progress_prefix='%s: ' % info_dict['id'])
+
+                def dl(name, info, progress_hooks=None):
+                    dl_params = params
+                    if progress_hooks is None:
+                        progress_hooks = self._progress_hooks
+                    else:
+                        # The progress is reported by the caller
+                        dl_params = dict(params, noprogress=True)
+                    fd = get_suitable_downloader(info, dl_params)(self, dl_params)
+                    if dl_params is not params:
+                        # Even the completion, once for all the downloads
+                        fd.remove_progress_hook(fd.report_progress)
+                    for ph in progress_hooks:
                         fd.add_progress_hook(ph)
                     if self.params.get('verbose'):
                         self.to_stdout('[debug] Invoking downloader on %r' % info.get('url'))
@@ -1908,6 +2255,7 @@ class YoutubeDL(object):
                             '[download] %s has already been downloaded and '
                             'merged' % filename)
                     else:
+                        downloads = []
                         for f in requested_formats:
                             new_info = dict(info_dict)
                             new_info.update(f)
@@ -1917,21 +2265,39 @@ class YoutubeDL(object):
                             if not ensure_dir_exists(fname):
                                 return
                             downloaded.append(fname)
-                            partial_success = dl(fname, new_info)
-                            success = success and partial_success
-                        info_dict['__postprocessors'] = postprocessors
-                        info_dict['__files_to_merge'] = downloaded
+                            downloads.append((fname, new_info))
+                        success = None
+                        with self.metrics.timer('download'):
+                            if self.params.get('stream_merge') and postprocessors:
+                                success = self._stream_merge(merger, dl, downloads, filename, params)
+                            if success is None:
+                                success = self._download_together(dl, downloads, filename, params)
+                                info_dict['__postprocessors'] = postprocessors
+                                info_dict['__files_to_merge'] = downloaded
                 else:
                     # Just a single file
-                    success = dl(filename, info_dict)
+                    with self.metrics.timer('download'):
+                        success = dl(filename, info_dict)
             except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error) as err:
+                self._local.download_failed = True
                 self.report_error('unable to download video data: %s' % error_to_compat_str(err))
                 return
             except (OSError, IOError) as err:
                 raise UnavailableVideoError(err)
             except (ContentTooShortError, ) as err:
+                self._local.download_failed = True
                 self.report_error('content too short (expected %s bytes and served %s)' % (err.expected, err.downloaded))
                 return
+            except DownloadError:
+                # Reported by the downloader
+                self._local.download_failed = True
+                raise
+            finally:
+                # The postprocessors may use the side files
+                wait_side_fetches()
+
+            if not success:
+                self._local.download_failed = True
 
             if success and filename != '-':
                 # Fixup content
@@ -2012,19 +2378,23 @@ class YoutubeDL(object):
                 and self.params.get('max_downloads') != 1):
             raise SameFileError(outtmpl)
 
-        for url in url_list:
+        def download_url(url):
             try:
-                # It also downloads the videos
-                res = self.extract_info(
-                    url, force_generic_extractor=self.params.get('force_generic_extractor', False))
+                with self._profile(url):
+                    # It also downloads the videos
+                    return True, self.extract_info(
+                        url, force_generic_extractor=self.params.get('force_generic_extractor', False))
             except UnavailableVideoError:
                 self.report_error('unable to download video')
-            except MaxDownloadsReached:
-                self.to_screen('[info] Maximum number of downloaded files reached.')
-                raise
-            else:
-                if self.params.get('dump_single_json', False):
-                    self.to_stdout(json.dumps(res))
+                return False, None
+
+        try:
+            for success, res in self._map_concurrently(download_url, url_list):
+                if success and self.params.get('dump_single_json', False):
+                    self.to_stdout(json.dumps(res, default=self._json_default))
+        except MaxDownloadsReached:
+            self.to_screen('[info] Maximum number of downloaded files reached.')
+            raise
 
         return self._download_retcode
 
@@ -2045,6 +2415,14 @@ class YoutubeDL(object):
                 raise
         return self._download_retcode
 
+    def _json_default(self, obj, expand_fragments=None):
+        """Encode the objects of info dicts json doesn't know as JSON"""
+        if isinstance(obj, TemplatedFragments):
+            if expand_fragments is None:
+                expand_fragments = self.params.get('expand_fragments', False)
+            return list(obj) if expand_fragments else obj.to_json()
+        raise TypeError('%r is not JSON serializable' % (obj, ))
+
     @staticmethod
     def filter_requested_info(info_dict):
         return dict(
@@ -2059,12 +2437,8 @@ class YoutubeDL(object):
         if ie_info.get('__postprocessors') is not None:
             pps_chain.extend(ie_info['__postprocessors'])
         pps_chain.extend(self._pps)
-        for pp in pps_chain:
-            files_to_delete = []
-            try:
-                files_to_delete, info = pp.run(info)
-            except PostProcessingError as e:
-                self.report_error(e.msg)
+
+        def delete_files(files_to_delete):
             if files_to_delete and not self.params.get('keepvideo', False):
                 for old_filename in files_to_delete:
                     self.to_screen('Deleting original file %s (pass -k to keep)' % old_filename)
@@ -2073,6 +2447,50 @@ class YoutubeDL(object):
                     except (IOError, OSError):
                         self.report_warning('Unable to remove downloaded original file')
 
+        def add_to_plan(plan, pp, info):
+            try:
+                return pp.add_to_plan(plan, info)
+            except PostProcessingError as e:
+                self.report_error(e.msg)
+                return info
+
+        def run_plan(plan):
+            try:
+                with self.metrics.timer('postprocessor.FFmpegPlan'):
+                    files_to_delete = plan.run()
+                delete_files(files_to_delete)
+            except PostProcessingError as e:
+                self.report_error(e.msg)
+
+        # The operations of consecutive ffmpeg based postprocessors are run
+        # in a single ffmpeg invocation
+        plan = None
+        for pp in pps_chain:
+            fusable = isinstance(pp, FFmpegPostProcessor) and pp.available
+            if plan is not None:
+                new_info = add_to_plan(plan, pp, info) if fusable else None
+                if new_info is not None:
+                    info = new_info
+                    continue
+                run_plan(plan)
+                plan = None
+            if fusable:
+                plan = FFmpegPlan(pp, info['filepath'])
+                new_info = add_to_plan(plan, pp, info)
+                if new_info is not None:
+                    info = new_info
+                    continue
+                plan = None
+            files_to_delete = []
+            try:
+                with self.metrics.timer('postprocessor.' + pp.__class__.__name__):
+                    files_to_delete, info = pp.run(info)
+            except PostProcessingError as e:
+                self.report_error(e.msg)
+            delete_files(files_to_delete)
+        if plan is not None:
+            run_plan(plan)
+
     def _make_archive_id(self, info_dict):
         video_id = info_dict.get('id')
         if not video_id:
@@ -2085,7 +2503,7 @@ class YoutubeDL(object):
             if not url:
                 return
             # Try to find matching extractor for the URL and take its ie_key
-            for ie in self._ies:
+            for ie in self._suitable_ies(url):
                 if ie.suitable(url):
                     extractor = ie.ie_key()
                     break
@@ -2093,33 +2511,49 @@ class YoutubeDL(object):
                 return
         return extractor.lower() + ' ' + video_id
 
-    def in_download_archive(self, info_dict):
+    def _get_download_archive(self):
         fn = self.params.get('download_archive')
         if fn is None:
+            return None
+        with self._download_archive_lock:
+            if self._download_archive is None or self._download_archive.filename != fn:
+                self._download_archive = get_download_archive(fn)
+            return self._download_archive
+
+    def in_download_archive(self, info_dict):
+        archive = self._get_download_archive()
+        if archive is None:
             return False
 
         vid_id = self._make_archive_id(info_dict)
         if not vid_id:
             return False  # Incomplete video information
 
-        try:
-            with locked_file(fn, 'r', encoding='utf-8') as archive_file:
-                for line in archive_file:
-                    if line.strip() == vid_id:
-                        return True
-        except IOError as ioe:
-            if ioe.errno != errno.ENOENT:
-                raise
-        return False
+        return vid_id in archive
 
     def record_download_archive(self, info_dict):
-        fn = self.params.get('download_archive')
-        if fn is None:
+        archive = self._get_download_archive()
+        if archive is None:
             return
         vid_id = self._make_archive_id(info_dict)
         assert vid_id
-        with locked_file(fn, 'a', encoding='utf-8') as archive_file:
-            archive_file.write(vid_id + '\n')
+        archive.add(vid_id)
+
+    def import_download_archive(self, fn):
+        """Add the entries of the download archive fn to the download archive"""
+        archive = self._get_download_archive()
+        if archive is None:
+            self.report_error('--download-archive must be specified to import a download archive')
+            return
+        if not os.path.exists(encodeFilename(fn)):
+            self.report_error('download archive %s does not exist' % fn)
+            return
+        self.to_screen('[download] Importing download archive %s into %s' % (fn, archive.filename))
+        source = get_download_archive(fn)
+        try:
+            archive.update(source)
+        finally:
+            source.close()
 
     @staticmethod
     def format_resolution(format, default='unknown'):
@@ -2235,8 +2669,132 @@ class YoutubeDL(object):
         """ Start an HTTP download """
         if isinstance(req, compat_basestring):
             req = sanitized_Request(req)
+        self.metrics.add_request(req.get_full_url())
         return self._opener.open(req, timeout=self._socket_timeout)
 
+    @property
+    def metrics(self):
+        """
+        Metrics of the video processed by the current thread, covering
+        everything done by the thread since the previous video.
+        """
+        metrics = getattr(self._local, 'metrics', None)
+        if metrics is None:
+            metrics = self._local.metrics = Metrics()
+        return metrics
+
+    def share_metrics(self, func):
+        """
+        Return a function calling func with the metrics (and the profiler)
+        of the current thread, for threads working on the same video.
+        """
+        metrics = self.metrics
+        func = self._profiled(func)
+
+        def wrapper(*args, **kwargs):
+            self._local.metrics = metrics
+            return func(*args, **kwargs)
+        return wrapper
+
+    @contextlib.contextmanager
+    def _profile(self, url):
+        """Profile the processing of url if the profile parameter is set."""
+        profile_dir = self.params.get('profile')
+        if not profile_dir:
+            yield
+            return
+        if self.params.get('profile_mode') == 'deterministic':
+            profiler = DeterministicProfiler()
+        else:
+            profiler = SamplingProfiler()
+        self._local.profiler = profiler
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._local.profiler = None
+            profile_dir = expand_path(profile_dir)
+            filename = os.path.join(profile_dir, '%s.%s' % (
+                sanitize_filename(re.sub(r'^[a-zA-Z]+://', '', url), restricted=True)[:200],
+                profiler.FILE_EXT))
+            try:
+                if not os.path.exists(profile_dir):
+                    os.makedirs(profile_dir)
+                if profiler.dump(encodeFilename(filename)):
+                    self.to_screen('[profile] Wrote profile of %s to: %s' % (url, filename))
+            except (IOError, OSError) as err:
+                self.report_warning('Unable to write profile: %s' % error_to_compat_str(err))
+
+    def _profiled(self, func):
+        """Return func run under the profiler of the current thread, if any."""
+        profiler = getattr(self._local, 'profiler', None)
+        if profiler is None:
+            return func
+
+        def wrapper(*args, **kwargs):
+            self._local.profiler = profiler
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+        return wrapper
+
+    def _report_metrics(self, info_dict):
+        """Output the metrics of a video and start the ones of the next video."""
+        metrics = self.metrics
+        self._local.metrics = Metrics()
+        print_metrics = self.params.get('print_metrics')
+        metrics_file = self.params.get('metrics_file')
+        if not print_metrics and not metrics_file:
+            return
+        summary = metrics.summary()
+        summary.update({
+            'id': info_dict.get('id'),
+            'extractor': info_dict.get('extractor'),
+            'webpage_url': info_dict.get('webpage_url'),
+        })
+        line = json.dumps(summary)
+        if print_metrics:
+            self.to_stdout(line)
+        if metrics_file:
+            try:
+                with self._metrics_file_lock:
+                    with io.open(encodeFilename(expand_path(metrics_file)), 'a', encoding='utf-8') as f:
+                        f.write(line + '\n')
+            except (IOError, OSError) as err:
+                self.report_warning('Unable to write metrics file: %s' % error_to_compat_str(err))
+
+    def _rate_limiters_for(self, url, ratelimit=None):
+        if ratelimit is None:
+            ratelimit = self.params.get('ratelimit')
+        host = compat_urllib_parse_urlparse(url).hostname or ''
+        limits = [] if ratelimit is None else [(None, ratelimit)]
+        for limit_host, limit in (self.params.get('host_ratelimits') or {}).items():
+            if host == limit_host or host.endswith('.' + limit_host):
+                limits.append((limit_host, limit))
+        buckets = []
+        with self._rate_limiters_lock:
+            for key in limits:
+                bucket = self._rate_limiters.get(key)
+                if bucket is None:
+                    bucket = self._rate_limiters[key] = TokenBucket(key[1])
+                buckets.append(bucket)
+        return buckets
+
+    def throttle(self, url, byte_count, ratelimit=None):
+        """
+        Account for byte_count more bytes downloaded from url in the metrics
+        and wait until they keep within the rate limits, shared by all the
+        downloads of this instance.
+
+        ratelimit overrides the ratelimit parameter.
+        """
+        self.metrics.add_bytes(url, byte_count)
+        for bucket in self._rate_limiters_for(url, ratelimit):
+            bucket.consume(byte_count)
+
     def print_debug_header(self):
         if not self.params.get('verbose'):
             return
@@ -2382,7 +2940,52 @@ class YoutubeDL(object):
             encoding = preferredencoding()
         return encoding
 
-    def _write_thumbnails(self, info_dict, filename):
+    def _fetch_subtitle(self, ie, info_dict, sub_lang, sub_info, sub_filename):
+        try:
+            sub_data = ie._request_webpage(
+                sub_info['url'], info_dict['id'], note=False).read()
+            self.throttle(sub_info['url'], len(sub_data))
+            with io.open(encodeFilename(sub_filename), 'wb') as subfile:
+                subfile.write(sub_data)
+        except (ExtractorError, IOError, OSError, ValueError) as err:
+            self.report_warning('Unable to download subtitle for "%s": %s' %
+                                (sub_lang, error_to_compat_str(err)))
+
+    def _start_side_fetches(self, side_fetches):
+        """
+        Start calling the functions of side_fetches from worker threads,
+        return a function waiting for them to complete.
+        """
+        if not side_fetches:
+            return lambda: None
+        errors = []
+
+        def fetch_all():
+            try:
+                for _ in concurrent_imap(
+                        self.share_metrics(lambda fetch: fetch()), side_fetches,
+                        min(len(side_fetches), self._SIDE_FETCH_WORKERS)):
+                    pass
+            except BaseException as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=fetch_all)
+        thread.daemon = True
+        thread.start()
+
+        def wait():
+            thread.join()
+            if errors:
+                raise errors.pop()
+        return wait
+
+    def _write_thumbnails(self, info_dict, filename, side_fetches=None):
+        """
+        Write the requested thumbnails of info_dict next to filename.
+
+        If side_fetches is given, the functions downloading them are appended
+        to it instead of being called.
+        """
         if self.params.get('writethumbnail', False):
             thumbnails = info_dict.get('thumbnails')
             if thumbnails:
@@ -2408,12 +3011,25 @@ class YoutubeDL(object):
             else:
                 self.to_screen('[%s] %s: Downloading thumbnail %s...' %
                                (info_dict['extractor'], info_dict['id'], thumb_display_id))
-                try:
-                    uf = self.urlopen(t['url'])
-                    with open(encodeFilename(thumb_filename), 'wb') as thumbf:
-                        shutil.copyfileobj(uf, thumbf)
-                    self.to_screen('[%s] %s: Writing thumbnail %sto: %s' %
-                                   (info_dict['extractor'], info_dict['id'], thumb_display_id, thumb_filename))
-                except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error) as err:
-                    self.report_warning('Unable to download thumbnail "%s": %s' %
-                                        (t['url'], error_to_compat_str(err)))
+                fetch = functools.partial(
+                    self._fetch_thumbnail, info_dict, t['url'], thumb_filename, thumb_display_id)
+                if side_fetches is None:
+                    fetch()
+                else:
+                    side_fetches.append(fetch)
+
+    def _fetch_thumbnail(self, info_dict, url, thumb_filename, thumb_display_id):
+        try:
+            uf = self.urlopen(url)
+            with open(encodeFilename(thumb_filename), 'wb') as thumbf:
+                while True:
+                    block = uf.read(65536)
+                    if not block:
+                        break
+                    self.throttle(url, len(block))
+                    thumbf.write(block)
+            self.to_screen('[%s] %s: Writing thumbnail %sto: %s' %
+                           (info_dict['extractor'], info_dict['id'], thumb_display_id, thumb_filename))
+        except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error) as err:
+            self.report_warning('Unable to download thumbnail "%s": %s' %
+                                (url, error_to_compat_str(err)))
@@ -150,6 +150,17 @@ def _real_main(argv=None):
         if numeric_limit is None:
             parser.error('invalid rate limit specified')
         opts.ratelimit = numeric_limit
+    if opts.profile_mode not in ('sampling', 'deterministic'):
+        parser.error('invalid profile mode specified')
+    host_ratelimits = {}
+    for h in opts.host_ratelimits or []:
+        if ':' not in h:
+            parser.error('wrong host rate limit formatting, it should be host:rate, not "%s"' % h)
+        host, limit = h.rsplit(':', 1)
+        numeric_limit = FileDownloader.parse_bytes(limit)
+        if numeric_limit is None:
+            parser.error('invalid rate limit specified for host %s' % host)
+        host_ratelimits[host.lower()] = numeric_limit
     if opts.min_filesize is not None:
         numeric_limit = FileDownloader.parse_bytes(opts.min_filesize)
         if numeric_limit is None:
@@ -160,6 +171,13 @@ def _real_main(argv=None):
         if numeric_limit is None:
             parser.error('invalid max_filesize specified')
         opts.max_filesize = numeric_limit
+    if opts.cache_max_size is not None:
+        numeric_limit = FileDownloader.parse_bytes(opts.cache_max_size)
+        if numeric_limit is None:
+            parser.error('invalid cache max size specified')
+        opts.cache_max_size = numeric_limit
+    if opts.info_cache_ttl is not None and opts.info_cache_ttl < 0:
+        parser.error('info cache TTL must be positive or 0')
     if opts.sleep_interval is not None:
         if opts.sleep_interval < 0:
             parser.error('sleep interval must be positive or 0')
@@ -188,6 +206,10 @@ def _real_main(argv=None):
         opts.retries = parse_retries(opts.retries)
     if opts.fragment_retries is not None:
         opts.fragment_retries = parse_retries(opts.fragment_retries)
+    if opts.concurrent_fragment_downloads is not None and opts.concurrent_fragment_downloads < 1:
+        parser.error('concurrent fragments must be positive')
+    if opts.concurrent_downloads is not None and opts.concurrent_downloads < 1:
+        parser.error('concurrent downloads must be positive')
     if opts.buffersize is not None:
         numeric_buffersize = FileDownloader.parse_bytes(opts.buffersize)
         if numeric_buffersize is None:
@@ -198,6 +220,8 @@ def _real_main(argv=None):
         if not numeric_chunksize:
             parser.error('invalid http chunk size specified')
         opts.http_chunk_size = numeric_chunksize
+    if opts.http_connections is not None and opts.http_connections < 1:
+        parser.error('http connections must be positive')
     if opts.playliststart <= 0:
         raise ValueError('Playlist start must be positive')
     if opts.playlistend not in (-1, None) and opts.playlistend < opts.playliststart:
@@ -335,6 +359,9 @@ def _real_main(argv=None):
         'forceformat': opts.getformat,
         'forcejson': opts.dumpjson or opts.print_json,
         'dump_single_json': opts.dump_single_json,
+        'expand_fragments': opts.expand_fragments,
+        'print_metrics': opts.print_metrics,
+        'metrics_file': opts.metrics_file,
         'simulate': opts.simulate or any_getting,
         'skip_download': opts.skip_download,
         'format': opts.format,
@@ -346,14 +373,18 @@ def _real_main(argv=None):
         'ignoreerrors': opts.ignoreerrors,
         'force_generic_extractor': opts.force_generic_extractor,
         'ratelimit': opts.ratelimit,
+        'host_ratelimits': host_ratelimits,
         'nooverwrites': opts.nooverwrites,
         'retries': opts.retries,
         'fragment_retries': opts.fragment_retries,
         'skip_unavailable_fragments': opts.skip_unavailable_fragments,
         'keep_fragments': opts.keep_fragments,
+        'concurrent_fragment_downloads': opts.concurrent_fragment_downloads,
+        'concurrent_downloads': opts.concurrent_downloads,
         'buffersize': opts.buffersize,
         'noresizebuffer': opts.noresizebuffer,
         'http_chunk_size': opts.http_chunk_size,
+        'http_connections': opts.http_connections,
         'continuedl': opts.continue_dl,
         'noprogress': opts.noprogress,
         'progress_with_newline': opts.progress_with_newline,
@@ -392,6 +423,8 @@ def _real_main(argv=None):
         'max_views': opts.max_views,
         'daterange': date,
         'cachedir': opts.cachedir,
+        'cache_max_size': opts.cache_max_size,
+        'info_cache_ttl': opts.info_cache_ttl,
         'youtube_print_sig_code': opts.youtube_print_sig_code,
         'age_limit': opts.age_limit,
         'download_archive': download_archive_fn,
@@ -410,10 +443,13 @@ def _real_main(argv=None):
         'extract_flat': opts.extract_flat,
         'mark_watched': opts.mark_watched,
         'merge_output_format': opts.merge_output_format,
+        'stream_merge': opts.stream_merge,
         'postprocessors': postprocessors,
         'fixup': opts.fixup,
         'source_address': opts.source_address,
         'call_home': opts.call_home,
+        'profile': opts.profile,
+        'profile_mode': opts.profile_mode,
         'sleep_interval': opts.sleep_interval,
         'max_sleep_interval': opts.max_sleep_interval,
         'external_downloader': opts.external_downloader,
@@ -447,9 +483,13 @@ def _real_main(argv=None):
         if opts.rm_cachedir:
             ydl.cache.remove()
 
+        # Import download archive
+        if opts.import_download_archive is not None:
+            ydl.import_download_archive(expand_path(opts.import_download_archive))
+
         # Maybe do nothing
         if (len(all_urls) < 1) and (opts.load_info_filename is None):
-            if opts.update_self or opts.rm_cachedir:
+            if opts.update_self or opts.rm_cachedir or opts.import_download_archive is not None:
                 sys.exit()
 
             ydl.warn_if_short_id(sys.argv[1:] if argv is None else argv)
@@ -1,10 +1,22 @@
 from __future__ import unicode_literals
 
-from math import ceil
+import binascii
 
-from .compat import compat_b64decode
+from .compat import (
+    compat_b64decode,
+    compat_struct_pack,
+    compat_struct_unpack,
+)
 from .utils import bytes_to_intlist, intlist_to_bytes
 
+try:
+    from Cryptodome.Cipher import AES as _NativeAES
+except ImportError:
+    try:
+        from Crypto.Cipher import AES as _NativeAES
+    except ImportError:
+        _NativeAES = None
+
 BLOCK_SIZE_BYTES = 16
 
 
@@ -18,20 +30,11 @@ def aes_ctr_decrypt(data, key, counter):
                                returns the next counter block
     @returns {int[]}           decrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
-
-    decrypted_data = []
-    for i in range(block_count):
-        counter_block = counter.next_value()
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block += [0] * (BLOCK_SIZE_BYTES - len(block))
-
-        cipher_counter_block = aes_encrypt(counter_block, expanded_key)
-        decrypted_data += xor(block, cipher_counter_block)
-    decrypted_data = decrypted_data[:len(data)]
-
-    return decrypted_data
+    block_count = (len(data) + BLOCK_SIZE_BYTES - 1) // BLOCK_SIZE_BYTES
+    counter_blocks = b''.join(
+        intlist_to_bytes(counter.next_value()) for _ in range(block_count))
+    key_stream = AESCipher(intlist_to_bytes(key)).ecb_encrypt(counter_blocks)
+    return bytes_to_intlist(xor_bytes(intlist_to_bytes(data), key_stream[:len(data)]))
 
 
 def aes_cbc_decrypt(data, key, iv):
@@ -43,21 +46,22 @@ def aes_cbc_decrypt(data, key, iv):
     @param {int[]} iv          16-Byte IV
     @returns {int[]}           decrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
+    return bytes_to_intlist(aes_cbc_decrypt_bytes(
+        intlist_to_bytes(data), intlist_to_bytes(key), intlist_to_bytes(iv)))
 
-    decrypted_data = []
-    previous_cipher_block = iv
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block += [0] * (BLOCK_SIZE_BYTES - len(block))
 
-        decrypted_block = aes_decrypt(block, expanded_key)
-        decrypted_data += xor(decrypted_block, previous_cipher_block)
-        previous_cipher_block = block
-    decrypted_data = decrypted_data[:len(data)]
+def aes_cbc_decrypt_bytes(data, key, iv):
+    """
+    Decrypt with aes in CBC mode
 
-    return decrypted_data
+    @param {bytes} data        cipher
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          16-Byte IV
+    @returns {bytes}           decrypted data
+    """
+    # An incomplete last block is padded with zeros
+    padding = -len(data) % BLOCK_SIZE_BYTES
+    return AESCipher(key).cbc_decrypt(data + b'\0' * padding, iv)[:len(data)]
 
 
 def aes_cbc_encrypt(data, key, iv):
@@ -69,23 +73,10 @@ def aes_cbc_encrypt(data, key, iv):
     @param {int[]} iv          16-Byte IV
     @returns {int[]}           encrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
-
-    encrypted_data = []
-    previous_cipher_block = iv
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        remaining_length = BLOCK_SIZE_BYTES - len(block)
-        block += [remaining_length] * remaining_length
-        mixed_block = xor(block, previous_cipher_block)
-
-        encrypted_block = aes_encrypt(mixed_block, expanded_key)
-        encrypted_data += encrypted_block
-
-        previous_cipher_block = encrypted_block
-
-    return encrypted_data
+    remaining_length = -len(data) % BLOCK_SIZE_BYTES
+    data = intlist_to_bytes(data + [remaining_length] * remaining_length)
+    return bytes_to_intlist(AESCipher(intlist_to_bytes(key)).cbc_encrypt(
+        data, intlist_to_bytes(iv)))
 
 
 def key_expansion(data):
@@ -358,4 +349,164 @@ def inc(data):
     return data
 
 
-__all__ = ['aes_encrypt', 'key_expansion', 'aes_ctr_decrypt', 'aes_cbc_decrypt', 'aes_decrypt_text']
+def xor_bytes(data1, data2):
+    """XOR two byte strings of the same length"""
+    if not data1:
+        return b''
+    return binascii.unhexlify(('%0*x' % (
+        2 * len(data1),
+        int(binascii.hexlify(data1), 16) ^ int(binascii.hexlify(data2), 16))).encode('ascii'))
+
+
+def _make_t_tables(sbox, column):
+    """
+    Tables mapping each byte of a state column to its contribution to the
+    column once substituted and mixed, one table per row
+    """
+    t0 = tuple(
+        rijndael_mul(sbox[x], column[0]) << 24 | rijndael_mul(sbox[x], column[1]) << 16
+        | rijndael_mul(sbox[x], column[2]) << 8 | rijndael_mul(sbox[x], column[3])
+        for x in range(256))
+    return [t0] + [
+        tuple(w >> 8 * r | (w << 32 - 8 * r) & 0xFFFFFFFF for w in t0)
+        for r in range(1, 4)]
+
+
+# First column of MIX_COLUMN_MATRIX and MIX_COLUMN_MATRIX_INV
+TE = _make_t_tables(SBOX, (0x2, 0x1, 0x1, 0x3))
+TD = _make_t_tables(SBOX_INV, (0xE, 0x9, 0xD, 0xB))
+
+# Blocks are processed by chunks of this size, bounding the memory used by
+# their 32-bit words
+_CHUNK_SIZE = 64 * 1024
+
+
+def _to_words(data):
+    return compat_struct_unpack('>%dI' % (len(data) // 4), data)
+
+
+def _from_words(words):
+    return compat_struct_pack('>%dI' % len(words), *words)
+
+
+class AESCipher(object):
+    """
+    AES cipher with a precomputed key schedule.
+
+    Uses pycryptodome, pycryptodomex or pycrypto when available, otherwise
+    a pure Python implementation operating on 32-bit words, where a round of
+    a column is four lookups in precomputed tables (T-tables).
+
+    Data lengths must be multiples of BLOCK_SIZE_BYTES.
+    """
+
+    def __init__(self, key):
+        """@param {bytes} key  16/24/32-Byte cipher key"""
+        self.key = key
+        if _NativeAES is not None:
+            return
+        round_keys = _to_words(intlist_to_bytes(key_expansion(bytes_to_intlist(key))))
+        self._rounds = len(round_keys) // 4 - 1
+        self._enc_keys = round_keys
+        # Round keys of the equivalent inverse cipher: reversed and, except
+        # for the first and the last round, mixed with InvMixColumns
+        dec_keys = list(round_keys[-4:])
+        for i in range(len(round_keys) - 8, 0, -4):
+            dec_keys.extend(
+                TD[0][SBOX[w >> 24]] ^ TD[1][SBOX[w >> 16 & 0xFF]]
+                ^ TD[2][SBOX[w >> 8 & 0xFF]] ^ TD[3][SBOX[w & 0xFF]]
+                for w in round_keys[i:i + 4])
+        dec_keys.extend(round_keys[:4])
+        self._dec_keys = dec_keys
+
+    def _encrypt_block(self, s0, s1, s2, s3):
+        k = self._enc_keys
+        t0, t1, t2, t3 = TE
+        s0 ^= k[0]
+        s1 ^= k[1]
+        s2 ^= k[2]
+        s3 ^= k[3]
+        for i in range(4, 4 * self._rounds, 4):
+            s0, s1, s2, s3 = (
+                t0[s0 >> 24] ^ t1[s1 >> 16 & 0xFF] ^ t2[s2 >> 8 & 0xFF] ^ t3[s3 & 0xFF] ^ k[i],
+                t0[s1 >> 24] ^ t1[s2 >> 16 & 0xFF] ^ t2[s3 >> 8 & 0xFF] ^ t3[s0 & 0xFF] ^ k[i + 1],
+                t0[s2 >> 24] ^ t1[s3 >> 16 & 0xFF] ^ t2[s0 >> 8 & 0xFF] ^ t3[s1 & 0xFF] ^ k[i + 2],
+                t0[s3 >> 24] ^ t1[s0 >> 16 & 0xFF] ^ t2[s1 >> 8 & 0xFF] ^ t3[s2 & 0xFF] ^ k[i + 3])
+        s = SBOX
+        return (
+            (s[s0 >> 24] << 24 | s[s1 >> 16 & 0xFF] << 16 | s[s2 >> 8 & 0xFF] << 8 | s[s3 & 0xFF]) ^ k[-4],
+            (s[s1 >> 24] << 24 | s[s2 >> 16 & 0xFF] << 16 | s[s3 >> 8 & 0xFF] << 8 | s[s0 & 0xFF]) ^ k[-3],
+            (s[s2 >> 24] << 24 | s[s3 >> 16 & 0xFF] << 16 | s[s0 >> 8 & 0xFF] << 8 | s[s1 & 0xFF]) ^ k[-2],
+            (s[s3 >> 24] << 24 | s[s0 >> 16 & 0xFF] << 16 | s[s1 >> 8 & 0xFF] << 8 | s[s2 & 0xFF]) ^ k[-1])
+
+    def _decrypt_block(self, s0, s1, s2, s3):
+        k = self._dec_keys
+        t0, t1, t2, t3 = TD
+        s0 ^= k[0]
+        s1 ^= k[1]
+        s2 ^= k[2]
+        s3 ^= k[3]
+        for i in range(4, 4 * self._rounds, 4):
+            s0, s1, s2, s3 = (
+                t0[s0 >> 24] ^ t1[s3 >> 16 & 0xFF] ^ t2[s2 >> 8 & 0xFF] ^ t3[s1 & 0xFF] ^ k[i],
+                t0[s1 >> 24] ^ t1[s0 >> 16 & 0xFF] ^ t2[s3 >> 8 & 0xFF] ^ t3[s2 & 0xFF] ^ k[i + 1],
+                t0[s2 >> 24] ^ t1[s1 >> 16 & 0xFF] ^ t2[s0 >> 8 & 0xFF] ^ t3[s3 & 0xFF] ^ k[i + 2],
+                t0[s3 >> 24] ^ t1[s2 >> 16 & 0xFF] ^ t2[s1 >> 8 & 0xFF] ^ t3[s0 & 0xFF] ^ k[i + 3])
+        s = SBOX_INV
+        return (
+            (s[s0 >> 24] << 24 | s[s3 >> 16 & 0xFF] << 16 | s[s2 >> 8 & 0xFF] << 8 | s[s1 & 0xFF]) ^ k[-4],
+            (s[s1 >> 24] << 24 | s[s0 >> 16 & 0xFF] << 16 | s[s3 >> 8 & 0xFF] << 8 | s[s2 & 0xFF]) ^ k[-3],
+            (s[s2 >> 24] << 24 | s[s1 >> 16 & 0xFF] << 16 | s[s0 >> 8 & 0xFF] << 8 | s[s3 & 0xFF]) ^ k[-2],
+            (s[s3 >> 24] << 24 | s[s2 >> 16 & 0xFF] << 16 | s[s1 >> 8 & 0xFF] << 8 | s[s0 & 0xFF]) ^ k[-1])
+
+    def ecb_encrypt(self, data):
+        if _NativeAES is not None:
+            return _NativeAES.new(self.key, _NativeAES.MODE_ECB).encrypt(data)
+        encrypt_block = self._encrypt_block
+        res = []
+        for pos in range(0, len(data), _CHUNK_SIZE):
+            words = _to_words(data[pos:pos + _CHUNK_SIZE])
+            out = []
+            for i in range(0, len(words), 4):
+                out.extend(encrypt_block(*words[i:i + 4]))
+            res.append(_from_words(out))
+        return b''.join(res)
+
+    def cbc_encrypt(self, data, iv):
+        if _NativeAES is not None:
+            return _NativeAES.new(self.key, _NativeAES.MODE_CBC, iv).encrypt(data)
+        encrypt_block = self._encrypt_block
+        c0, c1, c2, c3 = _to_words(iv)
+        res = []
+        for pos in range(0, len(data), _CHUNK_SIZE):
+            words = _to_words(data[pos:pos + _CHUNK_SIZE])
+            out = []
+            for i in range(0, len(words), 4):
+                c0, c1, c2, c3 = encrypt_block(
+                    words[i] ^ c0, words[i + 1] ^ c1, words[i + 2] ^ c2, words[i + 3] ^ c3)
+                out.extend((c0, c1, c2, c3))
+            res.append(_from_words(out))
+        return b''.join(res)
+
+    def cbc_decrypt(self, data, iv):
+        if _NativeAES is not None:
+            return _NativeAES.new(self.key, _NativeAES.MODE_CBC, iv).decrypt(data)
+        decrypt_block = self._decrypt_block
+        res = []
+        for pos in range(0, len(data), _CHUNK_SIZE):
+            # Each block is XORed with the previous cipher block
+            words = _to_words(iv + data[pos:pos + _CHUNK_SIZE])
+            out = []
+            for i in range(4, len(words), 4):
+                p0, p1, p2, p3 = decrypt_block(*words[i:i + 4])
+                out.extend((
+                    p0 ^ words[i - 4], p1 ^ words[i - 3], p2 ^ words[i - 2], p3 ^ words[i - 1]))
+            res.append(_from_words(out))
+            iv = data[pos + _CHUNK_SIZE - BLOCK_SIZE_BYTES:pos + _CHUNK_SIZE]
+        return b''.join(res)
+
+
+__all__ = [
+    'AESCipher', 'aes_encrypt', 'key_expansion', 'aes_ctr_decrypt', 'aes_cbc_decrypt',
+    'aes_cbc_decrypt_bytes', 'aes_decrypt_text', 'xor_bytes',
+]
@@ -0,0 +1,177 @@
+from __future__ import unicode_literals
+
+import errno
+import io
+import os
+import threading
+
+try:
+    import sqlite3
+except ImportError:  # Python built without sqlite support
+    sqlite3 = None
+
+from .utils import (
+    encodeFilename,
+    locked_file,
+)
+
+
+class DownloadArchive(object):
+    """
+    Download archive stored in a text file, one "<extractor> <video id>"
+    line per video.
+
+    The file is read only once, its entries are kept in memory and checked
+    in constant time. Entries appended to the file by other processes are
+    picked up when an ID is not found among the known ones.
+
+    Instances may be shared between threads.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._ids = set()
+        # Position in the file and file size up to which entries are loaded
+        self._pos = 0
+        self._size = 0
+        # File locks do not exclude threads of the same process
+        self._lock = threading.RLock()
+
+    def _load_new_entries(self):
+        with self._lock:
+            try:
+                size = os.path.getsize(encodeFilename(self.filename))
+            except OSError as oe:
+                if oe.errno != errno.ENOENT:
+                    raise
+                return
+            if size == self._size:
+                return
+            # The file has been rewritten if it got smaller
+            rewritten = size < self._size
+            new_ids = set()
+            try:
+                with locked_file(self.filename, 'r', encoding='utf-8') as archive_file:
+                    archive_file.seek(0 if rewritten else self._pos)
+                    for line in archive_file.read().splitlines():
+                        line = line.strip()
+                        if line:
+                            new_ids.add(line)
+                    pos = archive_file.tell()
+                    size = os.path.getsize(encodeFilename(self.filename))
+            except IOError as ioe:
+                if ioe.errno != errno.ENOENT:
+                    raise
+                return
+            # Replaced rather than cleared, as it's read without the lock
+            if rewritten:
+                self._ids = new_ids
+            else:
+                self._ids.update(new_ids)
+            self._pos = pos
+            self._size = size
+
+    def __contains__(self, vid_id):
+        if vid_id in self._ids:
+            return True
+        self._load_new_entries()
+        return vid_id in self._ids
+
+    def __iter__(self):
+        with self._lock:
+            self._load_new_entries()
+            return iter(list(self._ids))
+
+    def add(self, vid_id):
+        with self._lock:
+            with locked_file(self.filename, 'a', encoding='utf-8') as archive_file:
+                archive_file.write(vid_id + '\n')
+            self._ids.add(vid_id)
+
+    def update(self, vid_ids):
+        with self._lock:
+            self._load_new_entries()
+            with locked_file(self.filename, 'a', encoding='utf-8') as archive_file:
+                for vid_id in vid_ids:
+                    if vid_id not in self._ids:
+                        archive_file.write(vid_id + '\n')
+                        self._ids.add(vid_id)
+
+    def close(self):
+        pass
+
+
+class SQLiteDownloadArchive(object):
+    """
+    Download archive stored in an indexed SQLite database.
+
+    Suitable for archives too large to be kept in memory. Instances may be
+    shared between threads.
+    """
+
+    _MAGIC = b'SQLite format 3\x00'
+    _EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+    def __init__(self, filename):
+        self.filename = filename
+        # Autocommit mode, concurrent writers wait for each other
+        self._conn = sqlite3.connect(
+            filename, timeout=60, isolation_level=None,
+            check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS archive (id TEXT PRIMARY KEY)')
+        # The connection is shared by all the threads
+        self._lock = threading.Lock()
+
+    @classmethod
+    def suitable(cls, filename):
+        """Check whether filename should be handled by this class."""
+        if sqlite3 is None:
+            return False
+        try:
+            with io.open(encodeFilename(filename), 'rb') as f:
+                return f.read(len(cls._MAGIC)) == cls._MAGIC
+        except IOError as ioe:
+            if ioe.errno != errno.ENOENT:
+                raise
+        return os.path.splitext(filename)[1].lower() in cls._EXTENSIONS
+
+    def __contains__(self, vid_id):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM archive WHERE id = ?', (vid_id, )).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            cursor = self._conn.execute('SELECT id FROM archive')
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0]
+
+    def add(self, vid_id):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO archive (id) VALUES (?)', (vid_id, ))
+
+    def update(self, vid_ids):
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN')
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO archive (id) VALUES (?)',
+                    ((vid_id, ) for vid_id in vid_ids))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_download_archive(filename):
+    """Open the download archive stored in filename."""
+    if SQLiteDownloadArchive.suitable(filename):
+        return SQLiteDownloadArchive(filename)
+    return DownloadArchive(filename)
@@ -1,11 +1,14 @@
 from __future__ import unicode_literals
 
+import copy
 import errno
 import io
 import json
 import os
 import re
 import shutil
+import threading
+import time
 import traceback
 
 from .compat import compat_getenv
@@ -16,8 +19,40 @@ from .utils import (
 
 
 class Cache(object):
+    """
+    Filesystem cache storing one file per key under <cachedir>/<section>/.
+
+    Entries of the sections with a time to live expire that long after they
+    were stored. When the cache grows over cache_max_size bytes, the least
+    recently used entries are removed until it is a tenth smaller. Its size
+    is kept up to date as entries are stored and removed, and measured again
+    from time to time for the changes made by other processes. Loaded
+    entries are kept in memory for as long as their file is unchanged.
+    """
+
+    # Default time to live of the entries of some sections in seconds, the
+    # entries of the other sections do not expire
+    _SECTION_TTLS = {
+        # Players are replaced every few weeks
+        'youtube-sigfuncs': 30 * 24 * 60 * 60,
+    }
+
+    # Seconds after which the size of the cache is measured again
+    _SIZE_SCAN_INTERVAL = 10 * 60
+
+    # Part of cache_max_size the cache is shrunk to when it gets bigger, so
+    # that it's not scanned again on every store
+    _SHRINK_RATIO = 0.9
+
     def __init__(self, ydl):
         self._ydl = ydl
+        # (data, mtime, size) by cache file name
+        self._memo = {}
+        # Size of the cache in bytes and time it was last measured, None
+        # until it is
+        self._size = None
+        self._size_scanned = None
+        self._lock = threading.Lock()
 
     def _get_root_dir(self):
         res = self._ydl.params.get('cachedir')
@@ -37,6 +72,59 @@ class Cache(object):
     def enabled(self):
         return self._ydl.params.get('cachedir') is not False
 
+    def _get_ttl(self, section):
+        ttls = self._ydl.params.get('cache_ttls') or {}
+        if section in ttls:
+            return ttls[section]
+        return self._SECTION_TTLS.get(section)
+
+    def _remove_file(self, fn):
+        with self._lock:
+            self._memo.pop(fn, None)
+        try:
+            size = os.stat(fn).st_size
+            os.remove(fn)
+        except OSError:
+            pass  # Already removed by another process
+        else:
+            with self._lock:
+                if self._size is not None:
+                    self._size -= size
+
+    def _enforce_max_size(self):
+        max_size = self._ydl.params.get('cache_max_size')
+        if max_size is None:
+            return
+        with self._lock:
+            if (self._size is not None and self._size <= max_size
+                    and time.time() - self._size_scanned < self._SIZE_SCAN_INTERVAL):
+                return
+        scanned = time.time()
+        entries = []
+        total_size = 0
+        for dirpath, _, filenames in os.walk(self._get_root_dir()):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue  # Being written
+                fn = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(fn)
+                except OSError:
+                    continue
+                # Access times are set explicitly when entries are loaded
+                entries.append((st.st_atime, st.st_size, fn))
+                total_size += st.st_size
+        if total_size > max_size:
+            entries.sort()
+            for _, size, fn in entries:
+                if total_size <= max_size * self._SHRINK_RATIO:
+                    break
+                self._remove_file(fn)
+                total_size -= size
+        with self._lock:
+            self._size = total_size
+            self._size_scanned = scanned
+
     def store(self, section, key, data, dtype='json'):
         assert dtype in ('json',)
 
@@ -50,7 +138,19 @@ class Cache(object):
             except OSError as ose:
                 if ose.errno != errno.EEXIST:
                     raise
+            try:
+                old_size = os.stat(fn).st_size
+            except OSError:
+                old_size = 0
+            # Written atomically so that concurrent readers never see a
+            # partial file
             write_json_file(data, fn)
+            st = os.stat(fn)
+            with self._lock:
+                self._memo[fn] = (copy.deepcopy(data), st.st_mtime, st.st_size)
+                if self._size is not None:
+                    self._size += st.st_size - old_size
+            self._enforce_max_size()
         except Exception:
             tb = traceback.format_exc()
             self._ydl.report_warning(
@@ -64,20 +164,56 @@ class Cache(object):
 
         cache_fn = self._get_cache_fn(section, key, dtype)
         try:
+            st = os.stat(cache_fn)
+        except OSError:
+            return default  # No cache available
+
+        ttl = self._get_ttl(section)
+        now = time.time()
+        if ttl is not None and st.st_mtime + ttl < now:
+            self._remove_file(cache_fn)
+            return default
+
+        with self._lock:
+            memo = self._memo.get(cache_fn)
+        if memo is not None and memo[1:] == (st.st_mtime, st.st_size):
+            data = memo[0]
+        else:
             try:
-                with io.open(cache_fn, 'r', encoding='utf-8') as cachef:
-                    return json.load(cachef)
-            except ValueError:
                 try:
-                    file_size = os.path.getsize(cache_fn)
-                except (OSError, IOError) as oe:
-                    file_size = str(oe)
-                self._ydl.report_warning(
-                    'Cache retrieval from %s failed (%s)' % (cache_fn, file_size))
-        except IOError:
-            pass  # No cache available
+                    with io.open(cache_fn, 'r', encoding='utf-8') as cachef:
+                        data = json.load(cachef)
+                except ValueError:
+                    try:
+                        file_size = os.path.getsize(cache_fn)
+                    except (OSError, IOError) as oe:
+                        file_size = str(oe)
+                    self._ydl.report_warning(
+                        'Cache retrieval from %s failed (%s)' % (cache_fn, file_size))
+                    return default
+            except IOError:
+                return default  # No cache available
+            with self._lock:
+                self._memo[cache_fn] = (data, st.st_mtime, st.st_size)
+
+        try:
+            # Record the access for the eviction of least recently used
+            # entries, keeping the modification time as is
+            if hasattr(st, 'st_mtime_ns'):
+                os.utime(cache_fn, ns=(int(now * 1e9), st.st_mtime_ns))
+            else:
+                os.utime(cache_fn, (now, st.st_mtime))
+        except OSError:
+            pass
+        return copy.deepcopy(data)
+
+    def delete(self, section, key, dtype='json'):
+        assert dtype in ('json',)
+
+        if not self.enabled:
+            return
 
-        return default
+        self._remove_file(self._get_cache_fn(section, key, dtype))
 
     def remove(self):
         if not self.enabled:
@@ -93,4 +229,7 @@ class Cache(object):
         if os.path.exists(cachedir):
             self._ydl.to_screen('.', skip_eol=True)
             shutil.rmtree(cachedir)
+        with self._lock:
+            self._memo.clear()
+            self._size = None
         self._ydl.to_screen('.')
@@ -2953,6 +2953,12 @@ else:
         compat_Struct = struct.Struct
 
 
+try:
+    import re._parser as compat_sre_parse  # Python 3.11+
+except ImportError:  # Python < 3.11
+    import sre_parse as compat_sre_parse
+
+
 try:
     from future_builtins import zip as compat_zip
 except ImportError:  # not 2.6+ or is 3.x
@@ -3026,6 +3032,7 @@ __all__ = [
     'compat_shlex_quote',
     'compat_shlex_split',
     'compat_socket_create_connection',
+    'compat_sre_parse',
     'compat_str',
     'compat_struct_pack',
     'compat_struct_unpack',
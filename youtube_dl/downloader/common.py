@@ -31,12 +31,15 @@ class FileDownloader(object):
 
     verbose:            Print additional info to stdout.
     quiet:              Do not print messages to stdout.
-    ratelimit:          Download speed limit, in bytes/sec.
+    ratelimit:          Download speed limit, in bytes/sec, shared with the
+                        other downloads of the YoutubeDL object.
     retries:            Number of times to retry for HTTP error 5xx
     buffersize:         Size of download buffer in bytes.
     noresizebuffer:     Do not automatically resize the download buffer.
     continuedl:         Try to continue downloads if possible.
     noprogress:         Do not print the progress bar.
+    progress_with_newline: Print each progress update on a new line.
+    progress_prefix:    Text to prepend to the progress updates.
     logtostderr:        Log messages to stderr instead of stdout.
     consoletitle:       Display progress in console window's titlebar.
     nopart:             Do not use temporary .part files.
@@ -51,6 +54,8 @@ class FileDownloader(object):
     http_chunk_size:    Size of a chunk for chunk-based HTTP downloading. May be
                         useful for bypassing bandwidth throttling imposed by
                         a webserver (experimental)
+    http_connections:   Number of connections to download a file over (see
+                        HttpFD)
 
     Subclasses of this one must re-define the real_download method.
     """
@@ -124,9 +129,9 @@ class FileDownloader(object):
         return 'inf' if retries == float('inf') else '%.0f' % retries
 
     @staticmethod
-    def best_block_size(elapsed_time, bytes):
+    def best_block_size(elapsed_time, bytes, max_size=4194304):
         new_min = max(bytes / 2.0, 1.0)
-        new_max = min(max(bytes * 2.0, 1.0), 4194304)  # Do not surpass 4 MB
+        new_max = min(max(bytes * 2.0, 1.0), max_size)  # Do not surpass 4 MB by default
         if elapsed_time < 0.001:
             return int(new_max)
         rate = bytes / elapsed_time
@@ -164,21 +169,9 @@ class FileDownloader(object):
     def report_error(self, *args, **kargs):
         self.ydl.report_error(*args, **kargs)
 
-    def slow_down(self, start_time, now, byte_counter):
-        """Sleep if the download speed is over the rate limit."""
-        rate_limit = self.params.get('ratelimit')
-        if rate_limit is None or byte_counter == 0:
-            return
-        if now is None:
-            now = time.time()
-        elapsed = now - start_time
-        if elapsed <= 0.0:
-            return
-        speed = float(byte_counter) / elapsed
-        if speed > rate_limit:
-            sleep_time = float(byte_counter) / rate_limit - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+    def throttle(self, url, byte_count):
+        """Sleep as needed to keep the download speed within the rate limits."""
+        self.ydl.throttle(url, byte_count, self.params.get('ratelimit'))
 
     def temp_name(self, filename):
         """Returns a temporary filename for the given filename."""
@@ -229,7 +222,7 @@ class FileDownloader(object):
         self.to_screen('[download] Destination: ' + filename)
 
     def _report_progress_status(self, msg, is_last_line=False):
-        fullmsg = '[download] ' + msg
+        fullmsg = '[download] ' + self.params.get('progress_prefix', '') + msg
         if self.params.get('progress_with_newline', False):
             self.to_screen(fullmsg)
         else:
@@ -311,6 +304,7 @@ class FileDownloader(object):
 
     def report_retry(self, err, count, retries):
         """Report retry in case of HTTP error 5xx"""
+        self.ydl.metrics.count('retries')
         self.to_screen(
             '[download] Got server HTTP error: %s. Retrying (attempt %d of %s)...'
             % (error_to_compat_str(err), count, self.format_retries(retries)))
@@ -331,12 +325,12 @@ class FileDownloader(object):
         Return True on success and False otherwise
         """
 
-        nooverwrites_and_exists = (
-            self.params.get('nooverwrites', False)
-            and os.path.exists(encodeFilename(filename))
-        )
-
+        # File-like targets (streams) are always written to
         if not hasattr(filename, 'write'):
+            nooverwrites_and_exists = (
+                self.params.get('nooverwrites', False)
+                and os.path.exists(encodeFilename(filename))
+            )
             continuedl_and_exists = (
                 self.params.get('continuedl', True)
                 and os.path.isfile(encodeFilename(filename))
@@ -378,6 +372,9 @@ class FileDownloader(object):
         # this interface
         self._progress_hooks.append(ph)
 
+    def remove_progress_hook(self, ph):
+        self._progress_hooks.remove(ph)
+
     def _debug_cmd(self, args, exe=None):
         if not self.params.get('verbose', False):
             return
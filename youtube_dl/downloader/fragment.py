@@ -1,12 +1,18 @@
 from __future__ import division, unicode_literals
 
+import functools
+import io
 import os
+import threading
 import time
 import json
 
 from .common import FileDownloader
 from .http import HttpFD
+from ..compat import compat_urllib_error
 from ..utils import (
+    concurrent_imap,
+    DownloadError,
     error_to_compat_str,
     encodeFilename,
     sanitize_open,
@@ -19,6 +25,33 @@ class HttpQuietDownloader(HttpFD):
         pass
 
 
+class _FragmentStream(object):
+    """
+    File-like object writing a fragment at the end of stream, positions
+    are relative to the beginning of the fragment
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        stream.seek(0, os.SEEK_END)
+        self._start = stream.tell()
+
+    def write(self, data):
+        self._stream.write(data)
+
+    def tell(self):
+        return self._stream.tell() - self._start
+
+    def seek(self, pos):
+        self._stream.seek(self._start + pos)
+
+    def truncate(self):
+        self._stream.truncate()
+
+    def close(self):
+        self._stream.flush()
+
+
 class FragmentFD(FileDownloader):
     """
     A base file downloader class for fragmented media (e.g. f4m/m3u8 manifests).
@@ -30,7 +63,10 @@ class FragmentFD(FileDownloader):
     skip_unavailable_fragments:
                         Skip unavailable fragments (DASH and hlsnative only)
     keep_fragments:     Keep downloaded fragments on disk after downloading is
-                        finished
+                        finished (otherwise fragments are only kept in memory)
+    concurrent_fragment_downloads:
+                        Number of fragments to download concurrently (DASH,
+                        hlsnative, ISM and f4m, 1 by default)
 
     For each incomplete fragment download youtube-dl keeps on disk a special
     bookkeeping file with download state and metadata (in future such files will
@@ -46,7 +82,11 @@ class FragmentFD(FileDownloader):
         Dictionary of downloader related data. May contain following data:
             current_fragment:
                 Dictionary with current (being downloaded) fragment data:
-                index:  0-based index of current fragment among all fragments
+                index:  0-based index of current fragment among all fragments,
+                        i.e. the number of fragments appended or skipped so
+                        far in order
+                offset: size of the data appended so far, the data after it
+                        belongs to a fragment being written
             fragment_count:
                 Total count of fragments
 
@@ -54,11 +94,13 @@ class FragmentFD(FileDownloader):
     """
 
     def report_retry_fragment(self, err, frag_index, count, retries):
+        self.ydl.metrics.count('fragment_retries')
         self.to_screen(
             '[download] Got server HTTP error: %s. Retrying fragment %d (attempt %d of %s)...'
             % (error_to_compat_str(err), frag_index, count, self.format_retries(retries)))
 
     def report_skip_fragment(self, frag_index):
+        self.ydl.metrics.count('skipped_fragments')
         self.to_screen('[download] Skipping fragment %d...' % frag_index)
 
     def _prepare_url(self, info_dict, url):
@@ -77,7 +119,9 @@ class FragmentFD(FileDownloader):
         assert 'ytdl_corrupt' not in ctx
         stream, _ = sanitize_open(self.ytdl_filename(ctx['filename']), 'r')
         try:
-            ctx['fragment_index'] = json.loads(stream.read())['downloader']['current_fragment']['index']
+            current_fragment = json.loads(stream.read())['downloader']['current_fragment']
+            ctx['fragment_index'] = current_fragment['index']
+            ctx['fragment_offset'] = current_fragment.get('offset')
         except Exception:
             ctx['ytdl_corrupt'] = True
         finally:
@@ -90,35 +134,168 @@ class FragmentFD(FileDownloader):
                 'index': ctx['fragment_index'],
             },
         }
+        if ctx.get('fragment_offset') is not None:
+            downloader['current_fragment']['offset'] = ctx['fragment_offset']
         if ctx.get('fragment_count') is not None:
             downloader['fragment_count'] = ctx['fragment_count']
         frag_index_stream.write(json.dumps({'downloader': downloader}))
         frag_index_stream.close()
 
-    def _download_fragment(self, ctx, frag_url, info_dict, headers=None):
-        fragment_filename = '%s-Frag%d' % (ctx['tmpfilename'], ctx['fragment_index'])
-        success = ctx['dl'].download(fragment_filename, {
+    def _download_fragment(self, ctx, frag_index, frag_url, info_dict, headers=None, stream=None):
+        """
+        Download a fragment and return (success, frag_content).
+
+        If stream is given, the content of the fragment is written to it as
+        it's downloaded and frag_content is empty.
+        """
+        self.ydl.metrics.count('fragment_downloads')
+        # Every fragment gets its own downloader so that progress of
+        # concurrently downloaded fragments can be told apart
+        dl = HttpQuietDownloader(self.ydl, ctx['dl_params'])
+        dl.add_progress_hook(functools.partial(ctx['frag_progress_hook'], frag_index))
+        frag_info = {
             'url': frag_url,
             'http_headers': headers or info_dict.get('http_headers'),
-        })
-        if not success:
+        }
+        if not self.params.get('keep_fragments', False):
+            # Fragments are only needed on disk if they are to be kept,
+            # otherwise they are downloaded straight into memory
+            frag_stream = io.BytesIO() if stream is None else stream
+            if not dl.download(frag_stream, frag_info):
+                return False, None
+            return True, b'' if stream is not None else frag_stream.getvalue()
+        fragment_filename = '%s-Frag%d' % (ctx['tmpfilename'], frag_index)
+        if not dl.download(fragment_filename, frag_info):
             return False, None
-        down, frag_sanitized = sanitize_open(fragment_filename, 'rb')
-        ctx['fragment_filename_sanitized'] = frag_sanitized
+        down, _ = sanitize_open(fragment_filename, 'rb')
         frag_content = down.read()
         down.close()
+        if stream is not None:
+            stream.write(frag_content)
+            return True, b''
         return True, frag_content
 
-    def _append_fragment(self, ctx, frag_content):
+    def _append_fragment(self, ctx, frag_index, frag_content):
         try:
             ctx['dest_stream'].write(frag_content)
             ctx['dest_stream'].flush()
         finally:
-            if self.__do_ytdl_file(ctx):
-                self._write_ytdl_file(ctx)
-            if not self.params.get('keep_fragments', False):
-                os.remove(encodeFilename(ctx['fragment_filename_sanitized']))
-            del ctx['fragment_filename_sanitized']
+            self._complete_fragment(ctx, frag_index)
+
+    def _complete_fragment(self, ctx, frag_index):
+        # frag_index is 1-based thus it's also the number of fragments
+        # processed so far
+        ctx['fragment_index'] = frag_index
+        if ctx['tmpfilename'] != '-':
+            ctx['fragment_offset'] = ctx['dest_stream'].tell()
+        if self.__do_ytdl_file(ctx):
+            self._write_ytdl_file(ctx)
+
+    def download_and_append_fragments(self, ctx, fragments, info_dict, pack_func=None, stream_func=None):
+        """
+        Download fragments and append them to the destination file in order.
+
+        fragments is an iterable (possibly lazy, it's consumed once) of dicts
+        with the following fields:
+        frag_index: 1-based index of the fragment among all fragments
+        url:        URL of the fragment
+        headers:    (optional) HTTP headers to use instead of the ones of
+                    info_dict
+        fatal:      (optional) abort if the fragment can't be downloaded even
+                    if skip_unavailable_fragments is set
+
+        Up to concurrent_fragment_downloads fragments are downloaded at the
+        same time. pack_func, if given, is called with the content and the
+        dict of each fragment right before it's appended and should return
+        the data to append.
+
+        stream_func, if given, is called with a file-like object and the
+        dict of each fragment before it's downloaded and should return a
+        file-like object the fragment is written to as it's downloaded,
+        which writes the data to append to the former (or the former itself).
+        Its close() method is called once the fragment is complete.
+
+        Fragments downloaded one at a time are written straight to the
+        destination file, unless pack_func needs them as a whole.
+
+        Return True on success and False otherwise.
+        """
+        fragment_retries = self.params.get('fragment_retries', 0)
+        skip_unavailable_fragments = self.params.get('skip_unavailable_fragments', True)
+        concurrency = self.params.get('concurrent_fragment_downloads') or 1
+        direct = concurrency == 1 and not pack_func and ctx['tmpfilename'] != '-'
+
+        def fetch_fragment(fragment):
+            args = (ctx, fragment['frag_index'], fragment['url'], info_dict, fragment.get('headers'))
+            if direct:
+                stream = _FragmentStream(ctx['dest_stream'])
+            elif stream_func:
+                stream = io.BytesIO()
+            else:
+                return self._download_fragment(*args)
+            writer = stream_func(stream, fragment) if stream_func else stream
+            success = False
+            try:
+                success, _ = self._download_fragment(*args, stream=writer)
+                if success and writer is not stream:
+                    writer.close()
+            finally:
+                if direct and not success:
+                    # Leave no partial fragment behind
+                    stream.seek(0)
+                    stream.truncate()
+            if not success:
+                return False, None
+            return True, b'' if direct else stream.getvalue()
+
+        def download_fragment(fragment):
+            frag_index = fragment['frag_index']
+            fatal = fragment.get('fatal', False) or not skip_unavailable_fragments
+            count = 0
+            while count <= fragment_retries:
+                try:
+                    return fetch_fragment(fragment)
+                except compat_urllib_error.HTTPError as err:
+                    # Unavailable (possibly temporary) fragments may be served.
+                    # First we try to retry then either skip or abort.
+                    # See https://github.com/ytdl-org/youtube-dl/issues/10165,
+                    # https://github.com/ytdl-org/youtube-dl/issues/10448).
+                    count += 1
+                    if count <= fragment_retries:
+                        self.report_retry_fragment(err, frag_index, count, fragment_retries)
+                except DownloadError:
+                    # Don't retry fragment if error occurred during HTTP downloading
+                    # itself since it has own retry settings
+                    if fatal:
+                        raise
+                    break
+            if fatal:
+                self.report_error('giving up after %s fragment retries' % fragment_retries)
+                return False, None
+            self.report_skip_fragment(frag_index)
+            return True, None
+
+        def process_fragment(fragment):
+            return fragment, download_fragment(fragment)
+
+        # ctx['fragment_index'] moves on as the fragments are appended
+        resume_index = ctx['fragment_index']
+        results = concurrent_imap(
+            self.ydl.share_metrics(process_fragment),
+            (f for f in fragments if f['frag_index'] > resume_index), concurrency)
+        for fragment, (success, frag_content) in results:
+            if not success:
+                return False
+            if frag_content is None:
+                self._complete_fragment(ctx, fragment['frag_index'])
+                continue
+            if pack_func:
+                frag_content = pack_func(frag_content, fragment)
+            self._append_fragment(ctx, fragment['frag_index'], frag_content)
+
+        self._finish_frag_download(ctx)
+
+        return True
 
     def _prepare_frag_download(self, ctx):
         if 'live' not in ctx:
@@ -133,18 +310,15 @@ class FragmentFD(FileDownloader):
         self.to_screen(
             '[%s] Total fragments: %s' % (self.FD_NAME, total_frags_str))
         self.report_destination(ctx['filename'])
-        dl = HttpQuietDownloader(
-            self.ydl,
-            {
-                'continuedl': True,
-                'quiet': True,
-                'noprogress': True,
-                'ratelimit': self.params.get('ratelimit'),
-                'retries': self.params.get('retries', 0),
-                'nopart': self.params.get('nopart', False),
-                'test': self.params.get('test', False),
-            }
-        )
+        dl_params = {
+            'continuedl': True,
+            'quiet': True,
+            'noprogress': True,
+            'ratelimit': self.params.get('ratelimit'),
+            'retries': self.params.get('retries', 0),
+            'nopart': self.params.get('nopart', False),
+            'test': self.params.get('test', False),
+        }
         tmpfilename = self.temp_name(ctx['filename'])
         open_mode = 'wb'
         resume_len = 0
@@ -180,9 +354,15 @@ class FragmentFD(FileDownloader):
                 assert ctx['fragment_index'] == 0
 
         dest_stream, tmpfilename = sanitize_open(tmpfilename, open_mode)
+        fragment_offset = ctx.get('fragment_offset')
+        if resume_len and fragment_offset is not None and fragment_offset < resume_len:
+            # Drop the part of a fragment written before the interruption
+            dest_stream.seek(fragment_offset)
+            dest_stream.truncate()
+            resume_len = fragment_offset
 
         ctx.update({
-            'dl': dl,
+            'dl_params': dl_params,
             'dest_stream': dest_stream,
             'tmpfilename': tmpfilename,
             # Total complete fragments downloaded so far in bytes
@@ -204,45 +384,45 @@ class FragmentFD(FileDownloader):
         }
 
         start = time.time()
-        ctx.update({
-            'started': start,
-            # Amount of fragment's bytes downloaded by the time of the previous
-            # frag progress hook invocation
-            'prev_frag_downloaded_bytes': 0,
-        })
-
-        def frag_progress_hook(s):
+        ctx['started'] = start
+        # Progress hooks of concurrently downloaded fragments may be called
+        # from different threads
+        lock = threading.Lock()
+        # Amount of bytes downloaded so far for each fragment being downloaded
+        frags_downloaded_bytes = {}
+
+        def frag_progress_hook(frag_index, s):
             if s['status'] not in ('downloading', 'finished'):
                 return
 
-            time_now = time.time()
-            state['elapsed'] = time_now - start
-            frag_total_bytes = s.get('total_bytes') or 0
-            if not ctx['live']:
-                estimated_size = (
-                    (ctx['complete_frags_downloaded_bytes'] + frag_total_bytes)
-                    / (state['fragment_index'] + 1) * total_frags)
-                state['total_bytes_estimate'] = estimated_size
-
-            if s['status'] == 'finished':
-                state['fragment_index'] += 1
-                ctx['fragment_index'] = state['fragment_index']
-                state['downloaded_bytes'] += frag_total_bytes - ctx['prev_frag_downloaded_bytes']
-                ctx['complete_frags_downloaded_bytes'] = state['downloaded_bytes']
-                ctx['prev_frag_downloaded_bytes'] = 0
-            else:
-                frag_downloaded_bytes = s['downloaded_bytes']
-                state['downloaded_bytes'] += frag_downloaded_bytes - ctx['prev_frag_downloaded_bytes']
+            with lock:
+                time_now = time.time()
+                state['elapsed'] = time_now - start
+                frag_total_bytes = s.get('total_bytes') or 0
                 if not ctx['live']:
-                    state['eta'] = self.calc_eta(
-                        start, time_now, estimated_size - resume_len,
-                        state['downloaded_bytes'] - resume_len)
-                state['speed'] = s.get('speed') or ctx.get('speed')
-                ctx['speed'] = state['speed']
-                ctx['prev_frag_downloaded_bytes'] = frag_downloaded_bytes
-            self._hook_progress(state)
-
-        ctx['dl'].add_progress_hook(frag_progress_hook)
+                    estimated_size = (
+                        (ctx['complete_frags_downloaded_bytes'] + frag_total_bytes)
+                        / (state['fragment_index'] + 1) * total_frags)
+                    state['total_bytes_estimate'] = estimated_size
+
+                prev_frag_downloaded_bytes = frags_downloaded_bytes.pop(frag_index, 0)
+                if s['status'] == 'finished':
+                    state['fragment_index'] += 1
+                    state['downloaded_bytes'] += frag_total_bytes - prev_frag_downloaded_bytes
+                    ctx['complete_frags_downloaded_bytes'] += frag_total_bytes
+                else:
+                    frag_downloaded_bytes = s['downloaded_bytes']
+                    frags_downloaded_bytes[frag_index] = frag_downloaded_bytes
+                    state['downloaded_bytes'] += frag_downloaded_bytes - prev_frag_downloaded_bytes
+                    if not ctx['live']:
+                        state['eta'] = self.calc_eta(
+                            start, time_now, estimated_size - resume_len,
+                            state['downloaded_bytes'] - resume_len)
+                    state['speed'] = self.calc_speed(
+                        start, time_now, state['downloaded_bytes'] - resume_len) or state.get('speed')
+                self._hook_progress(state)
+
+        ctx['frag_progress_hook'] = frag_progress_hook
 
         return start
 
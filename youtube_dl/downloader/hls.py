@@ -1,27 +1,92 @@
 from __future__ import unicode_literals
 
 import re
-import binascii
-try:
-    from Crypto.Cipher import AES
-    can_decrypt_frag = True
-except ImportError:
-    can_decrypt_frag = False
+import itertools
+import socket
+import threading
+import time
 
 from .fragment import FragmentFD
 from .external import FFmpegFD
 
+from ..aes import (
+    AESCipher,
+    BLOCK_SIZE_BYTES,
+)
 from ..compat import (
+    compat_http_client,
     compat_urllib_error,
     compat_urlparse,
     compat_struct_pack,
 )
+from ..m3u8 import M3U8MediaPlaylist
 from ..utils import (
-    parse_m3u8_attributes,
+    error_to_compat_str,
     update_url_query,
 )
 
 
+class _AES128Decrypter(object):
+    """
+    File-like object decrypting AES-128 CBC data as it's written and
+    writing the plaintext to stream.
+
+    Only the last block received is held back, as it may end with PKCS#7
+    padding, which is removed when the object is closed. Positions are
+    those of the encrypted data; seeking back to 0 restarts the decryption
+    from the beginning of stream.
+    """
+
+    def __init__(self, stream, cipher, iv):
+        self._stream = stream
+        self._cipher = cipher
+        self._iv = iv
+        self._seek_start()
+
+    def _seek_start(self):
+        self._pos = 0
+        self._prev_block = self._iv
+        self._pending = b''
+
+    def write(self, data):
+        self._pos += len(data)
+        data = self._pending + data
+        # Decrypt the complete blocks but the last one
+        end = len(data) - (len(data) % BLOCK_SIZE_BYTES or BLOCK_SIZE_BYTES)
+        if end > 0:
+            self._stream.write(self._cipher.cbc_decrypt(data[:end], self._prev_block))
+            self._prev_block = data[end - BLOCK_SIZE_BYTES:end]
+        self._pending = data[max(end, 0):]
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos):
+        if pos == self._pos:
+            return
+        if pos != 0:
+            raise ValueError('Can only seek to the start or the current position')
+        self._stream.seek(0)
+        self._seek_start()
+
+    def truncate(self):
+        self._stream.truncate()
+
+    def close(self):
+        data = self._pending
+        padding = -len(data) % BLOCK_SIZE_BYTES
+        # An incomplete last block is decrypted as if padded with zeros
+        data = self._cipher.cbc_decrypt(data + b'\0' * padding, self._prev_block)
+        if padding:
+            data = data[:-padding]
+        elif data:
+            pad_len = ord(data[-1:])
+            if 0 < pad_len <= BLOCK_SIZE_BYTES and data[-pad_len:] == data[-1:] * pad_len:
+                data = data[:-pad_len]
+        self._stream.write(data)
+        self._pending = b''
+
+
 class HlsFD(FragmentFD):
     """ A limited implementation that does not require ffmpeg """
 
@@ -50,9 +115,7 @@ class HlsFD(FragmentFD):
         )
         check_results = [not re.search(feature, manifest) for feature in UNSUPPORTED_FEATURES]
         is_aes128_enc = '#EXT-X-KEY:METHOD=AES-128' in manifest
-        check_results.append(can_decrypt_frag or not is_aes128_enc)
         check_results.append(not (is_aes128_enc and r'#EXT-X-BYTERANGE' in manifest))
-        check_results.append(not info_dict.get('is_live'))
         return all(check_results)
 
     def real_download(self, filename, info_dict):
@@ -65,7 +128,7 @@ class HlsFD(FragmentFD):
 
         if not self.can_download(s, info_dict):
             if info_dict.get('extra_param_to_segment_url') or info_dict.get('_decryption_key_url'):
-                self.report_error('pycrypto not found. Please install it.')
+                self.report_error('hlsnative has detected features it does not support')
                 return False
             self.report_warning(
                 'hlsnative has detected features it does not support, '
@@ -75,136 +138,142 @@ class HlsFD(FragmentFD):
                 fd.add_progress_hook(ph)
             return fd.real_download(filename, info_dict)
 
-        def is_ad_fragment_start(s):
-            return (s.startswith('#ANVATO-SEGMENT-INFO') and 'type=ad' in s
-                    or s.startswith('#UPLYNK-SEGMENT') and s.endswith(',ad'))
-
-        def is_ad_fragment_end(s):
-            return (s.startswith('#ANVATO-SEGMENT-INFO') and 'type=master' in s
-                    or s.startswith('#UPLYNK-SEGMENT') and s.endswith(',segment'))
-
-        media_frags = 0
-        ad_frags = 0
-        ad_frag_next = False
-        for line in s.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith('#'):
-                if is_ad_fragment_start(line):
-                    ad_frag_next = True
-                elif is_ad_fragment_end(line):
-                    ad_frag_next = False
-                continue
-            if ad_frag_next:
-                ad_frags += 1
-                continue
-            media_frags += 1
+        extra_query = None
+        extra_param_to_segment_url = info_dict.get('extra_param_to_segment_url')
+        if extra_param_to_segment_url:
+            extra_query = compat_urlparse.parse_qs(extra_param_to_segment_url)
+
+        def fragment_builder(playlist):
+            """Return a function building the dict of the fragments of playlist"""
+            keys = playlist.keys
+            if extra_query:
+                keys = [
+                    dict(key, URI=update_url_query(key['URI'], extra_query))
+                    if key['METHOD'] == 'AES-128' else key
+                    for key in keys]
+
+            def build_fragment(frag_index, segment):
+                frag_url = segment.url
+                if extra_query:
+                    frag_url = update_url_query(frag_url, extra_query)
+                headers = None
+                if segment.byte_range:
+                    headers = dict(info_dict.get('http_headers', {}))
+                    headers['Range'] = 'bytes=%d-%d' % (segment.byte_range[0], segment.byte_range[1] - 1)
+                return {
+                    'frag_index': frag_index,
+                    'url': frag_url,
+                    'headers': headers,
+                    'decrypt_info': keys[segment.key],
+                    'media_sequence': segment.media_sequence,
+                }
+            return build_fragment
+
+        playlist = M3U8MediaPlaylist(s, man_url)
+        live = self._is_live(playlist, info_dict)
 
         ctx = {
             'filename': filename,
-            'total_frags': media_frags,
-            'ad_frags': ad_frags,
+            'total_frags': len(playlist.media_segments),
+            'ad_frags': playlist.ad_count,
+            'live': live,
         }
 
         self._prepare_and_start_frag_download(ctx)
 
-        fragment_retries = self.params.get('fragment_retries', 0)
-        skip_unavailable_fragments = self.params.get('skip_unavailable_fragments', True)
-        test = self.params.get('test', False)
+        if live:
+            fragments = self._live_fragments(s, playlist, info_dict, fragment_builder)
+        else:
+            segments = playlist.media_segments
+            build_fragment = fragment_builder(playlist)
+            # Resuming seeks right to the first fragment not downloaded yet
+            fragments = (
+                build_fragment(i + 1, segments[i])
+                for i in range(ctx['fragment_index'], len(segments)))
 
-        extra_query = None
-        extra_param_to_segment_url = info_dict.get('extra_param_to_segment_url')
-        if extra_param_to_segment_url:
-            extra_query = compat_urlparse.parse_qs(extra_param_to_segment_url)
-        i = 0
-        media_sequence = 0
-        decrypt_info = {'METHOD': 'NONE'}
-        byte_range = {}
+        # We only download the first fragment during the test
+        if self.params.get('test', False):
+            fragments = itertools.islice(fragments, 1)
+
+        # Ciphers by key URL, the keys are fetched when first needed
+        ciphers = {}
+        ciphers_lock = threading.Lock()
+
+        def decrypt_fragment(stream, fragment):
+            decrypt_info = fragment['decrypt_info']
+            if decrypt_info['METHOD'] != 'AES-128':
+                return stream
+            iv = decrypt_info.get('IV') or compat_struct_pack('>8xq', fragment['media_sequence'])
+            key_url = info_dict.get('_decryption_key_url') or decrypt_info['URI']
+            with ciphers_lock:
+                if key_url not in ciphers:
+                    ciphers[key_url] = AESCipher(self.ydl.urlopen(
+                        self._prepare_url(info_dict, key_url)).read())
+            return _AES128Decrypter(stream, ciphers[key_url], iv)
+
+        try:
+            return self.download_and_append_fragments(
+                ctx, fragments, info_dict, stream_func=decrypt_fragment)
+        except KeyboardInterrupt:
+            if not live:
+                raise
+            # As with ffmpeg, stopping the recording of a live stream is
+            # its expected end, the fragments downloaded so far are kept
+            self.to_screen('[%s] Interrupted by user' % self.FD_NAME)
+            self._finish_frag_download(ctx)
+            return True
+
+    @staticmethod
+    def _is_live(playlist, info_dict):
+        # Segments are appended to live and event playlists until they end
+        return not playlist.ended and (
+            info_dict.get('is_live') or playlist.playlist_type == 'EVENT')
+
+    def _live_fragments(self, manifest, playlist, info_dict, fragment_builder):
+        """
+        Yield the fragments of a live playlist, starting with those of
+        manifest (parsed as playlist), as they are added to it.
+
+        The playlist is reloaded every target duration (half of it when it
+        didn't change, see RFC 8216, section 6.3.4) and the segments are told
+        apart by their media sequence number. It ends when the playlist gets
+        an #EXT-X-ENDLIST tag or doesn't change for 3 target durations.
+        """
+        man_url = info_dict['url']
+        target_duration = playlist.target_duration or 10.0
         frag_index = 0
-        ad_frag_next = False
-        for line in s.splitlines():
-            line = line.strip()
-            if line:
-                if not line.startswith('#'):
-                    if ad_frag_next:
-                        continue
-                    frag_index += 1
-                    if frag_index <= ctx['fragment_index']:
-                        continue
-                    frag_url = (
-                        line
-                        if re.match(r'^https?://', line)
-                        else compat_urlparse.urljoin(man_url, line))
-                    if extra_query:
-                        frag_url = update_url_query(frag_url, extra_query)
-                    count = 0
-                    headers = info_dict.get('http_headers', {})
-                    if byte_range:
-                        headers['Range'] = 'bytes=%d-%d' % (byte_range['start'], byte_range['end'] - 1)
-                    while count <= fragment_retries:
-                        try:
-                            success, frag_content = self._download_fragment(
-                                ctx, frag_url, info_dict, headers)
-                            if not success:
-                                return False
-                            break
-                        except compat_urllib_error.HTTPError as err:
-                            # Unavailable (possibly temporary) fragments may be served.
-                            # First we try to retry then either skip or abort.
-                            # See https://github.com/ytdl-org/youtube-dl/issues/10165,
-                            # https://github.com/ytdl-org/youtube-dl/issues/10448).
-                            count += 1
-                            if count <= fragment_retries:
-                                self.report_retry_fragment(err, frag_index, count, fragment_retries)
-                    if count > fragment_retries:
-                        if skip_unavailable_fragments:
-                            i += 1
-                            media_sequence += 1
-                            self.report_skip_fragment(frag_index)
-                            continue
-                        self.report_error(
-                            'giving up after %s fragment retries' % fragment_retries)
-                        return False
-                    if decrypt_info['METHOD'] == 'AES-128':
-                        iv = decrypt_info.get('IV') or compat_struct_pack('>8xq', media_sequence)
-                        decrypt_info['KEY'] = decrypt_info.get('KEY') or self.ydl.urlopen(
-                            self._prepare_url(info_dict, info_dict.get('_decryption_key_url') or decrypt_info['URI'])).read()
-                        frag_content = AES.new(
-                            decrypt_info['KEY'], AES.MODE_CBC, iv).decrypt(frag_content)
-                    self._append_fragment(ctx, frag_content)
-                    # We only download the first fragment during the test
-                    if test:
-                        break
-                    i += 1
-                    media_sequence += 1
-                elif line.startswith('#EXT-X-KEY'):
-                    decrypt_url = decrypt_info.get('URI')
-                    decrypt_info = parse_m3u8_attributes(line[11:])
-                    if decrypt_info['METHOD'] == 'AES-128':
-                        if 'IV' in decrypt_info:
-                            decrypt_info['IV'] = binascii.unhexlify(decrypt_info['IV'][2:].zfill(32))
-                        if not re.match(r'^https?://', decrypt_info['URI']):
-                            decrypt_info['URI'] = compat_urlparse.urljoin(
-                                man_url, decrypt_info['URI'])
-                        if extra_query:
-                            decrypt_info['URI'] = update_url_query(decrypt_info['URI'], extra_query)
-                        if decrypt_url != decrypt_info['URI']:
-                            decrypt_info['KEY'] = None
-                elif line.startswith('#EXT-X-MEDIA-SEQUENCE'):
-                    media_sequence = int(line[22:])
-                elif line.startswith('#EXT-X-BYTERANGE'):
-                    splitted_byte_range = line[17:].split('@')
-                    sub_range_start = int(splitted_byte_range[1]) if len(splitted_byte_range) == 2 else byte_range['end']
-                    byte_range = {
-                        'start': sub_range_start,
-                        'end': sub_range_start + int(splitted_byte_range[0]),
-                    }
-                elif is_ad_fragment_start(line):
-                    ad_frag_next = True
-                elif is_ad_fragment_end(line):
-                    ad_frag_next = False
-
-        self._finish_frag_download(ctx)
-
-        return True
+        last_sequence = None
+        loaded = changed = time.time()
+        while True:
+            build_fragment = fragment_builder(playlist)
+            new_segments = [
+                segment for segment in playlist.media_segments
+                if last_sequence is None or segment.media_sequence > last_sequence]
+            if new_segments:
+                # The segments that left the playlist before it was reloaded
+                if last_sequence is not None and playlist.media_sequence > last_sequence + 1:
+                    self.report_warning('Missed %d fragments' % (playlist.media_sequence - last_sequence - 1))
+                last_sequence = new_segments[-1].media_sequence
+            for segment in new_segments:
+                frag_index += 1
+                yield build_fragment(frag_index, segment)
+            if playlist.ended:
+                return
+            time.sleep(max(
+                loaded + (target_duration if changed == loaded else target_duration / 2) - time.time(), 0))
+            loaded = time.time()
+            try:
+                urlh = self.ydl.urlopen(self._prepare_url(info_dict, man_url))
+                new_manifest = urlh.read().decode('utf-8', 'ignore')
+            except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error) as err:
+                # Tried again on the next reload
+                self.report_warning('Unable to reload the playlist: %s' % error_to_compat_str(err))
+                new_manifest = manifest
+            if new_manifest != manifest:
+                manifest = new_manifest
+                changed = loaded
+                playlist = M3U8MediaPlaylist(manifest, urlh.geturl())
+            elif loaded - changed > 3 * target_duration:
+                self.report_warning(
+                    'The playlist was not updated for %d seconds, stopping' % (loaded - changed))
+                return
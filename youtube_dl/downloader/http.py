@@ -1,8 +1,11 @@
 from __future__ import unicode_literals
 
 import errno
+import io
+import json
 import os
 import socket
+import threading
 import time
 import random
 import re
@@ -13,6 +16,7 @@ from ..compat import (
     compat_urllib_error,
 )
 from ..utils import (
+    concurrent_imap,
     ContentTooShortError,
     encodeFilename,
     int_or_none,
@@ -25,6 +29,48 @@ from ..utils import (
 
 
 class HttpFD(FileDownloader):
+    """
+    Available options:
+
+    http_connections:   Number of connections to download a file over,
+                        each one fetching a different byte range of it
+                        (1 by default)
+
+    When downloading over several connections the progress of each range is
+    kept in a .ytdl file (see FragmentFD) with the following format:
+
+    downloader:
+        total_bytes:    Size of the file
+        ranges:         List of dicts with start, end (inclusive) and
+                        downloaded (the number of bytes written from start)
+    """
+
+    # Blocks read into a reused buffer cost no allocation, larger ones mean
+    # less work per byte at high rates
+    _MAX_BUFFER_SIZE = 32 * 1024 * 1024
+
+    @staticmethod
+    def _block_reader(data, reuse_buffer=True):
+        """
+        Return a function reading up to size bytes of the response data and
+        the maximum block size for it.
+
+        When the response supports it and reuse_buffer is set the data is
+        read into a buffer reused for every block: the blocks are then
+        memoryviews, only valid until the next read.
+        """
+        readinto = getattr(data, 'readinto', None)
+        if readinto is None or not reuse_buffer:
+            return data.read, 4194304
+        buffers = [None]
+
+        def read(size):
+            buf = buffers[0]
+            if buf is None or len(buf) < size:
+                buf = buffers[0] = memoryview(bytearray(size))
+            return buf[:readinto(buf[:size])]
+        return read, HttpFD._MAX_BUFFER_SIZE
+
     def real_download(self, filename, info_dict):
         url = info_dict['url']
 
@@ -34,9 +80,16 @@ class HttpFD(FileDownloader):
             __delattr__ = dict.__delitem__
 
         ctx = DownloadContext()
-        ctx.filename = filename
-        ctx.tmpfilename = self.temp_name(filename)
-        ctx.stream = None
+        # filename may also be a file-like object (e.g. an in-memory buffer)
+        # the data is written to, it's then handled much like stdout
+        ctx.to_stream = hasattr(filename, 'write')
+        if ctx.to_stream:
+            ctx.filename = ctx.tmpfilename = '-'
+            ctx.stream = filename
+        else:
+            ctx.filename = filename
+            ctx.tmpfilename = self.temp_name(filename)
+            ctx.stream = None
 
         # Do not include the Accept-Encoding header
         headers = {'Youtubedl-no-compression': 'True'}
@@ -56,11 +109,21 @@ class HttpFD(FileDownloader):
         ctx.start_time = time.time()
         ctx.chunk_size = None
 
+        connections = self.params.get('http_connections') or 1
+        if connections > 1 and not ctx.to_stream and not is_test and ctx.tmpfilename != '-':
+            success = self._download_ranges(ctx, url, headers, info_dict, connections)
+            if success is not None:
+                return success
+
         if self.params.get('continuedl', True):
             # Establish possible resume length
             if os.path.isfile(encodeFilename(ctx.tmpfilename)):
                 ctx.resume_len = os.path.getsize(
                     encodeFilename(ctx.tmpfilename))
+                if os.path.isfile(encodeFilename(self.ytdl_filename(ctx.filename))):
+                    # Left by a download over several connections, only the
+                    # data up to the first missing byte can be resumed
+                    ctx.resume_len = self._drop_ranges_state(ctx, ctx.resume_len)
 
         ctx.is_resume = ctx.resume_len > 0
 
@@ -215,15 +278,23 @@ class HttpFD(FileDownloader):
 
             byte_counter = 0 + ctx.resume_len
             block_size = ctx.block_size
+
+            if ctx.to_stream:
+                # Drop the data written by a previous attempt that could not
+                # be resumed
+                ctx.stream.seek(ctx.resume_len)
+                ctx.stream.truncate()
             start = time.time()
 
-            # measure time over whole while-loop, so slow_down() and best_block_size() work together properly
-            now = None  # needed for slow_down() in the first loop run
+            # measure time over whole while-loop, so throttle() and best_block_size() work together properly
             before = start  # start measuring
 
+            # Streams of the caller may keep the blocks
+            read, max_block_size = self._block_reader(ctx.data, not ctx.to_stream)
+
             def retry(e):
                 to_stdout = ctx.tmpfilename == '-'
-                if ctx.stream is not None:
+                if ctx.stream is not None and not ctx.to_stream:
                     if not to_stdout:
                         ctx.stream.close()
                     ctx.stream = None
@@ -233,7 +304,7 @@ class HttpFD(FileDownloader):
             while True:
                 try:
                     # Download and write
-                    data_block = ctx.data.read(block_size if data_len is None else min(block_size, data_len - byte_counter))
+                    data_block = read(block_size if data_len is None else min(block_size, data_len - byte_counter))
                 # socket.timeout is a subclass of socket.error but may not have
                 # errno set
                 except socket.timeout as e:
@@ -277,7 +348,7 @@ class HttpFD(FileDownloader):
                     return False
 
                 # Apply rate limit
-                self.slow_down(start, now, byte_counter - ctx.resume_len)
+                self.throttle(url, len(data_block))
 
                 # end measuring of one loop run
                 now = time.time()
@@ -285,7 +356,7 @@ class HttpFD(FileDownloader):
 
                 # Adjust block size
                 if not self.params.get('noresizebuffer', False):
-                    block_size = self.best_block_size(after - before, len(data_block))
+                    block_size = self.best_block_size(after - before, len(data_block), max_block_size)
 
                 before = after
 
@@ -360,3 +431,237 @@ class HttpFD(FileDownloader):
 
         self.report_error('giving up after %s retries' % retries)
         return False
+
+    def _read_ranges_state(self, ctx):
+        try:
+            with io.open(encodeFilename(self.ytdl_filename(ctx.filename)), 'r', encoding='utf-8') as f:
+                state = json.loads(f.read())['downloader']
+            ranges = [dict((k, int(r[k])) for k in ('start', 'end', 'downloaded')) for r in state['ranges']]
+            return int(state['total_bytes']), ranges
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None, None
+
+    def _write_ranges_state(self, ctx, total_bytes, ranges):
+        stream, _ = sanitize_open(self.ytdl_filename(ctx.filename), 'w')
+        with stream:
+            stream.write(json.dumps({'downloader': {
+                'total_bytes': total_bytes,
+                'ranges': ranges,
+            }}))
+
+    def _drop_ranges_state(self, ctx, resume_len):
+        """Truncate the file to its complete beginning and remove the state"""
+        _, ranges = self._read_ranges_state(ctx)
+        if ranges is None:
+            return resume_len
+        resume_len = 0
+        for r in sorted(ranges, key=lambda r: r['start']):
+            if r['start'] > resume_len:
+                break
+            resume_len = r['start'] + r['downloaded']
+            if r['start'] + r['downloaded'] <= r['end']:
+                break
+        with io.open(encodeFilename(ctx.tmpfilename), 'r+b') as f:
+            f.truncate(resume_len)
+        os.remove(encodeFilename(self.ytdl_filename(ctx.filename)))
+        return resume_len
+
+    def _download_ranges(self, ctx, url, headers, info_dict, connections):
+        """
+        Download the file over several connections at once, each one
+        writing a byte range of the file in place.
+
+        Return None if the server doesn't allow it, the result of the
+        download otherwise.
+        """
+        # Find out the size of the file
+        request = sanitized_Request(url, None, headers)
+        request.add_header('Range', 'bytes=0-0')
+        try:
+            probe = self.ydl.urlopen(request)
+        except compat_urllib_error.HTTPError as err:
+            if err.code == 416 or 500 <= err.code < 600:
+                return None
+            raise
+        content_range = probe.headers.get('Content-Range')
+        last_modified = probe.headers.get('last-modified')
+        probe.close()
+        mobj = re.search(r'bytes 0-\d+/(\d+)', content_range or '')
+        if not mobj:
+            return None
+        total_bytes = int(mobj.group(1))
+
+        min_data_len = self.params.get('min_filesize')
+        max_data_len = self.params.get('max_filesize')
+        if min_data_len is not None and total_bytes < min_data_len:
+            self.to_screen('\r[download] File is smaller than min-filesize (%s bytes < %s bytes). Aborting.' % (total_bytes, min_data_len))
+            return False
+        if max_data_len is not None and total_bytes > max_data_len:
+            self.to_screen('\r[download] File is larger than max-filesize (%s bytes > %s bytes). Aborting.' % (total_bytes, max_data_len))
+            return False
+
+        ranges = None
+        resume_len = 0
+        ytdl_filename = encodeFilename(self.ytdl_filename(ctx.filename))
+        if self.params.get('continuedl', True) and os.path.isfile(encodeFilename(ctx.tmpfilename)):
+            if os.path.isfile(ytdl_filename):
+                state_total_bytes, ranges = self._read_ranges_state(ctx)
+                if state_total_bytes != total_bytes:
+                    self.report_unable_to_resume()
+                    ranges = None
+            else:
+                # Left by a download over a single connection
+                resume_len = min(os.path.getsize(encodeFilename(ctx.tmpfilename)), total_bytes)
+        if ranges is None:
+            remaining = total_bytes - resume_len
+            count = max(min(connections, remaining), 1)
+            ranges = [{
+                'start': resume_len + remaining * i // count,
+                'end': resume_len + remaining * (i + 1) // count - 1,
+                'downloaded': 0,
+            } for i in range(count)]
+        else:
+            resume_len = sum(r['downloaded'] for r in ranges)
+        if resume_len:
+            self.report_resuming_byte(resume_len)
+
+        try:
+            stream, ctx.tmpfilename = sanitize_open(
+                ctx.tmpfilename, 'r+b' if resume_len else 'wb')
+            with stream:
+                # Preallocate the file so each range can be written in place
+                stream.truncate(total_bytes)
+        except (OSError, IOError) as err:
+            self.report_error('unable to open for writing: %s' % str(err))
+            return False
+        ctx.filename = self.undo_temp_name(ctx.tmpfilename)
+        self.report_destination(ctx.filename)
+        self._write_ranges_state(ctx, total_bytes, ranges)
+
+        if self.params.get('xattr_set_filesize', False):
+            try:
+                write_xattr(ctx.tmpfilename, 'user.ytdl.filesize', str(total_bytes).encode('utf-8'))
+            except (XAttrUnavailableError, XAttrMetadataError) as err:
+                self.report_error('unable to set filesize xattr: %s' % str(err))
+
+        retries = self.params.get('retries', 0)
+        lock = threading.Lock()
+        start = time.time()
+        state = {
+            'downloaded_bytes': resume_len,
+            'saved': start,
+            'aborted': False,
+        }
+
+        def report_progress(size):
+            with lock:
+                state['downloaded_bytes'] += size
+                now = time.time()
+                # Don't rewrite the .ytdl file on every block
+                if now - state['saved'] >= 1:
+                    state['saved'] = now
+                    self._write_ranges_state(ctx, total_bytes, ranges)
+                downloaded = state['downloaded_bytes'] - resume_len
+                self._hook_progress({
+                    'status': 'downloading',
+                    'downloaded_bytes': state['downloaded_bytes'],
+                    'total_bytes': total_bytes,
+                    'tmpfilename': ctx.tmpfilename,
+                    'filename': ctx.filename,
+                    'eta': self.calc_eta(start, now, total_bytes - resume_len, downloaded),
+                    'speed': self.calc_speed(start, now, downloaded),
+                    'elapsed': now - ctx.start_time,
+                })
+
+        def fetch_range(r, stream):
+            range_start = r['start'] + r['downloaded']
+            request = sanitized_Request(url, None, headers)
+            request.add_header('Range', 'bytes=%d-%d' % (range_start, r['end']))
+            data = self.ydl.urlopen(request)
+            try:
+                mobj = re.search(r'bytes (\d+)-', data.headers.get('Content-Range') or '')
+                if not mobj or int(mobj.group(1)) != range_start:
+                    raise ContentTooShortError(0, r['end'] - range_start + 1)
+                stream.seek(range_start)
+                read, max_block_size = self._block_reader(data)
+                block_size = ctx.block_size
+                before = time.time()
+                while not state['aborted'] and r['start'] + r['downloaded'] <= r['end']:
+                    data_block = read(min(block_size, r['end'] - r['start'] - r['downloaded'] + 1))
+                    if not data_block:
+                        raise ContentTooShortError(
+                            r['downloaded'], r['end'] - r['start'] + 1)
+                    stream.write(data_block)
+                    r['downloaded'] += len(data_block)
+                    report_progress(len(data_block))
+                    self.throttle(url, len(data_block))
+                    after = time.time()
+                    if not self.params.get('noresizebuffer', False):
+                        block_size = self.best_block_size(after - before, len(data_block), max_block_size)
+                    before = after
+            finally:
+                data.close()
+
+        class GiveUp(Exception):
+            pass
+
+        def download_range(r):
+            count = 0
+            try:
+                # Unbuffered, so that the .ytdl file never accounts for data
+                # that is not written yet
+                with io.open(encodeFilename(ctx.tmpfilename), 'r+b', buffering=0) as stream:
+                    while True:
+                        try:
+                            return fetch_range(r, stream)
+                        except compat_urllib_error.HTTPError as err:
+                            if err.code < 500 or err.code >= 600:
+                                raise
+                            error = err
+                        except compat_urllib_error.URLError as err:
+                            if not isinstance(err.reason, socket.timeout):
+                                raise
+                            error = err
+                        except socket.timeout as err:
+                            error = err
+                        except socket.error as err:
+                            if err.errno not in (errno.ECONNRESET, errno.ETIMEDOUT):
+                                raise
+                            error = err
+                        except ContentTooShortError as err:
+                            error = err
+                        count += 1
+                        if count > retries:
+                            raise GiveUp(error)
+                        self.report_retry(error, count, retries)
+            except BaseException:
+                # Stop the other connections
+                state['aborted'] = True
+                raise
+
+        pending = [r for r in ranges if r['start'] + r['downloaded'] <= r['end']]
+        try:
+            for _ in concurrent_imap(self.ydl.share_metrics(download_range), pending, len(pending)):
+                pass
+        except GiveUp:
+            self.report_error('giving up after %s retries' % retries)
+            return False
+        finally:
+            state['aborted'] = True
+            self._write_ranges_state(ctx, total_bytes, ranges)
+
+        os.remove(ytdl_filename)
+        self.try_rename(ctx.tmpfilename, ctx.filename)
+
+        if self.params.get('updatetime', True):
+            info_dict['filetime'] = self.try_utime(ctx.filename, last_modified)
+
+        self._hook_progress({
+            'downloaded_bytes': total_bytes,
+            'total_bytes': total_bytes,
+            'filename': ctx.filename,
+            'status': 'finished',
+            'elapsed': time.time() - ctx.start_time,
+        })
+
+        return True
@@ -36,6 +36,10 @@ from ..downloader.f4m import (
     get_base_url,
     remove_encrypted_media,
 )
+from ..m3u8 import (
+    M3U8MasterPlaylist,
+    resolve_m3u8_url,
+)
 from ..utils import (
     NO_DEFAULT,
     age_restricted,
@@ -62,7 +66,6 @@ from ..utils import (
     parse_codecs,
     parse_duration,
     parse_iso8601,
-    parse_m3u8_attributes,
     parse_resolution,
     RegexNotFoundError,
     sanitized_Request,
@@ -70,6 +73,7 @@ from ..utils import (
     str_or_none,
     str_to_int,
     strip_or_none,
+    TemplatedFragments,
     unescapeHTML,
     unified_strdate,
     unified_timestamp,
@@ -162,7 +166,9 @@ class InfoExtractor(object):
                                  Base URL for fragments. Each fragment's path
                                  value (if present) will be relative to
                                  this URL.
-                    * fragments  A list of fragments of a fragmented media.
+                    * fragments  A list of fragments of a fragmented media
+                                 (or a sequence building them on access, see
+                                 utils.TemplatedFragments).
                                  Each fragment entry must contain either an url
                                  or a path. If an url is present it should be
                                  considered by a client. Otherwise both path and
@@ -629,7 +635,8 @@ class InfoExtractor(object):
         if hasattr(ssl, 'CertificateError'):
             exceptions.append(ssl.CertificateError)
         try:
-            return self._downloader.urlopen(url_or_request)
+            with self._downloader.metrics.timer('request'):
+                return self._downloader.urlopen(url_or_request)
         except tuple(exceptions) as err:
             if isinstance(err, compat_urllib_error.HTTPError):
                 if self.__can_accept_status_code(err, expected_status):
@@ -717,6 +724,7 @@ class InfoExtractor(object):
     def _webpage_read_content(self, urlh, url_or_request, video_id, note=None, errnote=None, fatal=True, prefix=None, encoding=None):
         content_type = urlh.headers.get('Content-Type', '')
         webpage_bytes = urlh.read()
+        self._downloader.metrics.add_bytes(urlh.geturl(), len(webpage_bytes))
         if prefix is not None:
             webpage_bytes = prefix + webpage_bytes
         if not encoding:
@@ -1647,11 +1655,6 @@ class InfoExtractor(object):
 
         formats = []
 
-        format_url = lambda u: (
-            u
-            if re.match(r'^https?://', u)
-            else compat_urlparse.urljoin(m3u8_url, u))
-
         # References:
         # 1. https://tools.ietf.org/html/draft-pantos-http-live-streaming-21
         # 2. https://github.com/ytdl-org/youtube-dl/issues/12211
@@ -1677,11 +1680,10 @@ class InfoExtractor(object):
                 'preference': preference,
             }]
 
+        playlist = M3U8MasterPlaylist(m3u8_doc, m3u8_url)
         groups = {}
-        last_stream_inf = {}
 
-        def extract_media(x_media_line):
-            media = parse_m3u8_attributes(x_media_line)
+        def extract_media(media):
             # As per [1, 4.3.4.1] TYPE, GROUP-ID and NAME are REQUIRED
             media_type, group_id, name = media.get('TYPE'), media.get('GROUP-ID'), media.get('NAME')
             if not (media_type and group_id and name):
@@ -1697,7 +1699,7 @@ class InfoExtractor(object):
                         format_id.append(v)
                 f = {
                     'format_id': '-'.join(format_id),
-                    'url': format_url(media_url),
+                    'url': resolve_m3u8_url(media_url, m3u8_url),
                     'manifest_url': m3u8_url,
                     'language': media.get('LANGUAGE'),
                     'ext': ext,
@@ -1708,17 +1710,17 @@ class InfoExtractor(object):
                     f['vcodec'] = 'none'
                 formats.append(f)
 
-        def build_stream_name():
+        def build_stream_name(stream_inf):
             # Despite specification does not mention NAME attribute for
             # EXT-X-STREAM-INF tag it still sometimes may be present (see [1]
             # or vidio test in TestInfoExtractor.test_parse_m3u8_formats)
             # 1. http://www.vidio.com/watch/165683-dj_ambred-booyah-live-2015
-            stream_name = last_stream_inf.get('NAME')
+            stream_name = stream_inf.get('NAME')
             if stream_name:
                 return stream_name
             # If there is no NAME in EXT-X-STREAM-INF it will be obtained
             # from corresponding rendition group
-            stream_group_id = last_stream_inf.get('VIDEO')
+            stream_group_id = stream_inf.get('VIDEO')
             if not stream_group_id:
                 return
             stream_group = groups.get(stream_group_id)
@@ -1727,91 +1729,82 @@ class InfoExtractor(object):
             rendition = stream_group[0]
             return rendition.get('NAME') or stream_group_id
 
-        # parse EXT-X-MEDIA tags before EXT-X-STREAM-INF in order to have the
+        # extract EXT-X-MEDIA tags before EXT-X-STREAM-INF in order to have the
         # chance to detect video only formats when EXT-X-STREAM-INF tags
         # precede EXT-X-MEDIA tags in HLS manifest such as [3].
-        for line in m3u8_doc.splitlines():
-            if line.startswith('#EXT-X-MEDIA:'):
-                extract_media(line)
-
-        for line in m3u8_doc.splitlines():
-            if line.startswith('#EXT-X-STREAM-INF:'):
-                last_stream_inf = parse_m3u8_attributes(line)
-            elif line.startswith('#') or not line.strip():
-                continue
-            else:
-                tbr = float_or_none(
-                    last_stream_inf.get('AVERAGE-BANDWIDTH')
-                    or last_stream_inf.get('BANDWIDTH'), scale=1000)
-                format_id = []
-                if m3u8_id:
-                    format_id.append(m3u8_id)
-                stream_name = build_stream_name()
-                # Bandwidth of live streams may differ over time thus making
-                # format_id unpredictable. So it's better to keep provided
-                # format_id intact.
-                if not live:
-                    format_id.append(stream_name if stream_name else '%d' % (tbr if tbr else len(formats)))
-                manifest_url = format_url(line.strip())
-                f = {
-                    'format_id': '-'.join(format_id),
-                    'url': manifest_url,
-                    'manifest_url': m3u8_url,
-                    'tbr': tbr,
-                    'ext': ext,
-                    'fps': float_or_none(last_stream_inf.get('FRAME-RATE')),
-                    'protocol': entry_protocol,
-                    'preference': preference,
-                }
-                resolution = last_stream_inf.get('RESOLUTION')
-                if resolution:
-                    mobj = re.search(r'(?P<width>\d+)[xX](?P<height>\d+)', resolution)
-                    if mobj:
-                        f['width'] = int(mobj.group('width'))
-                        f['height'] = int(mobj.group('height'))
-                # Unified Streaming Platform
-                mobj = re.search(
-                    r'audio.*?(?:%3D|=)(\d+)(?:-video.*?(?:%3D|=)(\d+))?', f['url'])
+        for media in playlist.media:
+            extract_media(media)
+
+        for stream_inf, manifest_url in playlist.variants:
+            tbr = float_or_none(
+                stream_inf.get('AVERAGE-BANDWIDTH')
+                or stream_inf.get('BANDWIDTH'), scale=1000)
+            format_id = []
+            if m3u8_id:
+                format_id.append(m3u8_id)
+            stream_name = build_stream_name(stream_inf)
+            # Bandwidth of live streams may differ over time thus making
+            # format_id unpredictable. So it's better to keep provided
+            # format_id intact.
+            if not live:
+                format_id.append(stream_name if stream_name else '%d' % (tbr if tbr else len(formats)))
+            f = {
+                'format_id': '-'.join(format_id),
+                'url': manifest_url,
+                'manifest_url': m3u8_url,
+                'tbr': tbr,
+                'ext': ext,
+                'fps': float_or_none(stream_inf.get('FRAME-RATE')),
+                'protocol': entry_protocol,
+                'preference': preference,
+            }
+            resolution = stream_inf.get('RESOLUTION')
+            if resolution:
+                mobj = re.search(r'(?P<width>\d+)[xX](?P<height>\d+)', resolution)
                 if mobj:
-                    abr, vbr = mobj.groups()
-                    abr, vbr = float_or_none(abr, 1000), float_or_none(vbr, 1000)
-                    f.update({
-                        'vbr': vbr,
-                        'abr': abr,
-                    })
-                codecs = parse_codecs(last_stream_inf.get('CODECS'))
-                f.update(codecs)
-                audio_group_id = last_stream_inf.get('AUDIO')
-                # As per [1, 4.3.4.1.1] any EXT-X-STREAM-INF tag which
-                # references a rendition group MUST have a CODECS attribute.
-                # However, this is not always respected, for example, [2]
-                # contains EXT-X-STREAM-INF tag which references AUDIO
-                # rendition group but does not have CODECS and despite
-                # referencing an audio group it represents a complete
-                # (with audio and video) format. So, for such cases we will
-                # ignore references to rendition groups and treat them
-                # as complete formats.
-                if audio_group_id and codecs and f.get('vcodec') != 'none':
-                    audio_group = groups.get(audio_group_id)
-                    if audio_group and audio_group[0].get('URI'):
-                        # TODO: update acodec for audio only formats with
-                        # the same GROUP-ID
-                        f['acodec'] = 'none'
-                formats.append(f)
-
-                # for DailyMotion
-                progressive_uri = last_stream_inf.get('PROGRESSIVE-URI')
-                if progressive_uri:
-                    http_f = f.copy()
-                    del http_f['manifest_url']
-                    http_f.update({
-                        'format_id': f['format_id'].replace('hls-', 'http-'),
-                        'protocol': 'http',
-                        'url': progressive_uri,
-                    })
-                    formats.append(http_f)
-
-                last_stream_inf = {}
+                    f['width'] = int(mobj.group('width'))
+                    f['height'] = int(mobj.group('height'))
+            # Unified Streaming Platform
+            mobj = re.search(
+                r'audio.*?(?:%3D|=)(\d+)(?:-video.*?(?:%3D|=)(\d+))?', f['url'])
+            if mobj:
+                abr, vbr = mobj.groups()
+                abr, vbr = float_or_none(abr, 1000), float_or_none(vbr, 1000)
+                f.update({
+                    'vbr': vbr,
+                    'abr': abr,
+                })
+            codecs = parse_codecs(stream_inf.get('CODECS'))
+            f.update(codecs)
+            audio_group_id = stream_inf.get('AUDIO')
+            # As per [1, 4.3.4.1.1] any EXT-X-STREAM-INF tag which
+            # references a rendition group MUST have a CODECS attribute.
+            # However, this is not always respected, for example, [2]
+            # contains EXT-X-STREAM-INF tag which references AUDIO
+            # rendition group but does not have CODECS and despite
+            # referencing an audio group it represents a complete
+            # (with audio and video) format. So, for such cases we will
+            # ignore references to rendition groups and treat them
+            # as complete formats.
+            if audio_group_id and codecs and f.get('vcodec') != 'none':
+                audio_group = groups.get(audio_group_id)
+                if audio_group and audio_group[0].get('URI'):
+                    # TODO: update acodec for audio only formats with
+                    # the same GROUP-ID
+                    f['acodec'] = 'none'
+            formats.append(f)
+
+            # for DailyMotion
+            progressive_uri = stream_inf.get('PROGRESSIVE-URI')
+            if progressive_uri:
+                http_f = f.copy()
+                del http_f['manifest_url']
+                http_f.update({
+                    'format_id': f['format_id'].replace('hls-', 'http-'),
+                    'protocol': 'http',
+                    'url': progressive_uri,
+                })
+                formats.append(http_f)
         return formats
 
     @staticmethod
@@ -2253,49 +2246,35 @@ class InfoExtractor(object):
                             # As per [1, 5.3.9.4.4, Table 16, page 55] $Number$ and $Time$
                             # can't be used at the same time
                             if '%(Number' in media_template and 's' not in representation_ms_info:
-                                segment_duration = None
+                                segment_d = None
                                 if 'total_number' not in representation_ms_info and 'segment_duration' in representation_ms_info:
-                                    segment_duration = float_or_none(representation_ms_info['segment_duration'], representation_ms_info['timescale'])
+                                    segment_d = representation_ms_info['segment_duration']
+                                    segment_duration = float_or_none(segment_d, representation_ms_info['timescale'])
                                     representation_ms_info['total_number'] = int(math.ceil(float(period_duration) / segment_duration))
-                                representation_ms_info['fragments'] = [{
-                                    media_location_key: media_template % {
-                                        'Number': segment_number,
-                                        'Bandwidth': bandwidth,
-                                    },
-                                    'duration': segment_duration,
-                                } for segment_number in range(
-                                    representation_ms_info['start_number'],
-                                    representation_ms_info['total_number'] + representation_ms_info['start_number'])]
+                                segments = [(
+                                    0, segment_d, representation_ms_info['total_number'],
+                                    representation_ms_info['start_number'])]
                             else:
                                 # $Number*$ or $Time$ in media template with S list available
                                 # Example $Number*$: http://www.svtplay.se/klipp/9023742/stopptid-om-bjorn-borg
                                 # Example $Time$: https://play.arkena.com/embed/avp/v2/player/media/b41dda37-d8e7-4d3f-b1b5-9a9db578bdfe/1/129411
-                                representation_ms_info['fragments'] = []
+                                segments = []
                                 segment_time = 0
-                                segment_d = None
                                 segment_number = representation_ms_info['start_number']
-
-                                def add_segment_url():
-                                    segment_url = media_template % {
-                                        'Time': segment_time,
-                                        'Bandwidth': bandwidth,
-                                        'Number': segment_number,
-                                    }
-                                    representation_ms_info['fragments'].append({
-                                        media_location_key: segment_url,
-                                        'duration': float_or_none(segment_d, representation_ms_info['timescale']),
-                                    })
-
-                                for num, s in enumerate(representation_ms_info['s']):
+                                for s in representation_ms_info['s']:
                                     segment_time = s.get('t') or segment_time
-                                    segment_d = s['d']
-                                    add_segment_url()
-                                    segment_number += 1
-                                    for r in range(s.get('r', 0)):
-                                        segment_time += segment_d
-                                        add_segment_url()
-                                        segment_number += 1
-                                    segment_time += segment_d
+                                    segment_count = 1 + max(s.get('r', 0), 0)
+                                    segments.append((segment_time, s['d'], segment_count, segment_number))
+                                    segment_time += segment_count * s['d']
+                                    segment_number += segment_count
+                            # Fragments are only built when they are accessed,
+                            # long streams have hundreds of thousands of them
+                            initialization_url = representation_ms_info.get('initialization_url')
+                            representation_ms_info['fragments'] = TemplatedFragments(
+                                media_template, segments, bandwidth=bandwidth,
+                                timescale=representation_ms_info['timescale'],
+                                location_key=media_location_key,
+                                initialization={location_key(initialization_url): initialization_url} if initialization_url else None)
                         elif 'segment_urls' in representation_ms_info and 's' in representation_ms_info:
                             # No media template
                             # Example: https://www.youtube.com/watch?v=iXZV5uAYMJI
@@ -2338,15 +2317,16 @@ class InfoExtractor(object):
                                 # NB: mpd_url may be empty when MPD manifest is parsed from a string
                                 'url': mpd_url or base_url,
                                 'fragment_base_url': base_url,
-                                'fragments': [],
+                                'fragments': representation_ms_info['fragments'],
                                 'protocol': 'http_dash_segments',
                             })
                             if 'initialization_url' in representation_ms_info:
                                 initialization_url = representation_ms_info['initialization_url']
                                 if not f.get('url'):
                                     f['url'] = initialization_url
-                                f['fragments'].append({location_key(initialization_url): initialization_url})
-                            f['fragments'].extend(representation_ms_info['fragments'])
+                                # Templated fragments include it already
+                                if not isinstance(f['fragments'], TemplatedFragments):
+                                    f['fragments'] = [{location_key(initialization_url): initialization_url}] + f['fragments']
                         else:
                             # Assuming direct URL to unfragmented media.
                             f['url'] = base_url
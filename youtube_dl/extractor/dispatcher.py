@@ -0,0 +1,303 @@
+from __future__ import unicode_literals
+
+import re
+
+from ..compat import (
+    compat_chr,
+    compat_sre_parse as sre_parse,
+    compat_str,
+)
+
+
+# Maximum number of alternative strings tracked for a part of a _VALID_URL
+# before giving up on it
+_MAX_ALTERNATIVES = 32
+
+# URLs and _VALID_URL literals are split into tokens on these characters
+_TOKEN_SEP_RE = re.compile(r'[^0-9a-z]+')
+_TOKEN_CHARS = frozenset('0123456789abcdefghijklmnopqrstuvwxyz')
+
+# Virtual token separator standing for the beginning and the end of the URL
+_BOUNDARY = ' '
+
+_ANCHORS = (
+    sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING,
+    sre_parse.AT_END, sre_parse.AT_END_STRING)
+
+_REPEATS = tuple(getattr(sre_parse, op) for op in (
+    'MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT') if hasattr(sre_parse, op))
+
+
+def _is_sep(c):
+    return c.lower() not in _TOKEN_CHARS
+
+
+def _is_sep_set(items):
+    """Whether all the characters of a character class are token separators"""
+    for op, av in items:
+        if op == sre_parse.LITERAL:
+            if not _is_sep(compat_chr(av)):
+                return False
+        elif op == sre_parse.RANGE:
+            lo, hi = av
+            if any(lo <= ord(last) and ord(first) <= hi
+                   for first, last in ('09', 'AZ', 'az')):
+                return False
+        elif not (op == sre_parse.CATEGORY and av == sre_parse.CATEGORY_SPACE):
+            return False
+    return True
+
+
+class _Match(object):
+    """
+    What is known about the strings a part of a _VALID_URL matches.
+
+    exact:      set of all the strings it matches, None if unknown
+    required:   list of sets of strings, each match contains at least one
+                of the strings of every set
+    first_sep:  whether the non-empty matches start with a token separator
+    last_sep:   whether the non-empty matches end with a token separator
+    empty:      whether it may match the empty string
+
+    Token separators known to surround the strings are marked with _BOUNDARY.
+    """
+
+    def __init__(self, exact=None, required=None, first_sep=False,
+                 last_sep=False, empty=True):
+        self.exact = exact
+        self.required = required or []
+        self.first_sep = first_sep
+        self.last_sep = last_sep
+        self.empty = empty
+
+
+def _tokens(s):
+    """Tokens of s with a separator on each side"""
+    return [t for t in _TOKEN_SEP_RE.split(s)[1:-1] if t]
+
+
+def _usable(strings):
+    return bool(strings) and all(_tokens(s) for s in strings)
+
+
+def _analyze_item(op, av, prev_sep):
+    if op == sre_parse.LITERAL:
+        c = compat_chr(av).lower()
+        sep = _is_sep(c)
+        return _Match(exact=set([c]), first_sep=sep, last_sep=sep, empty=False)
+    if op == sre_parse.IN:
+        sep = _is_sep_set(av)
+        return _Match(first_sep=sep, last_sep=sep, empty=False)
+    if op == sre_parse.AT:
+        return _Match(
+            exact=set([_BOUNDARY if av in _ANCHORS else '']),
+            first_sep=True, last_sep=True)
+    if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return _Match(exact=set(['']), first_sep=True, last_sep=True)
+    if op == sre_parse.SUBPATTERN:
+        # (group, pattern) on Python < 3.6, (group, add_flags, del_flags, pattern) since
+        return _analyze(av[-1], prev_sep)
+    if op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+        return _analyze(av, prev_sep)
+    if op == sre_parse.BRANCH:
+        return _analyze_branch(av[1], prev_sep)
+    if op in _REPEATS:
+        min_count, max_count, pattern = av
+        # Only the first repetition is known to follow the previous item
+        m = _analyze(pattern, prev_sep if max_count == 1 else False)
+        if min_count == max_count == 1:
+            return m
+        res = _Match(
+            first_sep=m.first_sep, last_sep=m.last_sep,
+            empty=m.empty or min_count == 0)
+        if min_count == 0 and max_count == 1:
+            if m.exact is not None:
+                res.exact = m.exact | set([''])
+        elif min_count > 0:
+            res.required = list(m.required)
+            if m.exact is not None:
+                res.required.append(m.exact)
+        return res
+    return _Match()
+
+
+def _analyze_branch(alternatives, prev_sep):
+    matches = [_analyze(a, prev_sep) for a in alternatives]
+    res = _Match(
+        first_sep=all(m.first_sep for m in matches),
+        last_sep=all(m.last_sep for m in matches),
+        empty=any(m.empty for m in matches))
+    exact = set()
+    for m in matches:
+        if m.exact is None:
+            break
+        exact.update(m.exact)
+    else:
+        if len(exact) <= _MAX_ALTERNATIVES:
+            res.exact = exact
+            return res
+    # Every match contains one of the strings required by its alternative
+    required = set()
+    for m in matches:
+        candidates = [s for s in m.required + [m.exact] if s is not None and _usable(s)]
+        if not candidates:
+            return res
+        required.update(min(candidates, key=len))
+    res.required = [required]
+    return res
+
+
+def _analyze(pattern, prev_sep=False):
+    """
+    Analyze a parsed regular expression, prev_sep tells whether the
+    character before its matches is a token separator.
+    """
+    res = _Match(first_sep=True)
+    # Strings matched by the current run of items with known matches, the
+    # literal characters that follow them are accumulated in tail
+    run = [_BOUNDARY if prev_sep else '']
+    tail = ''
+    known = True
+    for op, av in pattern:
+        if op == sre_parse.LITERAL:
+            c = compat_chr(av).lower()
+            prev_sep = _is_sep(c)
+            res.first_sep = res.first_sep and (not res.empty or prev_sep)
+            res.empty = False
+            tail += c
+            continue
+        m = _analyze_item(op, av, prev_sep)
+        if res.empty:
+            res.first_sep = res.first_sep and m.first_sep
+        res.empty = res.empty and m.empty
+        prev_sep = m.last_sep and (prev_sep or not m.empty)
+        if m.exact is not None and len(run) * len(m.exact) <= _MAX_ALTERNATIVES:
+            run = [a + tail + b for a in run for b in m.exact]
+            tail = ''
+            continue
+        known = False
+        if m.first_sep and not m.empty:
+            tail += _BOUNDARY
+        res.required.append(set(s + tail for s in run))
+        res.required.extend(m.required)
+        if m.exact is not None:
+            res.required.append(m.exact)
+        run = [_BOUNDARY if prev_sep else '']
+        tail = ''
+    res.last_sep = prev_sep and not res.empty
+    run = set(s + tail for s in run)
+    if known:
+        res.exact = run
+    else:
+        res.required.append(run)
+    return res
+
+
+def url_tokens(valid_url):
+    """
+    Return the lists of tokens that URLs matched by valid_url contain.
+
+    A matching URL contains all the tokens of at least one of the lists of
+    every returned item. Tokens are the lowercase alphanumeric parts of the
+    URL, see split_url.
+    """
+    if not isinstance(valid_url, compat_str):
+        return []
+    try:
+        # _VALID_URL is matched at the beginning of the URL
+        m = _analyze(sre_parse.parse(valid_url), prev_sep=True)
+    except Exception:
+        return []
+    res = []
+    for strings in m.required + ([m.exact] if m.exact is not None else []):
+        if _usable(strings):
+            res.append([_tokens(s) for s in sorted(strings)])
+    return res
+
+
+# Non ASCII characters matching ASCII letters in case insensitive patterns
+_CASE_FOLDS = {
+    '\u0130': 'i',
+    '\u0131': 'i',
+    '\u017f': 's',
+    '\u212a': 'k',
+}
+_CASE_FOLDS_RE = re.compile('[%s]' % ''.join(_CASE_FOLDS))
+
+
+def split_url(url):
+    url = _CASE_FOLDS_RE.sub(lambda m: _CASE_FOLDS[m.group(0)], url)
+    return set(_TOKEN_SEP_RE.split(url.lower()))
+
+
+def _uses_valid_url(ie):
+    """Whether ie is only suitable for the URLs its _VALID_URL matches"""
+    cls = ie if isinstance(ie, type) else type(ie)
+    for c in cls.__mro__:
+        if 'suitable' in c.__dict__:
+            # Lazy extractors use a copy of InfoExtractor.suitable
+            return c.__name__ in ('InfoExtractor', 'LazyLoadExtractor')
+    return False
+
+
+def _ie_url_tokens(ie):
+    if not _uses_valid_url(ie):
+        return []
+    # Lazy extractors come with precomputed tokens
+    tokens = getattr(ie, '_URL_TOKENS', None)
+    if tokens is None:
+        tokens = url_tokens(getattr(ie, '_VALID_URL', None))
+    return tokens
+
+
+class URLDispatcher(object):
+    """
+    Index of info extractors by the tokens of the URLs they accept.
+
+    candidates(url) returns the extractors whose suitable() may return True
+    for url, in their original order, so that the first suitable one is the
+    same as with a linear scan. Extractors that override suitable() or whose
+    _VALID_URL has no usable token are always candidates.
+    """
+
+    def __init__(self, ies):
+        self._ies = []
+        self._index = {}
+        self._unindexed = []
+        # Number of extractors each token is found in, rare tokens are
+        # preferred as keys so that few extractors are tested
+        self._counts = {}
+        ies_tokens = [(ie, _ie_url_tokens(ie)) for ie in ies]
+        for ie, tokens in ies_tokens:
+            for token in set(t for strings in tokens for ts in strings for t in ts):
+                self._counts[token] = self._counts.get(token, 0) + 1
+        for ie, tokens in ies_tokens:
+            self._add(ie, tokens)
+
+    def _add(self, ie, tokens):
+        pos = len(self._ies)
+        self._ies.append(ie)
+        if not tokens:
+            self._unindexed.append(pos)
+            return
+
+        def count(t):
+            return self._counts.get(t, 0)
+
+        keys = min(
+            (set(min(ts, key=lambda t: (count(t), t)) for ts in strings)
+             for strings in tokens),
+            key=lambda keys: (sum(count(t) for t in keys), sorted(keys)))
+        for key in keys:
+            self._index.setdefault(key, []).append(pos)
+
+    def add(self, ie):
+        """Add an info extractor after the known ones."""
+        self._add(ie, _ie_url_tokens(ie))
+
+    def candidates(self, url):
+        """Return the info extractors that may be suitable for url."""
+        positions = set(self._unindexed)
+        for token in split_url(url):
+            positions.update(self._index.get(token, ()))
+        return [self._ies[pos] for pos in sorted(positions)]
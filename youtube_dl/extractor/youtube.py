@@ -1224,16 +1224,17 @@ class YoutubeIE(YoutubeBaseInfoExtractor):
             player_url = compat_urlparse.urljoin(
                 'https://www.youtube.com', player_url)
         try:
-            player_id = (player_url, self._signature_cache_id(s))
-            if player_id not in self._player_cache:
-                func = self._extract_signature_function(
-                    video_id, player_url, s
-                )
-                self._player_cache[player_id] = func
-            func = self._player_cache[player_id]
-            if self._downloader.params.get('youtube_print_sig_code'):
-                self._print_sig_code(func, s)
-            return func(s)
+            with self._downloader.metrics.timer('signature'):
+                player_id = (player_url, self._signature_cache_id(s))
+                if player_id not in self._player_cache:
+                    func = self._extract_signature_function(
+                        video_id, player_url, s
+                    )
+                    self._player_cache[player_id] = func
+                func = self._player_cache[player_id]
+                if self._downloader.params.get('youtube_print_sig_code'):
+                    self._print_sig_code(func, s)
+                return func(s)
         except Exception as e:
             tb = traceback.format_exc()
             raise ExtractorError(
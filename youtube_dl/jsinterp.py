@@ -1,12 +1,14 @@
 from __future__ import unicode_literals
 
-import json
 import operator
 import re
 
+from .compat import (
+    compat_chr,
+    compat_str,
+)
 from .utils import (
     ExtractorError,
-    remove_quotes,
 )
 
 _OPERATORS = [
@@ -26,138 +28,463 @@ _ASSIGN_OPERATORS.append(('=', lambda cur, right: right))
 
 _NAME_RE = r'[a-zA-Z_$][a-zA-Z_$0-9]*'
 
+# Binary operators by increasing precedence
+_PRECEDENCE = [('|', ), ('^', ), ('&', ), ('>>', '<<'), ('-', '+'), ('%', '/', '*')]
+_BINARY_OPERATORS = dict(_OPERATORS)
+_ASSIGN_OPERATORS_DICT = dict(_ASSIGN_OPERATORS)
+
+_UNARY_OPERATORS = {
+    '-': operator.neg,
+    '+': lambda v: v,
+    '!': operator.not_,
+    '~': operator.invert,
+}
+
+_TOKEN_RE = re.compile(r'''(?sx)
+    (?P<space>\s+|//[^\n]*|/\*.*?\*/)|
+    (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)|
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|
+    (?P<name>%s)|
+    (?P<punct>>>=|<<=|[-+*/%%&|^]=|>>|<<|[-+*/%%&|^=!~;,.()[\]{}:])
+''' % _NAME_RE)
+
+_CONSTANTS = {
+    'true': True,
+    'false': False,
+    'null': None,
+    'undefined': None,
+}
+
+_STRING_ESCAPES = {
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'v': '\v',
+    '0': '\0',
+}
+_STRING_ESCAPE_RE = re.compile(r'(?s)\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|.)')
+
+
+def _unescape_string(s):
+    def repl(m):
+        escape = m.group(1)
+        if escape[0] in 'xu' and len(escape) > 1:
+            return compat_chr(int(escape[1:], 16))
+        return _STRING_ESCAPES.get(escape, escape)
+    return _STRING_ESCAPE_RE.sub(repl, s[1:-1])
+
+
+def _index(key):
+    # Numbers resulting from a division are floats
+    if isinstance(key, float) and key.is_integer():
+        return int(key)
+    return key
+
+
+class _JSParser(object):
+    """
+    Parser of a subset of JavaScript, building a tree of tuples:
+
+    ('const', value)
+    ('name', name)
+    ('array', elements)
+    ('object', [(key, value), ...])
+    ('function', argnames, statements)
+    ('member', obj, key)
+    ('call', callee, args)
+    ('unary', op, operand)
+    ('binary', op, left, right)
+    ('assign', op, target, value)
+    ('seq', expressions)
+
+    Statements are ('expr', expression), ('return', expression or None) and
+    ('var', [(name, expression or None), ...]).
+    """
+
+    def __init__(self, code, pos=0):
+        self.code = code
+        self.pos = pos
+        self._next()
+
+    def _error(self, msg):
+        raise ExtractorError('%s in JS code at %r' % (
+            msg, self.code[self.tok_start:self.tok_start + 50]))
+
+    def _next(self):
+        while True:
+            self.tok_start = self.pos
+            if self.pos >= len(self.code):
+                self.tok = ('end', None)
+                return
+            m = _TOKEN_RE.match(self.code, self.pos)
+            if m is None:
+                self._error('Unexpected character')
+            self.pos = m.end()
+            kind = m.lastgroup
+            if kind != 'space':
+                break
+        value = m.group(kind)
+        if kind == 'number':
+            if value[:2] in ('0x', '0X'):
+                value = int(value, 16)
+            elif re.match(r'\d+$', value):
+                value = int(value)
+            else:
+                value = float(value)
+        elif kind == 'string':
+            value = _unescape_string(value)
+        self.tok = (kind, value)
+
+    def _accept(self, punct):
+        if self.tok == ('punct', punct):
+            self._next()
+            return True
+        return False
+
+    def _expect(self, punct):
+        if not self._accept(punct):
+            self._error('Expected %r' % punct)
+
+    def _expect_name(self):
+        kind, value = self.tok
+        if kind != 'name':
+            self._error('Expected a name')
+        self._next()
+        return value
+
+    def parse_statements(self, end=None):
+        """
+        Parse statements up to the end of the code or the end punctuator,
+        which is left as the current token
+        """
+        statements = []
+        while True:
+            if self.tok == (('end', None) if end is None else ('punct', end)):
+                return statements
+            if self.tok[0] == 'end':
+                self._error('Unexpected end')
+            if self._accept(';'):
+                continue
+            statements.append(self.parse_statement())
+            if not self._accept(';') and self.tok[0] != 'end' and self.tok != ('punct', '}'):
+                self._error('Expected ";"')
+
+    def parse_statement(self):
+        kind, value = self.tok
+        if kind == 'name' and value == 'var':
+            self._next()
+            declarations = []
+            while True:
+                name = self._expect_name()
+                init = self.parse_assignment() if self._accept('=') else None
+                declarations.append((name, init))
+                if not self._accept(','):
+                    return ('var', declarations)
+        if kind == 'name' and value == 'return':
+            self._next()
+            if self.tok[0] == 'end' or self.tok in (('punct', ';'), ('punct', '}')):
+                return ('return', None)
+            return ('return', self.parse_expression())
+        return ('expr', self.parse_expression())
+
+    def parse_expression(self):
+        expressions = [self.parse_assignment()]
+        while self._accept(','):
+            expressions.append(self.parse_assignment())
+        return expressions[0] if len(expressions) == 1 else ('seq', expressions)
+
+    def parse_assignment(self):
+        target = self.parse_binary(0)
+        kind, value = self.tok
+        if kind == 'punct' and value in _ASSIGN_OPERATORS_DICT:
+            if target[0] not in ('name', 'member'):
+                self._error('Invalid assignment target')
+            self._next()
+            return ('assign', value, target, self.parse_assignment())
+        return target
+
+    def parse_binary(self, level):
+        if level == len(_PRECEDENCE):
+            return self.parse_unary()
+        left = self.parse_binary(level + 1)
+        while self.tok[0] == 'punct' and self.tok[1] in _PRECEDENCE[level]:
+            op = self.tok[1]
+            self._next()
+            left = ('binary', op, left, self.parse_binary(level + 1))
+        return left
+
+    def parse_unary(self):
+        kind, value = self.tok
+        if kind == 'punct' and value in _UNARY_OPERATORS:
+            self._next()
+            operand = self.parse_unary()
+            if value == '-' and operand[0] == 'const' and isinstance(operand[1], (int, float)):
+                return ('const', -operand[1])
+            return ('unary', value, operand)
+        return self.parse_postfix()
+
+    def parse_postfix(self):
+        expr = self.parse_primary()
+        while True:
+            if self._accept('.'):
+                expr = ('member', expr, ('const', self._expect_name()))
+            elif self._accept('['):
+                expr = ('member', expr, self.parse_expression())
+                self._expect(']')
+            elif self._accept('('):
+                expr = ('call', expr, self._parse_list(')'))
+            else:
+                return expr
+
+    def _parse_list(self, end):
+        items = []
+        while not self._accept(end):
+            items.append(self.parse_assignment())
+            if not self._accept(','):
+                self._expect(end)
+                break
+        return items
+
+    def parse_primary(self):
+        kind, value = self.tok
+        if kind in ('number', 'string'):
+            self._next()
+            return ('const', value)
+        if kind == 'name':
+            self._next()
+            if value in _CONSTANTS:
+                return ('const', _CONSTANTS[value])
+            if value == 'function':
+                return self.parse_function()
+            return ('name', value)
+        if self._accept('('):
+            expr = self.parse_expression()
+            self._expect(')')
+            return expr
+        if self._accept('['):
+            return ('array', self._parse_list(']'))
+        if self._accept('{'):
+            return self.parse_object()
+        self._error('Unexpected token')
+
+    def parse_function(self):
+        if self.tok[0] == 'name':
+            self._next()  # Function expressions may be named
+        self._expect('(')
+        argnames = []
+        while not self._accept(')'):
+            argnames.append(self._expect_name())
+            if not self._accept(','):
+                self._expect(')')
+                break
+        self._expect('{')
+        statements = self.parse_statements('}')
+        self._next()
+        return ('function', argnames, statements)
+
+    def parse_object(self):
+        """Parse an object literal, after its opening brace"""
+        fields = []
+        while not self._accept('}'):
+            kind, key = self.tok
+            if kind not in ('name', 'string', 'number'):
+                self._error('Expected a property name')
+            self._next()
+            self._expect(':')
+            fields.append((compat_str(key), self.parse_assignment()))
+            if not self._accept(','):
+                self._expect('}')
+                break
+        return ('object', fields)
+
 
 class JSInterpreter(object):
+    """
+    Interpreter of the JavaScript code used by signature functions.
+
+    Code is parsed once and compiled into a tree of closures taking the
+    dict of local variables.
+    """
+
     def __init__(self, code, objects=None):
         if objects is None:
             objects = {}
         self.code = code
         self._functions = {}
         self._objects = objects
+        # Compiled statements and expressions by source
+        self._compiled = {}
 
     def interpret_statement(self, stmt, local_vars, allow_recursion=100):
-        if allow_recursion < 0:
-            raise ExtractorError('Recursion limit reached')
-
-        should_abort = False
-        stmt = stmt.lstrip()
-        stmt_m = re.match(r'var\s', stmt)
-        if stmt_m:
-            expr = stmt[len(stmt_m.group(0)):]
-        else:
-            return_m = re.match(r'return(?:\s+|$)', stmt)
-            if return_m:
-                expr = stmt[len(return_m.group(0)):]
-                should_abort = True
+        key = ('statement', stmt)
+        if key not in self._compiled:
+            parser = _JSParser(stmt)
+            statement = parser.parse_statement() if parser.tok[0] != 'end' else ('return', None)
+            parser._accept(';')
+            if parser.tok[0] != 'end':
+                parser._error('Unexpected token')
+            self._compiled[key] = (statement[0] == 'return', self._compile_statement(statement))
+        should_abort, compiled = self._compiled[key]
+        return compiled(local_vars), should_abort
+
+    def interpret_expression(self, expr, local_vars, allow_recursion):
+        key = ('expression', expr)
+        if key not in self._compiled:
+            parser = _JSParser(expr)
+            if parser.tok[0] == 'end':  # Empty expression
+                self._compiled[key] = lambda local_vars: None
             else:
-                # Try interpreting it as an expression
-                expr = stmt
+                expression = parser.parse_expression()
+                if parser.tok[0] != 'end':
+                    parser._error('Unexpected token')
+                self._compiled[key] = self._compile(expression)
+        return self._compiled[key](local_vars)
+
+    def _compile_statement(self, statement):
+        kind = statement[0]
+        if kind == 'var':
+            declarations = [
+                (name, None if init is None else self._compile(init))
+                for name, init in statement[1]]
+
+            def declare(local_vars):
+                for name, init in declarations:
+                    if init is not None:
+                        local_vars[name] = init(local_vars)
+                    else:
+                        local_vars.setdefault(name, None)
+            return declare
+        if statement[1] is None:
+            return lambda local_vars: None
+        return self._compile(statement[1])
+
+    def _compile_object_ref(self, node):
+        """Compile an expression whose value has members"""
+        if node[0] != 'name':
+            return self._compile(node)
+        name = node[1]
+
+        def get_obj(local_vars):
+            if name in local_vars:
+                return local_vars[name]
+            if name not in self._objects:
+                self._objects[name] = self.extract_object(name)
+            return self._objects[name]
+        return get_obj
+
+    def _compile(self, node):
+        kind = node[0]
+
+        if kind == 'const':
+            value = node[1]
+            return lambda local_vars: value
+
+        if kind == 'name':
+            return self._compile_object_ref(node)
+
+        if kind == 'array':
+            elements = [self._compile(e) for e in node[1]]
+            return lambda local_vars: [e(local_vars) for e in elements]
+
+        if kind == 'object':
+            fields = [(key, self._compile(value)) for key, value in node[1]]
+            return lambda local_vars: dict(
+                (key, value(local_vars)) for key, value in fields)
+
+        if kind == 'function':
+            func = self._build_function(node[1], node[2])
+            return lambda local_vars: func
+
+        if kind == 'member':
+            get_obj = self._compile_object_ref(node[1])
+            get_key = self._compile(node[2])
+
+            def member(local_vars):
+                obj = get_obj(local_vars)
+                key = _index(get_key(local_vars))
+                if key == 'length' and not isinstance(obj, dict):
+                    return len(obj)
+                return obj[key]
+            return member
 
-        v = self.interpret_expression(expr, local_vars, allow_recursion)
-        return v, should_abort
+        if kind == 'call':
+            return self._compile_call(node[1], [self._compile(a) for a in node[2]])
 
-    def interpret_expression(self, expr, local_vars, allow_recursion):
-        expr = expr.strip()
-        if expr == '':  # Empty expression
-            return None
+        if kind == 'unary':
+            opfunc = _UNARY_OPERATORS[node[1]]
+            operand = self._compile(node[2])
+            return lambda local_vars: opfunc(operand(local_vars))
 
-        if expr.startswith('('):
-            parens_count = 0
-            for m in re.finditer(r'[()]', expr):
-                if m.group(0) == '(':
-                    parens_count += 1
-                else:
-                    parens_count -= 1
-                    if parens_count == 0:
-                        sub_expr = expr[1:m.start()]
-                        sub_result = self.interpret_expression(
-                            sub_expr, local_vars, allow_recursion)
-                        remaining_expr = expr[m.end():].strip()
-                        if not remaining_expr:
-                            return sub_result
-                        else:
-                            expr = json.dumps(sub_result) + remaining_expr
-                        break
-            else:
-                raise ExtractorError('Premature end of parens in %r' % expr)
-
-        for op, opfunc in _ASSIGN_OPERATORS:
-            m = re.match(r'''(?x)
-                (?P<out>%s)(?:\[(?P<index>[^\]]+?)\])?
-                \s*%s
-                (?P<expr>.*)$''' % (_NAME_RE, re.escape(op)), expr)
-            if not m:
-                continue
-            right_val = self.interpret_expression(
-                m.group('expr'), local_vars, allow_recursion - 1)
-
-            if m.groupdict().get('index'):
-                lvar = local_vars[m.group('out')]
-                idx = self.interpret_expression(
-                    m.group('index'), local_vars, allow_recursion)
-                assert isinstance(idx, int)
-                cur = lvar[idx]
-                val = opfunc(cur, right_val)
-                lvar[idx] = val
-                return val
-            else:
-                cur = local_vars.get(m.group('out'))
-                val = opfunc(cur, right_val)
-                local_vars[m.group('out')] = val
-                return val
+        if kind == 'binary':
+            opfunc = _BINARY_OPERATORS[node[1]]
+            left = self._compile(node[2])
+            right = self._compile(node[3])
+            return lambda local_vars: opfunc(left(local_vars), right(local_vars))
 
-        if expr.isdigit():
-            return int(expr)
-
-        var_m = re.match(
-            r'(?!if|return|true|false)(?P<name>%s)$' % _NAME_RE,
-            expr)
-        if var_m:
-            return local_vars[var_m.group('name')]
-
-        try:
-            return json.loads(expr)
-        except ValueError:
-            pass
-
-        m = re.match(
-            r'(?P<in>%s)\[(?P<idx>.+)\]$' % _NAME_RE, expr)
-        if m:
-            val = local_vars[m.group('in')]
-            idx = self.interpret_expression(
-                m.group('idx'), local_vars, allow_recursion - 1)
-            return val[idx]
-
-        m = re.match(
-            r'(?P<var>%s)(?:\.(?P<member>[^(]+)|\[(?P<member2>[^]]+)\])\s*(?:\(+(?P<args>[^()]*)\))?$' % _NAME_RE,
-            expr)
-        if m:
-            variable = m.group('var')
-            member = remove_quotes(m.group('member') or m.group('member2'))
-            arg_str = m.group('args')
-
-            if variable in local_vars:
-                obj = local_vars[variable]
-            else:
-                if variable not in self._objects:
-                    self._objects[variable] = self.extract_object(variable)
-                obj = self._objects[variable]
+        if kind == 'assign':
+            return self._compile_assignment(node[1], node[2], self._compile(node[3]))
 
-            if arg_str is None:
-                # Member access
-                if member == 'length':
-                    return len(obj)
-                return obj[member]
+        if kind == 'seq':
+            expressions = [self._compile(e) for e in node[1]]
 
-            assert expr.endswith(')')
-            # Function call
-            if arg_str == '':
-                argvals = tuple()
-            else:
-                argvals = tuple([
-                    self.interpret_expression(v, local_vars, allow_recursion)
-                    for v in arg_str.split(',')])
+            def seq(local_vars):
+                for e in expressions:
+                    res = e(local_vars)
+                return res
+            return seq
+
+        raise ExtractorError('Unsupported JS expression %r' % (node, ))
 
+    def _compile_assignment(self, op, target, value):
+        opfunc = _ASSIGN_OPERATORS_DICT[op]
+        if target[0] == 'name':
+            name = target[1]
+
+            def assign_var(local_vars):
+                right_val = value(local_vars)
+                val = opfunc(local_vars.get(name), right_val)
+                local_vars[name] = val
+                return val
+            return assign_var
+
+        get_obj = self._compile_object_ref(target[1])
+        get_key = self._compile(target[2])
+
+        def assign_member(local_vars):
+            right_val = value(local_vars)
+            obj = get_obj(local_vars)
+            key = _index(get_key(local_vars))
+            val = right_val if op == '=' else opfunc(obj[key], right_val)
+            obj[key] = val
+            return val
+        return assign_member
+
+    def _compile_call(self, callee, args):
+        if callee[0] == 'name':
+            fname = callee[1]
+
+            def call_function(local_vars):
+                argvals = tuple(a(local_vars) for a in args)
+                if fname not in self._functions:
+                    self._functions[fname] = self.extract_function(fname)
+                return self._functions[fname](argvals)
+            return call_function
+
+        if callee[0] != 'member':
+            get_func = self._compile(callee)
+            return lambda local_vars: get_func(local_vars)(tuple(a(local_vars) for a in args))
+
+        get_obj = self._compile_object_ref(callee[1])
+        get_member = self._compile(callee[2])
+
+        def call_method(local_vars):
+            obj = get_obj(local_vars)
+            member = get_member(local_vars)
+            argvals = tuple(a(local_vars) for a in args)
+            if isinstance(obj, dict):
+                return obj[member](argvals)
             if member == 'split':
                 assert argvals == ('',)
                 return list(obj)
@@ -178,85 +505,52 @@ class JSInterpreter(object):
                 for i in range(index, min(index + howMany, len(obj))):
                     res.append(obj.pop(index))
                 return res
+            raise ExtractorError('Unsupported JS method %r' % member)
+        return call_method
 
-            return obj[member](argvals)
+    def _build_function(self, argnames, statements):
+        compiled = [
+            (statement[0] == 'return', self._compile_statement(statement))
+            for statement in statements]
 
-        for op, opfunc in _OPERATORS:
-            m = re.match(r'(?P<x>.+?)%s(?P<y>.+)' % re.escape(op), expr)
-            if not m:
-                continue
-            x, abort = self.interpret_statement(
-                m.group('x'), local_vars, allow_recursion - 1)
-            if abort:
-                raise ExtractorError(
-                    'Premature left-side return of %s in %r' % (op, expr))
-            y, abort = self.interpret_statement(
-                m.group('y'), local_vars, allow_recursion - 1)
-            if abort:
-                raise ExtractorError(
-                    'Premature right-side return of %s in %r' % (op, expr))
-            return opfunc(x, y)
-
-        m = re.match(
-            r'^(?P<func>%s)\((?P<args>[a-zA-Z0-9_$,]*)\)$' % _NAME_RE, expr)
-        if m:
-            fname = m.group('func')
-            argvals = tuple([
-                int(v) if v.isdigit() else local_vars[v]
-                for v in m.group('args').split(',')]) if len(m.group('args')) > 0 else tuple()
-            if fname not in self._functions:
-                self._functions[fname] = self.extract_function(fname)
-            return self._functions[fname](argvals)
-
-        raise ExtractorError('Unsupported JS expression %r' % expr)
+        def resf(args):
+            local_vars = dict(zip(argnames, args))
+            for is_return, stmt in compiled:
+                res = stmt(local_vars)
+                if is_return:
+                    return res
+            return None
+        return resf
 
     def extract_object(self, objname):
-        _FUNC_NAME_RE = r'''(?:[a-zA-Z$0-9]+|"[a-zA-Z$0-9]+"|'[a-zA-Z$0-9]+')'''
-        obj = {}
-        obj_m = re.search(
-            r'''(?x)
-                (?<!this\.)%s\s*=\s*{\s*
-                    (?P<fields>(%s\s*:\s*function\s*\(.*?\)\s*{.*?}(?:,\s*)?)*)
-                }\s*;
-            ''' % (re.escape(objname), _FUNC_NAME_RE),
-            self.code)
-        fields = obj_m.group('fields')
-        # Currently, it only supports function definitions
-        fields_m = re.finditer(
-            r'''(?x)
-                (?P<key>%s)\s*:\s*function\s*\((?P<args>[a-z,]+)\){(?P<code>[^}]+)}
-            ''' % _FUNC_NAME_RE,
-            fields)
-        for f in fields_m:
-            argnames = f.group('args').split(',')
-            obj[remove_quotes(f.group('key'))] = self.build_function(argnames, f.group('code'))
-
-        return obj
+        for obj_m in re.finditer(
+                r'(?<![a-zA-Z0-9_$])(?<!this\.)%s\s*=\s*{' % re.escape(objname),
+                self.code):
+            parser = _JSParser(self.code, obj_m.end())
+            try:
+                obj = parser.parse_object()
+            except ExtractorError:
+                continue
+            return self._compile(obj)({})
+        raise ExtractorError('Could not find JS object %r' % objname)
 
     def extract_function(self, funcname):
         func_m = re.search(
             r'''(?x)
                 (?:function\s+%s|[{;,]\s*%s\s*=\s*function|var\s+%s\s*=\s*function)\s*
-                \((?P<args>[^)]*)\)\s*
-                \{(?P<code>[^}]+)\}''' % (
+                \((?P<args>[^)]*)\)\s*\{''' % (
                 re.escape(funcname), re.escape(funcname), re.escape(funcname)),
             self.code)
         if func_m is None:
             raise ExtractorError('Could not find JS function %r' % funcname)
-        argnames = func_m.group('args').split(',')
-
-        return self.build_function(argnames, func_m.group('code'))
+        argnames = [a.strip() for a in func_m.group('args').split(',') if a.strip()]
+        statements = _JSParser(self.code, func_m.end()).parse_statements('}')
+        return self._build_function(argnames, statements)
 
     def call_function(self, funcname, *args):
-        f = self.extract_function(funcname)
-        return f(args)
+        if funcname not in self._functions:
+            self._functions[funcname] = self.extract_function(funcname)
+        return self._functions[funcname](args)
 
     def build_function(self, argnames, code):
-        def resf(args):
-            local_vars = dict(zip(argnames, args))
-            for stmt in code.split(';'):
-                res, abort = self.interpret_statement(stmt, local_vars)
-                if abort:
-                    break
-            return res
-        return resf
+        return self._build_function(argnames, _JSParser(code).parse_statements())
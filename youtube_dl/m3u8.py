@@ -0,0 +1,128 @@
+from __future__ import unicode_literals
+
+import binascii
+import collections
+import re
+
+from .compat import compat_urlparse
+from .utils import parse_m3u8_attributes
+
+
+# Media segment of a media playlist. byte_range is a (start, end) tuple, end
+# excluded, if only part of the resource is the segment, key is the index
+# of the key of the segment in the keys of the playlist and ad whether the
+# segment is an ad
+M3U8Segment = collections.namedtuple(
+    'M3U8Segment', ['url', 'byte_range', 'key', 'media_sequence', 'ad'])
+
+
+def resolve_m3u8_url(url, base_url):
+    return (
+        url
+        if re.match(r'^https?://', url)
+        else compat_urlparse.urljoin(base_url, url))
+
+
+def _is_ad_start(line):
+    return (line.startswith('#ANVATO-SEGMENT-INFO') and 'type=ad' in line
+            or line.startswith('#UPLYNK-SEGMENT') and line.endswith(',ad'))
+
+
+def _is_ad_end(line):
+    return (line.startswith('#ANVATO-SEGMENT-INFO') and 'type=master' in line
+            or line.startswith('#UPLYNK-SEGMENT') and line.endswith(',segment'))
+
+
+class M3U8MediaPlaylist(object):
+    """
+    HLS media playlist parsed into a table of its segments.
+
+    keys is the list of the decryption keys of the playlist, the attributes
+    of its #EXT-X-KEY tags with IV decoded and URI resolved, the first one
+    being {'METHOD': 'NONE'} for the segments before any #EXT-X-KEY tag.
+    segments is the list of all its segments (M3U8Segment) and
+    media_segments the one of the segments that are not ads.
+    """
+
+    def __init__(self, doc, base_url):
+        self.target_duration = None
+        self.media_sequence = 0
+        self.playlist_type = None
+        self.ended = False
+        self.keys = [{'METHOD': 'NONE'}]
+        self.segments = []
+        self.media_segments = []
+
+        media_sequence = None
+        byte_range = None
+        # End of the last byte range, where a byte range with no offset starts
+        range_end = 0
+        ad = False
+        for line in doc.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith('#'):
+                if media_sequence is None:
+                    media_sequence = self.media_sequence
+                segment = M3U8Segment(
+                    resolve_m3u8_url(line, base_url), byte_range,
+                    len(self.keys) - 1, media_sequence, ad)
+                self.segments.append(segment)
+                if not ad:
+                    self.media_segments.append(segment)
+                # Ads have a media sequence number too
+                media_sequence += 1
+                byte_range = None
+            elif line.startswith('#EXT-X-KEY:'):
+                key = parse_m3u8_attributes(line[11:])
+                if key['METHOD'] == 'AES-128':
+                    if 'IV' in key:
+                        key['IV'] = binascii.unhexlify(key['IV'][2:].zfill(32))
+                    key['URI'] = resolve_m3u8_url(key['URI'], base_url)
+                self.keys.append(key)
+            elif line.startswith('#EXT-X-BYTERANGE:'):
+                length, _, offset = line[17:].partition('@')
+                start = int(offset) if offset else range_end
+                range_end = start + int(length)
+                byte_range = (start, range_end)
+            elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+                self.media_sequence = int(line[22:])
+            elif line.startswith('#EXT-X-TARGETDURATION:'):
+                self.target_duration = float(line[22:])
+            elif line.startswith('#EXT-X-PLAYLIST-TYPE:'):
+                self.playlist_type = line[21:]
+            elif line == '#EXT-X-ENDLIST':
+                self.ended = True
+            elif _is_ad_start(line):
+                ad = True
+            elif _is_ad_end(line):
+                ad = False
+
+    @property
+    def ad_count(self):
+        return len(self.segments) - len(self.media_segments)
+
+
+class M3U8MasterPlaylist(object):
+    """
+    HLS master playlist. media is the list of the renditions of its
+    #EXT-X-MEDIA tags (attribute dicts, URI left as is) and variants the
+    one of its variant streams, (attributes of #EXT-X-STREAM-INF, URL)
+    tuples, in order.
+    """
+
+    def __init__(self, doc, base_url):
+        self.media = []
+        self.variants = []
+
+        stream_inf = {}
+        for line in doc.splitlines():
+            line = line.strip()
+            if line.startswith('#EXT-X-MEDIA:'):
+                self.media.append(parse_m3u8_attributes(line[13:]))
+            elif line.startswith('#EXT-X-STREAM-INF:'):
+                stream_inf = parse_m3u8_attributes(line[18:])
+            elif line and not line.startswith('#'):
+                self.variants.append((stream_inf, resolve_m3u8_url(line, base_url)))
+                stream_inf = {}
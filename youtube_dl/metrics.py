@@ -0,0 +1,69 @@
+from __future__ import unicode_literals
+
+import contextlib
+import threading
+import time
+
+from .compat import compat_urllib_parse_urlparse
+
+
+class Metrics(object):
+    """
+    Timers, counters and traffic per host of the processing of a video.
+
+    timer(name) measures the time spent in a phase, count(name) counts
+    events, add_request(url) and add_bytes(url, byte_count) record the
+    traffic. summary() returns all of them as a JSON serializable
+    dictionary.
+
+    Instances may be shared between threads.
+    """
+
+    def __init__(self):
+        self._start = time.time()
+        self._timers = {}
+        self._counters = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.time() - start)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            timer = self._timers.setdefault(name, {'count': 0, 'seconds': 0.0})
+            timer['count'] += 1
+            timer['seconds'] += seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _host(self, url):
+        host = compat_urllib_parse_urlparse(url).hostname or ''
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = {'requests': 0, 'bytes': 0}
+        return stats
+
+    def add_request(self, url):
+        with self._lock:
+            self._host(url)['requests'] += 1
+
+    def add_bytes(self, url, byte_count):
+        with self._lock:
+            self._host(url)['bytes'] += byte_count
+
+    def summary(self):
+        with self._lock:
+            return {
+                'elapsed': time.time() - self._start,
+                'timers': dict((k, dict(v)) for k, v in self._timers.items()),
+                'counters': dict(self._counters),
+                'hosts': dict((k, dict(v)) for k, v in self._hosts.items()),
+            }
@@ -343,7 +343,12 @@ def parseOpts(overrideArguments=None):
     selection.add_option(
         '--download-archive', metavar='FILE',
         dest='download_archive',
-        help='Download only videos not listed in the archive file. Record the IDs of all downloaded videos in it.')
+        help='Download only videos not listed in the archive file. Record the IDs of all downloaded videos in it. '
+             'Files with .db, .sqlite or .sqlite3 extension are indexed SQLite archives, suitable for very large archives')
+    selection.add_option(
+        '--import-download-archive', metavar='FILE',
+        dest='import_download_archive',
+        help='Add the IDs recorded in the archive FILE (e.g. a text archive to migrate to an SQLite one) to the --download-archive file')
     selection.add_option(
         '--include-ads',
         dest='include_ads', action='store_true',
@@ -421,6 +426,13 @@ def parseOpts(overrideArguments=None):
             'If a merge is required (e.g. bestvideo+bestaudio), '
             'output to given container format. One of mkv, mp4, ogg, webm, flv. '
             'Ignored if no merge is required'))
+    video_format.add_option(
+        '--stream-merge',
+        action='store_true', dest='stream_merge', default=False,
+        help=(
+            'Pipe the formats to merge into ffmpeg as they are downloaded instead of '
+            'writing them to files first. Only the merged file is written. '
+            'Falls back to the files if they can\'t be streamed (experimental)'))
 
     subtitles = optparse.OptionGroup(parser, 'Subtitle Options')
     subtitles.add_option(
@@ -453,7 +465,12 @@ def parseOpts(overrideArguments=None):
     downloader.add_option(
         '-r', '--limit-rate', '--rate-limit',
         dest='ratelimit', metavar='RATE',
-        help='Maximum download rate in bytes per second (e.g. 50K or 4.2M)')
+        help='Maximum download rate in bytes per second (e.g. 50K or 4.2M), for all the downloads together')
+    downloader.add_option(
+        '--host-limit-rate',
+        dest='host_ratelimits', metavar='HOST:RATE', action='append',
+        help='Maximum download rate in bytes per second from HOST and its subdomains. '
+             'You can use this option multiple times')
     downloader.add_option(
         '-R', '--retries',
         dest='retries', metavar='RETRIES', default=10,
@@ -474,6 +491,14 @@ def parseOpts(overrideArguments=None):
         '--keep-fragments',
         action='store_true', dest='keep_fragments', default=False,
         help='Keep downloaded fragments on disk after downloading is finished; fragments are erased by default')
+    downloader.add_option(
+        '--concurrent-fragments',
+        dest='concurrent_fragment_downloads', metavar='N', default=1, type=int,
+        help='Number of fragments to download concurrently (default is %default) (DASH, hlsnative, ISM and f4m)')
+    downloader.add_option(
+        '--concurrent-downloads',
+        dest='concurrent_downloads', metavar='N', default=1, type=int,
+        help='Number of URLs or playlist videos to extract and download concurrently (default is %default)')
     downloader.add_option(
         '--buffer-size',
         dest='buffersize', metavar='SIZE', default='1024',
@@ -487,6 +512,12 @@ def parseOpts(overrideArguments=None):
         dest='http_chunk_size', metavar='SIZE', default=None,
         help='Size of a chunk for chunk-based HTTP downloading (e.g. 10485760 or 10M) (default is disabled). '
              'May be useful for bypassing bandwidth throttling imposed by a webserver (experimental)')
+    downloader.add_option(
+        '--http-connections',
+        dest='http_connections', metavar='N', default=1, type=int,
+        help='Number of connections to download a file over, each one fetching a different part of it '
+             '(default is %default). May be useful for bypassing bandwidth throttling imposed by a webserver '
+             'on each connection (experimental)')
     downloader.add_option(
         '--test',
         action='store_true', dest='test', default=False,
@@ -635,6 +666,18 @@ def parseOpts(overrideArguments=None):
         action='store_true', dest='print_json', default=False,
         help='Be quiet and print the video information as JSON (video is still being downloaded).',
     )
+    verbosity.add_option(
+        '--expand-fragments',
+        action='store_true', dest='expand_fragments', default=False,
+        help='Write every fragment of DASH formats in the JSON information instead of the compact description of the fragments made from templates')
+    verbosity.add_option(
+        '--print-metrics',
+        action='store_true', dest='print_metrics', default=False,
+        help='Print the time spent in each phase, the counters and the traffic per host of each video as JSON')
+    verbosity.add_option(
+        '--metrics-file',
+        dest='metrics_file', metavar='FILE',
+        help='Append the metrics of each video to FILE, one JSON line per video')
     verbosity.add_option(
         '--newline',
         action='store_true', dest='progress_with_newline', default=False,
@@ -667,6 +710,18 @@ def parseOpts(overrideArguments=None):
         '--print-traffic', '--dump-headers',
         dest='debug_printtraffic', action='store_true', default=False,
         help='Display sent and read HTTP traffic')
+    verbosity.add_option(
+        '--profile',
+        dest='profile', metavar='DIR',
+        help='Write a profile of the processing of each URL to DIR')
+    verbosity.add_option(
+        '--profile-mode',
+        dest='profile_mode', metavar='MODE', default='sampling',
+        help='How to profile with --profile. '
+             'One of sampling (the default; take the stacks at regular intervals with a low overhead, '
+             'written in the collapsed stack format of flame graph tools) or '
+             'deterministic (record every function call with cProfile, written as pstats; '
+             'not available with --concurrent-downloads on Python 3.12+, sampling is used then)')
     verbosity.add_option(
         '-C', '--call-home',
         dest='call_home', action='store_true', default=False,
@@ -755,7 +810,7 @@ def parseOpts(overrideArguments=None):
         help='File to read cookies from and dump cookie jar in')
     filesystem.add_option(
         '--cache-dir', dest='cachedir', default=None, metavar='DIR',
-        help='Location in the filesystem where youtube-dl can store some downloaded information permanently. By default $XDG_CACHE_HOME/youtube-dl or ~/.cache/youtube-dl . At the moment, only YouTube player files (for videos with obfuscated signatures) are cached, but that may change.')
+        help='Location in the filesystem where youtube-dl can store some downloaded information permanently. By default $XDG_CACHE_HOME/youtube-dl or ~/.cache/youtube-dl . At the moment, only YouTube player files (for videos with obfuscated signatures) and, with --info-cache-ttl, the information of videos are cached, but that may change.')
     filesystem.add_option(
         '--no-cache-dir', action='store_const', const=False, dest='cachedir',
         help='Disable filesystem caching')
@@ -763,6 +818,15 @@ def parseOpts(overrideArguments=None):
         '--rm-cache-dir',
         action='store_true', dest='rm_cachedir',
         help='Delete all filesystem cache files')
+    filesystem.add_option(
+        '--cache-max-size',
+        dest='cache_max_size', metavar='SIZE', default=None,
+        help='Maximum size of the filesystem cache, the least recently used files are deleted when it gets bigger (e.g. 50K or 44.6M)')
+    filesystem.add_option(
+        '--info-cache-ttl',
+        dest='info_cache_ttl', metavar='SECONDS', type=float, default=None,
+        help='Cache the information extracted for each video in the filesystem cache and reuse it for up to SECONDS seconds, '
+             'or until the URLs of its formats are about to expire (disabled by default)')
 
     thumbnail = optparse.OptionGroup(parser, 'Thumbnail images')
     thumbnail.add_option(
@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 from .embedthumbnail import EmbedThumbnailPP
 from .ffmpeg import (
+    FFmpegPlan,
     FFmpegPostProcessor,
     FFmpegEmbedSubtitlePP,
     FFmpegExtractAudioPP,
@@ -32,6 +33,7 @@ __all__ = [
     'FFmpegFixupStretchedPP',
     'FFmpegMergerPP',
     'FFmpegMetadataPP',
+    'FFmpegPlan',
     'FFmpegPostProcessor',
     'FFmpegSubtitlesConvertorPP',
     'FFmpegVideoConvertorPP',
@@ -27,20 +27,18 @@ class EmbedThumbnailPP(FFmpegPostProcessor):
         super(EmbedThumbnailPP, self).__init__(downloader)
         self._already_have_thumbnail = already_have_thumbnail
 
-    def run(self, info):
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
-
+    def _thumbnail_filename(self, info):
+        """Return the filename of the thumbnail to embed, in JPEG or PNG"""
         if not info.get('thumbnails'):
             self._downloader.to_screen('[embedthumbnail] There aren\'t any thumbnails to embed')
-            return [], info
+            return None
 
         thumbnail_filename = info['thumbnails'][-1]['filename']
 
         if not os.path.exists(encodeFilename(thumbnail_filename)):
             self._downloader.report_warning(
                 'Skipping embedding the thumbnail because the file is missing.')
-            return [], info
+            return None
 
         def is_webp(path):
             with open(encodeFilename(path), 'rb') as f:
@@ -74,21 +72,38 @@ class EmbedThumbnailPP(FFmpegPostProcessor):
             os.rename(encodeFilename(escaped_thumbnail_jpg_filename), encodeFilename(thumbnail_jpg_filename))
             thumbnail_filename = thumbnail_jpg_filename
 
-        if info['ext'] == 'mp3':
-            options = [
-                '-c', 'copy', '-map', '0', '-map', '1',
-                '-metadata:s:v', 'title="Album cover"', '-metadata:s:v', 'comment="Cover (Front)"']
+        return thumbnail_filename
 
-            self._downloader.to_screen('[ffmpeg] Adding thumbnail to "%s"' % filename)
+    def add_to_plan(self, plan, info):
+        if info['ext'] != 'mp3':
+            return None
 
-            self.run_ffmpeg_multiple_files([filename, thumbnail_filename], temp_filename, options)
+        thumbnail_filename = self._thumbnail_filename(info)
+        if thumbnail_filename is None:
+            return info
 
-            if not self._already_have_thumbnail:
-                os.remove(encodeFilename(thumbnail_filename))
-            os.remove(encodeFilename(filename))
-            os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        plan.map_all()
+        plan.add_options([
+            '-map', '%d' % plan.add_input(thumbnail_filename),
+            '-metadata:s:v', 'title="Album cover"', '-metadata:s:v', 'comment="Cover (Front)"'])
+        if not self._already_have_thumbnail:
+            plan.add_temp_file(thumbnail_filename)
+
+        self._downloader.to_screen('[ffmpeg] Adding thumbnail to "%s"' % info['filepath'])
+        return info
+
+    def run(self, info):
+        if info['ext'] == 'mp3':
+            return super(EmbedThumbnailPP, self).run(info)
+
+        filename = info['filepath']
+        temp_filename = prepend_extension(filename, 'temp')
+
+        thumbnail_filename = self._thumbnail_filename(info)
+        if thumbnail_filename is None:
+            return [], info
 
-        elif info['ext'] in ['m4a', 'mp4']:
+        if info['ext'] in ['m4a', 'mp4']:
             if not check_executable('AtomicParsley', ['-v']):
                 raise EmbedThumbnailPPError('AtomicParsley was not found. Please install.')
 
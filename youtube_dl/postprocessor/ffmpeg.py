@@ -3,6 +3,8 @@ from __future__ import unicode_literals
 import io
 import os
 import subprocess
+import sys
+import threading
 import time
 import re
 
@@ -12,6 +14,7 @@ from .common import AudioConversionError, PostProcessor
 from ..utils import (
     encodeArgument,
     encodeFilename,
+    error_to_compat_str,
     get_exe_version,
     is_outdated_version,
     PostProcessingError,
@@ -203,19 +206,15 @@ class FFmpegPostProcessor(PostProcessor):
                 return mobj.group(1)
         return None
 
-    def run_ffmpeg_multiple_files(self, input_paths, out_path, opts):
-        self.check_version()
-
-        oldest_mtime = min(
-            os.stat(encodeFilename(path)).st_mtime for path in input_paths)
-
-        opts += self._configuration_args()
+    def _ffmpeg_command(self, inputs, out_path, opts):
+        """Return the command line reading inputs (ffmpeg URLs)"""
+        opts = opts + self._configuration_args()
 
         files_cmd = []
-        for path in input_paths:
+        for url in inputs:
             files_cmd.extend([
                 encodeArgument('-i'),
-                encodeFilename(self._ffmpeg_filename_argument(path), True)
+                encodeFilename(url, True)
             ])
         cmd = [encodeFilename(self.executable, True), encodeArgument('-y')]
         # avconv does not have repeat option
@@ -227,17 +226,101 @@ class FFmpegPostProcessor(PostProcessor):
 
         if self._downloader.params.get('verbose', False):
             self._downloader.to_screen('[debug] ffmpeg command line: %s' % shell_quote(cmd))
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-        stdout, stderr = p.communicate()
-        if p.returncode != 0:
+        return cmd
+
+    @staticmethod
+    def _check_ffmpeg_result(returncode, stderr):
+        if returncode != 0:
             stderr = stderr.decode('utf-8', 'replace')
             msg = stderr.strip().split('\n')[-1]
             raise FFmpegPostProcessorError(msg)
+
+    def run_ffmpeg_multiple_files(self, input_paths, out_path, opts):
+        self.check_version()
+
+        oldest_mtime = min(
+            os.stat(encodeFilename(path)).st_mtime for path in input_paths)
+
+        cmd = self._ffmpeg_command(
+            [self._ffmpeg_filename_argument(path) for path in input_paths],
+            out_path, opts)
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+        stdout, stderr = p.communicate()
+        self._check_ffmpeg_result(p.returncode, stderr)
         self.try_utime(out_path, oldest_mtime, oldest_mtime)
 
+    def run_ffmpeg_streams(self, count, out_path, opts, write_func):
+        """
+        Run ffmpeg reading count inputs from pipes rather than from files.
+
+        write_func is called with a list of count file-like objects, the
+        write ends of the pipes, and must write each input to its pipe and
+        close it once complete. Its result is returned.
+        """
+        self.check_version()
+
+        import fcntl
+
+        pipes = [os.pipe() for _ in range(count)]
+        read_fds = [r for r, _ in pipes]
+        for _, w in pipes:
+            # ffmpeg only gets EOF once every write end is closed
+            fcntl.fcntl(w, fcntl.F_SETFD, fcntl.fcntl(w, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        popen_kwargs = (
+            {'pass_fds': read_fds} if sys.version_info >= (3, 2)
+            else {'close_fds': False})
+        cmd = self._ffmpeg_command(['pipe:%d' % fd for fd in read_fds], out_path, opts)
+        try:
+            p = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                stdin=subprocess.PIPE, **popen_kwargs)
+        finally:
+            for fd in read_fds:
+                os.close(fd)
+        streams = [_PipeStream(w) for _, w in pipes]
+
+        # Keep reading the output so that ffmpeg never blocks on it
+        output = []
+        reader = threading.Thread(target=lambda: output.append(p.communicate()))
+        reader.daemon = True
+        reader.start()
+        # Other errors (e.g. KeyboardInterrupt, DownloadError) are passed on
+        # as they are, whatever ffmpeg made of its truncated inputs
+        check_result = False
+        try:
+            result = write_func(streams)
+            check_result = True
+        except EnvironmentError:
+            # An ffmpeg failure is the reason of any error writing the inputs
+            check_result = True
+            raise
+        finally:
+            for stream in streams:
+                stream.close()
+            reader.join()
+            if check_result:
+                self._check_ffmpeg_result(p.returncode, output[0][1])
+        return result
+
     def run_ffmpeg(self, path, out_path, opts):
         self.run_ffmpeg_multiple_files([path], out_path, opts)
 
+    def add_to_plan(self, plan, information):
+        """
+        Add the operations of the postprocessor on the file to plan (an
+        FFmpegPlan), so that they are run together with the ones of the
+        neighbouring postprocessors.
+
+        Return the updated information, or None if the postprocessor can't
+        be part of plan (it must then be run on its own).
+        """
+        return None
+
+    def run(self, information):
+        plan = FFmpegPlan(self, information['filepath'])
+        information = self.add_to_plan(plan, information)
+        return plan.run(), information
+
     def _ffmpeg_filename_argument(self, fn):
         # Always use 'file:' because the filename may contain ':' (ffmpeg
         # interprets that as a protocol) or can start with '-' (-- is broken in
@@ -246,6 +329,141 @@ class FFmpegPostProcessor(PostProcessor):
         return 'file:' + fn if fn != '-' else fn
 
 
+class _PipeStream(object):
+    """
+    File-like object writing to a pipe, it can only seek to the current
+    position (for downloaders restarting from it)
+    """
+
+    def __init__(self, fd):
+        self._stream = io.open(fd, 'wb')
+        self._pos = 0
+
+    def write(self, data):
+        try:
+            self._stream.write(data)
+        except (IOError, OSError) as err:
+            # Not an IOError, so that downloaders don't retry
+            raise FFmpegPostProcessorError('ffmpeg stopped reading: %s' % error_to_compat_str(err))
+        self._pos += len(data)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos):
+        if pos != self._pos:
+            raise IOError('cannot seek in a pipe')
+
+    def truncate(self):
+        pass
+
+    def flush(self):
+        self._stream.flush()
+
+    def close(self):
+        if self._stream.closed:
+            return
+        try:
+            self._stream.close()
+        except (IOError, OSError):
+            # ffmpeg may have stopped reading already
+            pass
+
+
+class FFmpegPlan(object):
+    """
+    The operations of consecutive ffmpeg based postprocessors on a file,
+    run as a single ffmpeg invocation rather than rewriting the file once
+    for each of them.
+
+    Streams are copied, postprocessors add inputs, stream maps and output
+    options (e.g. bitstream filters or metadata) with the methods below.
+    """
+
+    def __init__(self, pp, filename):
+        # The postprocessor running ffmpeg
+        self._pp = pp
+        self.filename = filename
+        # Files the streams come from instead of filename (merged formats)
+        self._sources = None
+        self._maps = []
+        self._inputs = []
+        self._options = []
+        self._temp_files = []
+        self._files_to_delete = []
+        self._operations = 0
+
+    @property
+    def empty(self):
+        return self._operations == 0
+
+    @property
+    def file_exists(self):
+        """Whether filename already has the content the plan starts from"""
+        return self._sources is None
+
+    def _add_operation(self):
+        self._operations += 1
+
+    def set_sources(self, paths, maps):
+        """Create the file from the streams maps of paths"""
+        assert self.empty
+        self._add_operation()
+        self._sources = paths
+        self._maps = maps
+
+    def map_all(self, exclude=[]):
+        """
+        Keep all the streams of the file but exclude (stream specifiers),
+        rather than ffmpeg's default selection
+        """
+        self._add_operation()
+        if self._sources is not None:
+            return
+        if '0' not in self._maps:
+            self._maps.insert(0, '0')
+        for spec in exclude:
+            if '-0:' + spec not in self._maps:
+                self._maps.append('-0:' + spec)
+
+    def add_input(self, path):
+        """Return the index of the new input"""
+        self._add_operation()
+        self._inputs.append(path)
+        return len(self._sources or [self.filename]) + len(self._inputs) - 1
+
+    def add_options(self, options):
+        self._add_operation()
+        self._options.extend(options)
+
+    def add_temp_file(self, path):
+        """Remove path once ffmpeg has run"""
+        self._temp_files.append(path)
+
+    def delete_files(self, paths):
+        """Files that are no longer needed once ffmpeg has run"""
+        self._files_to_delete.extend(paths)
+
+    def run(self):
+        """Run ffmpeg, return the files that are no longer needed"""
+        if self.empty:
+            return self._files_to_delete
+        filename = self.filename
+        temp_filename = prepend_extension(filename, 'temp')
+        options = ['-c', 'copy']
+        for spec in self._maps:
+            options.extend(['-map', spec])
+        options.extend(self._options)
+        self._pp.run_ffmpeg_multiple_files(
+            (self._sources or [filename]) + self._inputs, temp_filename, options)
+        for path in self._temp_files:
+            os.remove(encodeFilename(path))
+        if self._sources is None:
+            os.remove(encodeFilename(filename))
+        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        return self._files_to_delete
+
+
 class FFmpegExtractAudioPP(FFmpegPostProcessor):
     def __init__(self, downloader=None, preferredcodec=None, preferredquality=None, nopostoverwrites=False):
         FFmpegPostProcessor.__init__(self, downloader)
@@ -373,14 +591,14 @@ class FFmpegVideoConvertorPP(FFmpegPostProcessor):
 
 
 class FFmpegEmbedSubtitlePP(FFmpegPostProcessor):
-    def run(self, information):
+    def add_to_plan(self, plan, information):
         if information['ext'] not in ('mp4', 'webm', 'mkv'):
             self._downloader.to_screen('[ffmpeg] Subtitles can only be embedded in mp4, webm or mkv files')
-            return [], information
+            return information
         subtitles = information.get('requested_subtitles')
         if not subtitles:
             self._downloader.to_screen('[ffmpeg] There aren\'t any subtitles to embed')
-            return [], information
+            return information
 
         filename = information['filepath']
 
@@ -400,38 +618,29 @@ class FFmpegEmbedSubtitlePP(FFmpegPostProcessor):
                     self._downloader.to_screen('[ffmpeg] Only WebVTT subtitles can be embedded in webm files')
 
         if not sub_langs:
-            return [], information
-
-        input_files = [filename] + sub_filenames
-
-        opts = [
-            '-map', '0',
-            '-c', 'copy',
-            # Don't copy the existing subtitles, we may be running the
-            # postprocessor a second time
-            '-map', '-0:s',
-            # Don't copy Apple TV chapters track, bin_data (see #19042, #19024,
-            # https://trac.ffmpeg.org/ticket/6016)
-            '-map', '-0:d',
-        ]
+            return information
+
+        # Don't copy the existing subtitles, we may be running the
+        # postprocessor a second time. Don't copy Apple TV chapters track,
+        # bin_data either (see #19042, #19024,
+        # https://trac.ffmpeg.org/ticket/6016)
+        plan.map_all(exclude=['s', 'd'])
+        opts = []
         if information['ext'] == 'mp4':
             opts += ['-c:s', 'mov_text']
-        for (i, lang) in enumerate(sub_langs):
-            opts.extend(['-map', '%d:0' % (i + 1)])
+        for (i, (lang, sub_filename)) in enumerate(zip(sub_langs, sub_filenames)):
+            opts.extend(['-map', '%d:0' % plan.add_input(sub_filename)])
             lang_code = ISO639Utils.short2long(lang) or lang
             opts.extend(['-metadata:s:s:%d' % i, 'language=%s' % lang_code])
+        plan.add_options(opts)
+        plan.delete_files(sub_filenames)
 
-        temp_filename = prepend_extension(filename, 'temp')
         self._downloader.to_screen('[ffmpeg] Embedding subtitles in \'%s\'' % filename)
-        self.run_ffmpeg_multiple_files(input_files, temp_filename, opts)
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
-
-        return sub_filenames, information
+        return information
 
 
 class FFmpegMetadataPP(FFmpegPostProcessor):
-    def run(self, info):
+    def add_to_plan(self, plan, info):
         metadata = {}
 
         def add(meta_list, info_list=None):
@@ -471,17 +680,13 @@ class FFmpegMetadataPP(FFmpegPostProcessor):
 
         if not metadata:
             self._downloader.to_screen('[ffmpeg] There isn\'t any metadata to add')
-            return [], info
+            return info
 
         filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
-        in_filenames = [filename]
         options = []
 
         if info['ext'] == 'm4a':
-            options.extend(['-vn', '-acodec', 'copy'])
-        else:
-            options.extend(['-c', 'copy'])
+            options.append('-vn')
 
         for (name, value) in metadata.items():
             options.extend(['-metadata', '%s=%s' % (name, value)])
@@ -502,27 +707,48 @@ class FFmpegMetadataPP(FFmpegPostProcessor):
                     if chapter_title:
                         metadata_file_content += 'title=%s\n' % ffmpeg_escape(chapter_title)
                 f.write(metadata_file_content)
-                in_filenames.append(metadata_filename)
-                options.extend(['-map_metadata', '1'])
+            options.extend(['-map_metadata', '%d' % plan.add_input(metadata_filename)])
+            plan.add_temp_file(metadata_filename)
 
+        plan.add_options(options)
         self._downloader.to_screen('[ffmpeg] Adding metadata to \'%s\'' % filename)
-        self.run_ffmpeg_multiple_files(in_filenames, temp_filename, options)
-        if chapters:
-            os.remove(metadata_filename)
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
-        return [], info
+        return info
 
 
 class FFmpegMergerPP(FFmpegPostProcessor):
-    def run(self, info):
-        filename = info['filepath']
+    def add_to_plan(self, plan, info):
+        if not plan.empty:
+            return None
+        plan.set_sources(info['__files_to_merge'], ['0:v:0', '1:a:0'])
+        plan.delete_files(info['__files_to_merge'])
+        self._downloader.to_screen('[ffmpeg] Merging formats into "%s"' % info['filepath'])
+        return info
+
+    def can_stream(self):
+        """Whether the formats can be merged as they are downloaded"""
+        return self.basename == 'ffmpeg' and os.name != 'nt'
+
+    def run_streaming(self, filename, write_func):
+        """
+        Merge two formats (video and audio) into filename as they are
+        downloaded, instead of from files. write_func is called with the
+        streams to write the formats to (see run_ffmpeg_streams) and its
+        result is returned.
+        """
         temp_filename = prepend_extension(filename, 'temp')
         args = ['-c', 'copy', '-map', '0:v:0', '-map', '1:a:0']
-        self._downloader.to_screen('[ffmpeg] Merging formats into "%s"' % filename)
-        self.run_ffmpeg_multiple_files(info['__files_to_merge'], temp_filename, args)
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
-        return info['__files_to_merge'], info
+        self._downloader.to_screen('[ffmpeg] Merging formats into "%s" as they are downloaded' % filename)
+        try:
+            success = self.run_ffmpeg_streams(2, temp_filename, args, write_func)
+        except Exception:
+            if os.path.exists(encodeFilename(temp_filename)):
+                os.remove(encodeFilename(temp_filename))
+            raise
+        if success:
+            os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        elif os.path.exists(encodeFilename(temp_filename)):
+            os.remove(encodeFilename(temp_filename))
+        return success
 
     def can_merge(self):
         # TODO: figure out merge-capable ffmpeg version
@@ -543,55 +769,36 @@ class FFmpegMergerPP(FFmpegPostProcessor):
 
 
 class FFmpegFixupStretchedPP(FFmpegPostProcessor):
-    def run(self, info):
+    def add_to_plan(self, plan, info):
         stretched_ratio = info.get('stretched_ratio')
         if stretched_ratio is None or stretched_ratio == 1:
-            return [], info
-
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
+            return info
 
-        options = ['-c', 'copy', '-aspect', '%f' % stretched_ratio]
-        self._downloader.to_screen('[ffmpeg] Fixing aspect ratio in "%s"' % filename)
-        self.run_ffmpeg(filename, temp_filename, options)
-
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
-
-        return [], info
+        plan.add_options(['-aspect', '%f' % stretched_ratio])
+        self._downloader.to_screen('[ffmpeg] Fixing aspect ratio in "%s"' % info['filepath'])
+        return info
 
 
 class FFmpegFixupM4aPP(FFmpegPostProcessor):
-    def run(self, info):
+    def add_to_plan(self, plan, info):
         if info.get('container') != 'm4a_dash':
-            return [], info
+            return info
 
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
-
-        options = ['-c', 'copy', '-f', 'mp4']
-        self._downloader.to_screen('[ffmpeg] Correcting container in "%s"' % filename)
-        self.run_ffmpeg(filename, temp_filename, options)
-
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
-
-        return [], info
+        plan.add_options(['-f', 'mp4'])
+        self._downloader.to_screen('[ffmpeg] Correcting container in "%s"' % info['filepath'])
+        return info
 
 
 class FFmpegFixupM3u8PP(FFmpegPostProcessor):
-    def run(self, info):
+    def add_to_plan(self, plan, info):
         filename = info['filepath']
+        # The file must be probed
+        if not plan.file_exists:
+            return None
         if self.get_audio_codec(filename) == 'aac':
-            temp_filename = prepend_extension(filename, 'temp')
-
-            options = ['-c', 'copy', '-f', 'mp4', '-bsf:a', 'aac_adtstoasc']
+            plan.add_options(['-f', 'mp4', '-bsf:a', 'aac_adtstoasc'])
             self._downloader.to_screen('[ffmpeg] Fixing malformed AAC bitstream in "%s"' % filename)
-            self.run_ffmpeg(filename, temp_filename, options)
-
-            os.remove(encodeFilename(filename))
-            os.rename(encodeFilename(temp_filename), encodeFilename(filename))
-        return [], info
+        return info
 
 
 class FFmpegSubtitlesConvertorPP(FFmpegPostProcessor):
@@ -0,0 +1,168 @@
+from __future__ import unicode_literals
+
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+
+
+class Profiler(object):
+    """
+    Profiler of the threads working on a URL.
+
+    Threads call enable() and disable() around the work to profile, the
+    calls may be nested. dump(filename) writes the results once they are
+    all done, in the format of the FILE_EXT extension, and returns whether
+    there were any.
+    """
+
+    FILE_EXT = None
+    # Whether the URLs processed concurrently can be profiled separately
+    CONCURRENT = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Number of nested enable() calls per thread
+        self._depths = {}
+
+    def enable(self):
+        ident = threading.current_thread().ident
+        with self._lock:
+            depth = self._depths.get(ident, 0)
+            self._depths[ident] = depth + 1
+        if depth == 0:
+            self._start(ident)
+
+    def disable(self):
+        ident = threading.current_thread().ident
+        with self._lock:
+            depth = self._depths[ident] - 1
+            if depth:
+                self._depths[ident] = depth
+            else:
+                del self._depths[ident]
+        if depth == 0:
+            self._stop(ident)
+
+    def _start(self, ident):
+        raise NotImplementedError('This method must be implemented by subclasses')
+
+    def _stop(self, ident):
+        raise NotImplementedError('This method must be implemented by subclasses')
+
+    def dump(self, filename):
+        raise NotImplementedError('This method must be implemented by subclasses')
+
+
+class DeterministicProfiler(Profiler):
+    """
+    Profiler recording every function call with cProfile, the stats are
+    written as a pstats file.
+    """
+
+    FILE_EXT = 'pstats'
+    # Python 3.12+ profiles every thread with the same profiler
+    CONCURRENT = sys.version_info < (3, 12)
+
+    def __init__(self):
+        super(DeterministicProfiler, self).__init__()
+        self._profiles = []
+        self._active = {}
+
+    def _start(self, ident):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ runs a single cProfile profiler at a time, which
+            # records the calls of every thread, those of this one included
+            return
+        with self._lock:
+            self._profiles.append(profile)
+            self._active[ident] = profile
+
+    def _stop(self, ident):
+        with self._lock:
+            profile = self._active.pop(ident, None)
+        if profile is not None:
+            profile.disable()
+
+    def dump(self, filename):
+        stats = None
+        for profile in self._profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # No function call was recorded
+                pass
+        if stats is None:
+            return False
+        stats.dump_stats(filename)
+        return True
+
+
+class SamplingProfiler(Profiler):
+    """
+    Profiler taking the stacks of the profiled threads every interval
+    seconds from a background thread, which keeps the overhead low.
+
+    The samples are written in the collapsed stack format of flame graph
+    tools: one "outer frame;...;inner frame count" line per stack.
+    """
+
+    FILE_EXT = 'collapsed'
+
+    def __init__(self, interval=0.01):
+        super(SamplingProfiler, self).__init__()
+        self.interval = interval
+        self._stacks = {}
+        self._sampler = None
+
+    def _start(self, ident):
+        with self._lock:
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample)
+                self._sampler.daemon = True
+                self._sampler.start()
+
+    def _stop(self, ident):
+        pass
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                # Stop once no thread is profiled, the next enable() starts
+                # a new sampler
+                if not self._depths:
+                    self._sampler = None
+                    return
+                idents = list(self._depths)
+            frames = sys._current_frames()
+            stacks = []
+            for ident in idents:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('%s (%s:%d)' % (code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if stack:
+                    stacks.append(';'.join(reversed(stack)))
+            del frames
+            with self._lock:
+                for stack in stacks:
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+
+    def dump(self, filename):
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            for stack, count in stacks:
+                f.write('%s %d\n' % (stack, count))
+        return True
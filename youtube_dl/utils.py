@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import base64
 import binascii
+import bisect
 import calendar
 import codecs
 import collections
@@ -31,6 +32,7 @@ import ssl
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import traceback
 import xml.etree.ElementTree
@@ -1792,7 +1794,7 @@ def preferredencoding():
     return pref
 
 
-def write_json_file(obj, fn):
+def write_json_file(obj, fn, default=None):
     """ Encode obj as JSON and write it to fn, atomically if possible """
 
     fn = encodeFilename(fn)
@@ -1829,8 +1831,8 @@ def write_json_file(obj, fn):
 
     try:
         with tf:
-            json.dump(obj, tf)
-        if sys.platform == 'win32':
+            json.dump(obj, tf, default=default)
+        if sys.platform == 'win32' and not hasattr(os, 'replace'):
             # Need to remove existing file on Windows, else os.rename raises
             # WindowsError or FileExistsError.
             try:
@@ -1843,7 +1845,8 @@ def write_json_file(obj, fn):
             os.chmod(tf.name, 0o666 & ~mask)
         except OSError:
             pass
-        os.rename(tf.name, fn)
+        # os.replace overwrites fn atomically on Windows as well
+        getattr(os, 'replace', os.rename)(tf.name, fn)
     except Exception:
         try:
             os.remove(tf.name)
@@ -2535,6 +2538,186 @@ def _create_http_connection(ydl_handler, http_class, is_https, *args, **kwargs):
     return hc
 
 
+class HTTPConnectionPool(object):
+    """
+    Idle HTTP connections kept alive to be reused by later requests.
+
+    Connections are stored by a key identifying the server (or proxy) they
+    are connected to. At most max_per_key idle connections are kept for each
+    key, and connections idle for idle_timeout seconds are closed.
+    """
+
+    def __init__(self, max_per_key=10, idle_timeout=15):
+        self.max_per_key = max_per_key
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # Lists of (connection, release time) from the oldest to the newest
+        self._idle = {}
+
+    def _pop_expired(self, key, now):
+        conns = self._idle.get(key, [])
+        expired = []
+        while conns and now - conns[0][1] >= self.idle_timeout:
+            expired.append(conns.pop(0)[0])
+        return expired
+
+    def get(self, key):
+        """Return an idle connection for key, None if there is none."""
+        conn = None
+        with self._lock:
+            expired = self._pop_expired(key, time.time())
+            conns = self._idle.get(key)
+            if conns:
+                conn = conns.pop()[0]
+        for c in expired:
+            c.close()
+        return conn
+
+    def put(self, key, conn):
+        """Keep conn, which has no pending response, for later requests."""
+        now = time.time()
+        with self._lock:
+            expired = self._pop_expired(key, now)
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.max_per_key:
+                conns.append((conn, now))
+                conn = None
+        for c in expired + ([conn] if conn else []):
+            c.close()
+
+    def close(self):
+        """Close all the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+
+class _KeepAliveHTTPResponse(compat_http_client.HTTPResponse):
+    """
+    HTTP response that gives its connection back to the pool once its body
+    has been read, see _keep_alive_open.
+    """
+    _release = None
+    _reading_chunked = False
+
+    def _done(self, reusable):
+        release, self._release = self._release, None
+        if release:
+            release(reusable)
+
+    def close(self):
+        # The connection can't be reused if some of the body is left in it
+        self._done(
+            self.fp is None or self._reading_chunked
+            or (not self.chunked and self.length == 0))
+        compat_http_client.HTTPResponse.close(self)
+
+    if hasattr(compat_http_client.HTTPResponse, '_close_conn'):  # Python 3
+        # Called when the end of the body is reached
+        def _close_conn(self):
+            compat_http_client.HTTPResponse._close_conn(self)
+            self._done(True)
+    else:  # Python 2
+        # Closes the response when the end of the body is reached
+        def _read_chunked(self, amt):
+            self._reading_chunked = True
+            try:
+                return compat_http_client.HTTPResponse._read_chunked(self, amt)
+            finally:
+                self._reading_chunked = False
+
+
+def _keep_alive_open(ydl_handler, http_class, req, key, **kwargs):
+    """
+    Like AbstractHTTPHandler.do_open, but reuse the connections of
+    ydl_handler._connection_pool instead of closing them after each request.
+
+    key identifies the kind of connections made by http_class.
+    """
+    host = req.host if sys.version_info >= (3, 0) else req.get_host()
+    if not host:
+        raise compat_urllib_error.URLError('no host given')
+
+    headers = dict(req.unredirected_hdrs)
+    headers.update(dict(
+        (k, v) for k, v in req.headers.items() if k not in headers))
+    headers = dict((name.title(), val) for name, val in headers.items())
+
+    tunnel_headers = {}
+    if req._tunnel_host:
+        proxy_auth_hdr = 'Proxy-Authorization'
+        if proxy_auth_hdr in headers:
+            # Proxy-Authorization should not be sent to origin server
+            tunnel_headers[proxy_auth_hdr] = headers.pop(proxy_auth_hdr)
+    key += (host, req._tunnel_host, tuple(sorted(tunnel_headers.items())))
+
+    request_kwargs = {}
+    if sys.version_info >= (3, 6):
+        request_kwargs['encode_chunked'] = req.has_header('Transfer-encoding')
+    selector = req.selector if sys.version_info >= (3, 0) else req.get_selector()
+
+    pool = ydl_handler._connection_pool
+    while True:
+        h = pool.get(key)
+        reused = h is not None
+        if reused:
+            h.timeout = req.timeout
+            if h.sock is not None:
+                h.sock.settimeout(req.timeout)
+        else:
+            # will parse host:port
+            h = http_class(host, timeout=req.timeout, **kwargs)
+            h.set_debuglevel(ydl_handler._debuglevel)
+            if req._tunnel_host:
+                h.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+            h.response_class = _KeepAliveHTTPResponse
+        try:
+            try:
+                h.request(
+                    req.get_method(), selector, req.data, headers,
+                    **compat_kwargs(request_kwargs))
+            except socket.error as err:
+                raise compat_urllib_error.URLError(err)
+            r = h.getresponse()
+        except (compat_urllib_error.URLError, socket.error, compat_http_client.HTTPException) as err:
+            h.close()
+            if isinstance(err, compat_urllib_error.URLError):
+                err = err.reason
+            # Servers close idle connections whenever they want, retry on a
+            # new one unless the server is just slow to respond or the
+            # request may have been handled already and can't be repeated
+            if (reused and not isinstance(err, socket.timeout)
+                    and req.data is None and req.get_method() in ('GET', 'HEAD')):
+                continue
+            raise
+        except BaseException:
+            h.close()
+            raise
+        break
+
+    def release(reusable):
+        if reusable and h.sock is not None:
+            pool.put(key, h)
+        else:
+            h.close()
+
+    r._release = release
+
+    if sys.version_info >= (3, 0):
+        r.url = req.get_full_url()
+        r.msg = r.reason
+        return r
+
+    r.recv = r.read
+    resp = compat_urllib_request.addinfourl(
+        socket._fileobject(r, close=True), r.msg, req.get_full_url())
+    resp.code = r.status
+    resp.msg = r.reason
+    return resp
+
+
 def handle_youtubedl_headers(headers):
     filtered_headers = headers
 
@@ -2545,6 +2728,13 @@ def handle_youtubedl_headers(headers):
     return filtered_headers
 
 
+def _make_connection_pool(params):
+    # Keep enough connections for all the concurrent requests to a server
+    return HTTPConnectionPool(max_per_key=max(
+        10, (params.get('concurrent_fragment_downloads') or 1)
+        * (params.get('concurrent_downloads') or 1)))
+
+
 class YoutubeDLHandler(compat_urllib_request.HTTPHandler):
     """Handler for HTTP requests and responses.
 
@@ -2566,6 +2756,7 @@ class YoutubeDLHandler(compat_urllib_request.HTTPHandler):
     def __init__(self, params, *args, **kwargs):
         compat_urllib_request.HTTPHandler.__init__(self, *args, **kwargs)
         self._params = params
+        self._connection_pool = _make_connection_pool(params)
 
     def http_open(self, req):
         conn_class = compat_http_client.HTTPConnection
@@ -2575,9 +2766,9 @@ class YoutubeDLHandler(compat_urllib_request.HTTPHandler):
             conn_class = make_socks_conn_class(conn_class, socks_proxy)
             del req.headers['Ytdl-socks-proxy']
 
-        return self.do_open(functools.partial(
+        return _keep_alive_open(self, functools.partial(
             _create_http_connection, self, conn_class, False),
-            req)
+            req, ('http', socks_proxy))
 
     @staticmethod
     def deflate(data):
@@ -2716,6 +2907,7 @@ class YoutubeDLHTTPSHandler(compat_urllib_request.HTTPSHandler):
         compat_urllib_request.HTTPSHandler.__init__(self, *args, **kwargs)
         self._https_conn_class = https_conn_class or compat_http_client.HTTPSConnection
         self._params = params
+        self._connection_pool = _make_connection_pool(params)
 
     def https_open(self, req):
         kwargs = {}
@@ -2731,9 +2923,9 @@ class YoutubeDLHTTPSHandler(compat_urllib_request.HTTPSHandler):
             conn_class = make_socks_conn_class(conn_class, socks_proxy)
             del req.headers['Ytdl-socks-proxy']
 
-        return self.do_open(functools.partial(
+        return _keep_alive_open(self, functools.partial(
             _create_http_connection, self, conn_class, True),
-            req, **kwargs)
+            req, ('https', socks_proxy), **kwargs)
 
 
 class YoutubeDLCookieJar(compat_cookiejar.MozillaCookieJar):
@@ -3303,6 +3495,12 @@ class locked_file(object):
     def read(self, *args):
         return self.f.read(*args)
 
+    def seek(self, *args):
+        return self.f.seek(*args)
+
+    def tell(self):
+        return self.f.tell()
+
 
 def get_filesystem_encoding():
     encoding = sys.getfilesystemencoding()
@@ -3843,6 +4041,247 @@ class InAdvancePagedList(PagedList):
         return res
 
 
+class TemplatedFragments(object):
+    """
+    Sequence of the fragments of a DASH representation whose locations are
+    made from a media template, each fragment dict being built when it's
+    accessed instead of all of them up front.
+
+    template is a template for the % operator with the Number, Time and
+    Bandwidth keys. segments is a list of (time, duration, count, number)
+    tuples, each one describing count consecutive segments of the given
+    duration (in timescale units, None if unknown) starting with the segment
+    at the given time with the given number. location_key is the key of the
+    location in the fragment dicts ('url' or 'path'). initialization, if
+    given, is the dict of the initialization fragment that comes first.
+    """
+
+    def __init__(self, template, segments, bandwidth=None, timescale=1,
+                 location_key='url', initialization=None):
+        self.template = template
+        self.bandwidth = bandwidth
+        self.timescale = timescale
+        self.location_key = location_key
+        self.initialization = initialization
+        # Runs of segments continuing each other with the same duration
+        # are merged so that long timelines stay small
+        self.segments = []
+        for start, duration, count, number in segments:
+            if count <= 0:
+                continue
+            if self.segments:
+                p_start, p_duration, p_count, p_number = self.segments[-1]
+                if (p_duration == duration and p_number + p_count == number
+                        and duration is not None and p_start + p_count * duration == start):
+                    self.segments[-1] = (p_start, p_duration, p_count + count, p_number)
+                    continue
+            self.segments.append((start, duration, count, number))
+        self._offset = 1 if initialization else 0
+        # Index of the first fragment of each run
+        self._starts = []
+        total = self._offset
+        for _, _, count, _ in self.segments:
+            self._starts.append(total)
+            total += count
+        self._len = total
+        if self.segments:
+            # Fail early rather than halfway through the download on
+            # invalid templates
+            self._fragment(self.segments[0], 0)
+
+    def _fragment(self, segment, k):
+        start, duration, count, number = segment
+        return {
+            self.location_key: self.template % {
+                'Number': number + k,
+                'Time': start + k * (duration or 0),
+                'Bandwidth': self.bandwidth,
+            },
+            'duration': float_or_none(duration, self.timescale),
+        }
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        if self.initialization:
+            yield dict(self.initialization)
+        for segment in self.segments:
+            for k in range(segment[2]):
+                yield self._fragment(segment, k)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._len))]
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError('fragment index out of range')
+        if idx < self._offset:
+            return dict(self.initialization)
+        run = bisect.bisect_right(self._starts, idx) - 1
+        return self._fragment(self.segments[run], idx - self._starts[run])
+
+    def __deepcopy__(self, memo):
+        # Immutable, the fragment dicts are new on every access
+        return self
+
+    def __repr__(self):
+        return '<%s of %d fragments>' % (self.__class__.__name__, self._len)
+
+    def to_json(self):
+        """Compact description of the fragments, see from_json"""
+        return {
+            'template': self.template,
+            'segments': [list(segment) for segment in self.segments],
+            'bandwidth': self.bandwidth,
+            'timescale': self.timescale,
+            'location_key': self.location_key,
+            'initialization': self.initialization,
+        }
+
+    @classmethod
+    def from_json(cls, obj):
+        return cls(
+            obj['template'], [tuple(segment) for segment in obj['segments']],
+            bandwidth=obj.get('bandwidth'), timescale=obj.get('timescale', 1),
+            location_key=obj.get('location_key', 'url'),
+            initialization=obj.get('initialization'))
+
+
+def concurrent_imap(func, iterable, workers, window=None):
+    """
+    Like itertools.imap but calls func from a pool of worker threads.
+
+    Results are yielded in the order of iterable. At most window items
+    (twice the number of workers by default) are being processed or waiting
+    to be consumed at any time. An exception raised by func is re-raised in
+    the consuming thread in place of the corresponding result, the items
+    already being processed are completed before.
+    """
+    if workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    if window is None:
+        window = 2 * workers
+    items = enumerate(iterable)
+    cond = threading.Condition()
+    results = {}
+    state = {
+        # Index of the result the consumer is waiting for
+        'next': 0,
+        # Number of items taken from iterable so far
+        'taken': 0,
+        # Number of items in iterable, known once it's exhausted
+        'total': None,
+        'stop': False,
+    }
+
+    # Items are taken from iterable one worker at a time but without holding
+    # cond, so that a slow iterable (e.g. the fragments of a live stream,
+    # showing up over time) doesn't hold back the results of the items being
+    # processed
+    take_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with take_lock:
+                with cond:
+                    while not state['stop'] and state['taken'] >= state['next'] + window:
+                        cond.wait()
+                    if state['stop'] or state['total'] is not None:
+                        return
+                try:
+                    idx, item = next(items)
+                except StopIteration:
+                    with cond:
+                        state['total'] = state['taken']
+                        cond.notify_all()
+                    return
+                except Exception as e:
+                    with cond:
+                        results[state['taken']] = (False, e)
+                        state['total'] = state['taken'] + 1
+                        cond.notify_all()
+                    return
+                with cond:
+                    state['taken'] += 1
+                    if state['stop']:
+                        return
+            try:
+                result = (True, func(item))
+            except Exception as e:
+                result = (False, e)
+            with cond:
+                results[idx] = result
+                cond.notify_all()
+
+    threads = []
+    for _ in range(workers):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    interrupted = False
+    try:
+        idx = 0
+        while True:
+            with cond:
+                while idx not in results and (state['total'] is None or idx < state['total']):
+                    cond.wait()
+                if idx not in results:
+                    return
+                success, result = results.pop(idx)
+                state['next'] = idx + 1
+                cond.notify_all()
+            if not success:
+                raise result
+            yield result
+            idx += 1
+    except KeyboardInterrupt:
+        interrupted = True
+        raise
+    finally:
+        with cond:
+            state['stop'] = True
+            cond.notify_all()
+        # Let the items being processed complete unless the user gave up
+        if not interrupted:
+            for t in threads:
+                t.join()
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket letting through rate tokens (e.g. bytes) per
+    second on average, in bursts of up to capacity tokens (a tenth of a
+    second's worth by default).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = self.rate / 10 if capacity is None else capacity
+        self._tokens = self.capacity
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """Take amount tokens, sleeping until they are available"""
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + max(now - self._last, 0) * self.rate) - amount
+            self._last = now
+            # Later callers are queued behind the tokens still owed
+            wait = -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
 def uppercase_escape(s):
     unicode_escape = codecs.getdecoder('unicode_escape')
     return re.sub(
@@ -3908,6 +4347,36 @@ def update_url_query(url, query):
         query=compat_urllib_parse_urlencode(qs, True)))
 
 
+def url_expiration_time(url):
+    """
+    Return the UNIX timestamp a signed URL expires at, guessed from the
+    parameters commonly used for it, or None if it's unknown.
+    """
+    parsed_url = compat_urllib_parse_urlparse(url)
+    qs = dict(
+        (k.lower(), v[-1]) for k, v in compat_parse_qs(parsed_url.query).items())
+    times = [
+        int(mobj.group(1)) for mobj in re.finditer(
+            r'/(?:expire|expires|exp)/(\d{10})(?=/|$)', parsed_url.path)]
+    for key in ('expire', 'expires', 'exp'):
+        if re.match(r'^\d{10}$', qs.get(key, '')):
+            times.append(int(qs[key]))
+    # Akamai tokens
+    for key in ('hdnts', 'hdnea', '__token__'):
+        mobj = re.search(r'(?:^|~)exp=(\d{10})(?:~|$)', qs.get(key, ''))
+        if mobj:
+            times.append(int(mobj.group(1)))
+    # AWS signature version 4
+    if 'x-amz-date' in qs and re.match(r'^\d+$', qs.get('x-amz-expires', '')):
+        try:
+            signed = datetime.datetime.strptime(qs['x-amz-date'], '%Y%m%dT%H%M%SZ')
+        except ValueError:
+            pass
+        else:
+            times.append(calendar.timegm(signed.timetuple()) + int(qs['x-amz-expires']))
+    return min(times) if times else None
+
+
 def update_Request(req, url=None, data=None, headers={}, query={}):
     req_headers = req.headers.copy()
     req_headers.update(headers)